@@ -41,6 +41,9 @@ from gui.media_review_dialog import AVReviewDialog
 #from utility.minimax_speech_service import MinimaxSpeechService, EXPRESSION_STYLES
 from utility.voicebox_speech_service import VoiceboxService, EXPRESSION_STYLES
 from utility.ffmpeg_processor import FfmpegProcessor
+from utility import ffmpeg_capabilities
+from utility import frame_cache
+from utility import filmstrip
 from gui.wan_prompt_editor_dialog import show_wan_prompt_editor  # 添加这一行
 import tkinterdnd2 as TkinterDnD
 from tkinterdnd2 import DND_FILES
@@ -3054,13 +3057,17 @@ class WorkflowGUI:
                 ("plain", "无转场 (简单拼接)"),
                 ("transitions", "带转场"),
                 ("transitions_zero", "带转场，用ZERO音轨"),
+                ("transitions_incremental", "带转场 (增量，仅重渲染改动场景)"),
+                ("transitions_single_pass", "带转场 (单遍滤镜图渲染)"),
             ],
             self.root,
         )
         if picked is None:
             return
         _, mode = picked
-        if mode == "transitions":
+        incremental = mode == "transitions_incremental"
+        single_pass = mode == "transitions_single_pass"
+        if mode in ("transitions", "transitions_incremental", "transitions_single_pass"):
             with_transitions, replace_final_audio_with_zero = True, False
         elif mode == "transitions_zero":
             with_transitions, replace_final_audio_with_zero = True, True
@@ -3069,6 +3076,14 @@ class WorkflowGUI:
         else:
             with_transitions, replace_final_audio_with_zero = False, True
 
+        brand_overlays = False
+        if self._resolve_watermark_config()[0] or self._resolve_headmark_config()[0]:
+            brand_overlays = messagebox.askyesno(
+                "水印/顶标",
+                "成片编码时一并叠加频道水印（右下）与顶标（左上）？",
+                parent=self.root,
+            )
+
         pid = self.get_pid()
         task_id = str(uuid.uuid4())
         self.tasks[task_id] = {
@@ -3080,7 +3095,10 @@ class WorkflowGUI:
 
         def run_task():
             try:
-                self.workflow.finalize_video(with_transitions, replace_final_audio_with_zero)
+                self.workflow.finalize_video(
+                    with_transitions, replace_final_audio_with_zero, incremental=incremental, single_pass=single_pass,
+                    brand_overlays=brand_overlays,
+                )
                 self.log_to_output(self.video_output, "✅ 最终视频生成完成！")
                 self.tasks[task_id]["status"] = "完成"
             except Exception as e:
@@ -3145,20 +3163,41 @@ class WorkflowGUI:
         try:
             self.video_canvas.delete("all")
             
-            cap = cv2.VideoCapture(video_path)
-            
-            if not cap.isOpened():
-                cap.release()
-                self.clear_video_preview()
+            # 首帧取自帧缓存（载入项目时已在后台预热，见 MagicWorkflow.prewarm_frame_cache）；
+            # 未命中时在后台线程抽取，完成后回到 Tk 线程显示，Tk 线程不跑 ffmpeg
+            frame_path = frame_cache.cached_frame(video_path, "first", "preview")
+            if frame_path:
+                self._display_video_first_frame(video_path, frame_path)
                 return
-            
-            ret, frame = cap.read()
-            cap.release()
-            
-            if ret and frame is not None:
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+            self.video_canvas.create_text(
+                (self.video_canvas.winfo_width() or 640) // 2, (self.video_canvas.winfo_height() or 360) // 2,
+                text="⏳ 正在加载视频首帧…", fill="gray", font=("Arial", 11)
+            )
+
+            def _ready(path):
+                try:
+                    self.root.after(0, lambda: self._display_video_first_frame(video_path, path))
+                except (tk.TclError, RuntimeError):
+                    pass
+
+            frame_cache.get_frame_async(video_path, _ready, "first", "preview")
                 
-                pil_image = Image.fromarray(frame_rgb)
+        except Exception as e:
+            self.clear_video_preview()
+            self.log_to_output(self.video_output, f"❌ 加载视频预览失败: {str(e)}")
+
+
+    def _display_video_first_frame(self, video_path, frame_path):
+        # 异步抽帧返回时可能已切换场景或开始播放
+        current_scene = self.workflow.get_scene_by_index(self.current_scene_index)
+        if get_file_path(current_scene, "clip") != video_path or self.video_playing:
+            return
+        try:
+            self.video_canvas.delete("all")
+            if frame_path:
+                with Image.open(frame_path) as im:
+                    pil_image = im.convert("RGB")
                 
                 canvas_width = self.video_canvas.winfo_width()
                 canvas_height = self.video_canvas.winfo_height()
@@ -3586,6 +3625,9 @@ class WorkflowGUI:
                 self._update_remove_track_btn_state()
                 return
             
+            # 后台生成胶片条，滑块拖动时直接取缓存帧
+            filmstrip.request(track_path, urgent=True)
+
             # 打开视频文件
             temp_cap = cv2.VideoCapture(track_path)
             if not temp_cap.isOpened():
@@ -6027,9 +6069,43 @@ class WorkflowGUI:
                 self.secondary_track_scale.config(state=tk.DISABLED)
 
 
-    def display_secondary_track_frame_at_time(self, time_position):
-        """在canvas上显示指定时间的视频帧"""
+    def _display_secondary_track_filmstrip_frame(self, time_position):
+        """拖动滑块时从胶片条取最近一格显示（不解码视频）；停止拖动后再精确解码。没有胶片条时返回 False。"""
+        current_scene = self.workflow.get_scene_by_index(self.current_scene_index) if self.workflow else None
+        track_path = get_file_path(current_scene, self.selected_secondary_track) if current_scene else None
+        strip = filmstrip.get(track_path) if track_path else None
+        tile = strip.tile_at(time_position) if strip else None
+        if tile is None:
+            return False
+
+        canvas_width = self.secondary_track_canvas.winfo_width()
+        canvas_height = self.secondary_track_canvas.winfo_height()
+        if canvas_width <= 1 or canvas_height <= 1:
+            canvas_width, canvas_height = 320, 180
+        scale = min((canvas_width - 10) / tile.width, (canvas_height - 10) / tile.height)
+        pil_image = tile.resize((max(1, int(tile.width * scale)), max(1, int(tile.height * scale))), Image.Resampling.BILINEAR)
+        self.current_secondary_track_frame = ImageTk.PhotoImage(pil_image)
+        self.secondary_track_canvas.delete("all")
+        self.secondary_track_canvas.create_image(canvas_width // 2, canvas_height // 2, anchor=tk.CENTER, image=self.current_secondary_track_frame)
+
+        after_id = getattr(self, "_secondary_track_exact_after_id", None)
+        if after_id:
+            try:
+                self.root.after_cancel(after_id)
+            except tk.TclError:
+                pass
+        self._secondary_track_exact_after_id = self.root.after(
+            250, lambda: self.display_secondary_track_frame_at_time(time_position, exact=True)
+        )
+        return True
+
+
+    def display_secondary_track_frame_at_time(self, time_position, exact=False):
+        """在canvas上显示指定时间的视频帧；未播放且非 ``exact`` 时优先用胶片条"""
         try:
+            if not exact and not self.secondary_track_playing and self._display_secondary_track_filmstrip_frame(time_position):
+                return
+            self._secondary_track_exact_after_id = None
             if not hasattr(self, 'secondary_track_cap') or not self.secondary_track_cap:
                 # 如果没有cap，尝试打开视频
                 current_scene = self.workflow.get_scene_by_index(self.current_scene_index)
@@ -7698,6 +7774,8 @@ class WorkflowGUI:
 
 def main():
     import sys
+    # 后台探测 ffmpeg 编码能力（首次运行含 x264 自测，结果按 ffmpeg 二进制缓存），首个渲染任务不必等待
+    ffmpeg_capabilities.warm_up()
     root = TkinterDnD.Tk()
 
     initial_pid = None
@@ -585,6 +585,8 @@ PUBLISH_PATH = f"{BASE_MEDIA_PATH}/publish"
 # 频道列表拖放加水印成片 / 封面 webp（Youtube 摘要窗、审阅发布等）
 INPUT_MEDIA_GEN_VIDEO_PATH = f"{PUBLISH_PATH}/gen_video"
 TEMP_PATH_BASE = PROJECT_DATA_PATH  # temp 目录在各个项目下
+# 跨项目共享的本机缓存（ffmpeg 能力探测等）
+MACHINE_CACHE_PATH = f"{BASE_MEDIA_PATH}/cache"
 
 
 def publish_final_video_path(pid: str) -> str:
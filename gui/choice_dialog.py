@@ -5,7 +5,6 @@
 """
 
 import os
-import subprocess
 import tempfile
 import threading
 import tkinter as tk
@@ -22,7 +21,8 @@ except ImportError:
     pygame = None
     PYGAME_AVAILABLE = False
 
-from utility.ffmpeg_audio_processor import ffmpeg_path, ffprobe_path
+from utility import ffmpeg_scheduler, media_probe
+from utility.ffmpeg_audio_processor import ffmpeg_path
 
 
 def _askchoice_normalize_pairs(choices):
@@ -335,24 +335,18 @@ def post_nested_clipboard_menu(
     return "break"
 
 
+_VIDEO_EXTS = (".mp4", ".avi", ".mov", ".webm", ".mkv")
+
+
 def _get_media_duration_sec(file_path):
-    """返回视频时长（秒），无法读取或非视频则返回 None。"""
-    try:
-        import cv2
-        lower = file_path.lower()
-        if not lower.endswith((".mp4", ".avi", ".mov", ".webm", ".mkv")):
-            return None
-        cap = cv2.VideoCapture(file_path)
-        if not cap.isOpened():
-            return None
-        fps = cap.get(cv2.CAP_PROP_FPS) or 0
-        n = cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0
-        cap.release()
-        if fps and fps > 0 and n and n > 0:
-            return float(n / fps)
-    except Exception:
-        pass
-    return None
+    """返回视频时长（秒），无法读取或非视频则返回 None（读共享探测缓存，对话框打开时已批量预热）。"""
+    if not file_path.lower().endswith(_VIDEO_EXTS):
+        return None
+    meta = media_probe.summarize(media_probe.get_probe_cache(None).probe(file_path))
+    if not meta:
+        return None
+    sec = meta["video_duration"] or meta["duration"]
+    return float(sec) if sec > 0 else None
 
 
 def _format_duration(sec):
@@ -405,34 +399,13 @@ def _snap_mp4_preview_volume(raw: float) -> float:
 
 
 def _ffprobe_video_has_audio(file_path: str) -> bool:
-    try:
-        r = subprocess.run(
-            [
-                ffprobe_path,
-                "-v",
-                "error",
-                "-select_streams",
-                "a",
-                "-show_entries",
-                "stream=codec_type",
-                "-of",
-                "csv=p=0",
-                file_path,
-            ],
-            check=True,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="ignore",
-        )
-        return bool(r.stdout.strip())
-    except Exception:
-        return False
+    info = media_probe.get_probe_cache(None).probe(file_path)
+    return media_probe.first_stream(info, "audio") is not None
 
 
 def _ffmpeg_extract_volume_wav_to(video_path: str, volume: float, out_wav: str) -> bool:
     try:
-        r = subprocess.run(
+        r = ffmpeg_scheduler.run(
             [
                 ffmpeg_path,
                 "-y",
@@ -450,6 +423,7 @@ def _ffmpeg_extract_volume_wav_to(video_path: str, volume: float, out_wav: str)
                 out_wav,
             ],
             check=False,
+            priority=ffmpeg_scheduler.INTERACTIVE,
             capture_output=True,
             text=True,
             encoding="utf-8",
@@ -584,6 +558,11 @@ def askchoice_media_preview(
     duration_label.pack(pady=(4, 0))
     preview_photo = [None]  # 保持引用避免被 GC
 
+    # 后台并发探测列表中的视频，选中时时长直接命中缓存
+    video_paths = [os.path.join(folder_path, c) for c in choices if str(c).lower().endswith(_VIDEO_EXTS)]
+    if video_paths:
+        threading.Thread(target=media_probe.probe_many, args=(video_paths,), daemon=True).start()
+
     def _update_duration_for_path(full):
         sec = _get_media_duration_sec(full)
         if sec is not None:
@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import os, time, threading
 from PIL import Image, ImageTk
+import numpy as np
 from utility.file_util import get_file_path, safe_remove, safe_file
 from utility.audio_transcriber import AudioTranscriber
 import config
@@ -17,6 +18,7 @@ import project_manager
 #from utility.minimax_speech_service import MinimaxSpeechService
 from utility.voicebox_speech_service import VoiceboxService
 from utility.ffmpeg_audio_processor import FfmpegAudioProcessor
+from utility import filmstrip, frame_cache, media_probe, waveform_peaks
 
 
 # 尝试导入拖放支持
@@ -31,7 +33,6 @@ except ImportError:
 try:
     import sounddevice as sd  # type: ignore[import-untyped]
     import soundfile as sf  # type: ignore[import-untyped]
-    import numpy as np
     RECORDING_AVAILABLE = True
 except ImportError:
     RECORDING_AVAILABLE = False
@@ -177,7 +178,7 @@ class AVReviewDialog:
 
 
     def init_load(self):
-        self.draw_waveform_placeholder()
+        self.draw_waveform()
         self.display_image_on_canvas()
         self.load_video_first_frame()
         # 初始化时间轴
@@ -294,6 +295,7 @@ class AVReviewDialog:
         # Waveform canvas (支持拖放)
         self.waveform_canvas = tk.Canvas(waveform_frame, bg='black', height=300, highlightthickness=2, highlightbackground='orange')
         self.waveform_canvas.pack(fill=tk.BOTH, expand=True)
+        self.waveform_canvas.bind('<Configure>', self._on_waveform_configure)
         if DND_AVAILABLE:
             self.waveform_canvas.drop_target_register(DND_FILES)
             self.waveform_canvas.dnd_bind('<<Drop>>', self.on_audio_dnd_drop)
@@ -497,34 +499,72 @@ class AVReviewDialog:
             pygame.mixer.init(frequency=44100, size=-16, channels=2, buffer=2048)
         
 
-    def draw_waveform_placeholder(self):
-        """Draw a simple waveform placeholder"""
+    def draw_waveform(self):
+        """Draw the real waveform from cached peaks (utility/waveform_peaks.py); on a cache miss peaks are computed in the background"""
         if not self.source_audio_path:
             return
+        audio_path = self.source_audio_path
+        peaks = waveform_peaks.cached_peaks(audio_path)
+        if peaks is not None:
+            self._render_waveform(peaks)
+            return
+
+        self.waveform_canvas.delete("all")
+        self.waveform_canvas.create_text(
+            max(self.waveform_canvas.winfo_width(), 750) // 2, max(self.waveform_canvas.winfo_height(), 180) // 2,
+            text="波形计算中...", fill="gray", font=("Arial", 12), tags="waveform_hint"
+        )
+
+        def _worker():
+            peaks = waveform_peaks.get_peaks(audio_path)
+            if peaks is None:
+                return
+            try:
+                self.dialog.after(0, lambda: self._render_waveform(peaks) if self.source_audio_path == audio_path else None)
+            except (tk.TclError, RuntimeError):
+                pass  # dialog closed
 
-        width = 750
-        height = 180
+        threading.Thread(target=_worker, daemon=True).start()
+
+
+    def _on_waveform_configure(self, event=None):
+        """Waveform canvas 大小变化时按新宽度重新归约峰值（只用缓存，不解码）"""
+        if self.source_audio_path:
+            peaks = waveform_peaks.cached_peaks(self.source_audio_path)
+            if peaks is not None:
+                self._render_waveform(peaks)
+
+
+    def _render_waveform(self, peaks):
+        """Render min/max columns as one image, then draw time markers and the selection on top"""
+        width = self.waveform_canvas.winfo_width()
+        height = self.waveform_canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            width, height = 750, 180
         center_y = height // 2
-        
-        # Clear canvas
+
+        display_duration = self.workflow.ffmpeg_audio_processor.get_duration(self.source_audio_path) or peaks.duration
+        mins, maxs = peaks.columns(0.0, display_duration, width)
+        half = (height - 20) / 2
+        top = np.clip(np.round(center_y - maxs * half), 0, height - 1).astype(np.int32)
+        bottom = np.clip(np.round(center_y - mins * half), 0, height - 1).astype(np.int32)
+        rows = np.arange(height, dtype=np.int32)[:, None]
+        mask = (rows >= top[None, :]) & (rows <= bottom[None, :])
+        pixels = np.zeros((height, width, 3), dtype=np.uint8)
+        pixels[mask] = (0, 200, 0)
+        pixels[center_y, :] = np.maximum(pixels[center_y, :], (0, 90, 0))
+
+        self.waveform_photo = ImageTk.PhotoImage(Image.fromarray(pixels, "RGB"))
         self.waveform_canvas.delete("all")
-        
-        # Draw simple waveform simulation
-        import math
-        for x in range(0, width, 2):
-            # Create random-looking waveform
-            amplitude = 50 * math.sin(x * 0.05) * (0.5 + 0.5 * math.sin(x * 0.01))
-            y1 = center_y - amplitude
-            y2 = center_y + amplitude
-            self.waveform_canvas.create_line(x, y1, x, y2, fill="green", width=1)
-        
-        # Draw time markers  
-        display_duration = self.workflow.ffmpeg_audio_processor.get_duration(self.source_audio_path)
+        self.waveform_canvas.create_image(0, 0, anchor="nw", image=self.waveform_photo, tags="waveform")
+
+        # Draw time markers
         if display_duration > 0:
             for i in range(0, int(display_duration) + 1, max(1, int(display_duration) // 10)):
                 x = (i / display_duration) * width
                 self.waveform_canvas.create_line(x, 0, x, height, fill="gray", width=1)
                 self.waveform_canvas.create_text(x, height - 10, text=f"{i}s", fill="white", anchor="n")
+        self.update_duration_display()
     
 
     def update_duration_display(self, *args):
@@ -702,6 +742,9 @@ class AVReviewDialog:
                 pygame.mixer.music.load(self.source_audio_path)
                 pygame.mixer.music.play(start=new_time)
                 print(f"🔍 进度条拖动: 跳转到 {new_time:.2f}s")
+        else:
+            # 未播放：从胶片条显示该时间点的画面，不解码视频
+            self._show_filmstrip_frame(new_time)
         
         # 更新显示
         self.update_play_time_display()
@@ -930,6 +973,10 @@ class AVReviewDialog:
         if handle_index == 0 or handle_index == len(boundaries) - 1:
             self.update_duration_display()
         
+        # 未播放时预览边界处的画面（胶片条缓存帧）
+        if not self.av_playing:
+            self._show_filmstrip_frame(new_time)
+        
         # 重绘时间轴
         self._draw_edit_timeline()
     
@@ -1758,7 +1805,7 @@ class AVReviewDialog:
         self._update_fresh_json_text()
 
         self.refresh_edit_timeline()
-        self.draw_waveform_placeholder()
+        self.draw_waveform()
         # pop up a messagebox to confirm the audio is regenerated
         messagebox.showinfo("成功", "音频已重新生成")
 
@@ -1911,7 +1958,7 @@ class AVReviewDialog:
                             except:
                                 pass
             # 重新绘制波形
-            self.draw_waveform_placeholder()
+            self.draw_waveform()
             
             messagebox.showinfo("成功", f"录音完成！\n文件保存到: {os.path.basename(recorded_file_path)}\n时长: {self.audio_duration:.2f} 秒")
             
@@ -2283,11 +2330,9 @@ class AVReviewDialog:
             # Clear canvas first
             self.preview_canvas.delete("all")
             
-            # Open video file
-            cap = cv2.VideoCapture(self.source_video_path)
-            
-            if not cap.isOpened():
-                cap.release()
+            # 尺寸取自探测缓存，首帧取自帧缓存（utility/frame_cache.py），不再为一帧打开整个视频
+            meta = media_probe.summarize(media_probe.get_probe_cache(self.workflow.pid).probe(self.source_video_path))
+            if not meta or not meta["width"] or not meta["height"]:
                 self.preview_canvas.create_text(
                     self.preview_canvas.winfo_width()//2, 
                     self.preview_canvas.winfo_height()//2,
@@ -2296,21 +2341,57 @@ class AVReviewDialog:
                 return
             
             # Get video dimensions
-            self.video_original_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            self.video_original_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            self.video_original_width = meta["width"]
+            self.video_original_height = meta["height"]
             
             # Update crop controls max values
             if self.video_original_width and self.video_original_height:
                 # Update spinbox max values
                 self._update_crop_spinbox_max()
             
-            # Read first frame
-            ret, frame = cap.read()
-            cap.release()
-            
-            if ret and frame is not None:
-                # Convert BGR to RGB
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            # 后台生成胶片条，拖动进度条 / 剪辑边界时直接显示缓存帧
+            filmstrip.request(self.source_video_path, urgent=True)
+
+            # 首帧命中缓存直接显示；未命中在后台线程抽取后回到 Tk 线程显示，对话框不因 ffmpeg 卡住
+            video_path = self.source_video_path
+            frame_path = frame_cache.cached_frame(video_path, "first", "preview")
+            if frame_path:
+                self._display_first_frame(video_path, frame_path)
+                return
+
+            self.preview_canvas.create_text(
+                self.preview_canvas.winfo_width()//2,
+                self.preview_canvas.winfo_height()//2,
+                text="⏳ 正在加载视频首帧…", fill="gray", font=("Arial", 11)
+            )
+
+            def _ready(path):
+                try:
+                    self.dialog.after(0, lambda: self._display_first_frame(video_path, path))
+                except (tk.TclError, RuntimeError):
+                    pass
+
+            frame_cache.get_frame_async(video_path, _ready, "first", "preview")
+                
+        except Exception as e:
+            print(f"⚠️ 加载视频第一帧失败: {e}")
+            self.preview_canvas.create_text(
+                self.preview_canvas.winfo_width()//2, 
+                self.preview_canvas.winfo_height()//2,
+                text=f"加载视频失败: {str(e)}", fill="red", font=("Arial", 10)
+            )
+
+
+
+    def _display_first_frame(self, video_path, frame_path):
+        """Show the cached first frame (``frame_path`` None → error text); ignored if the source changed meanwhile"""
+        if video_path != self.source_video_path or self.av_playing:
+            return
+        try:
+            self.preview_canvas.delete("all")
+            if frame_path:
+                with Image.open(frame_path) as im:
+                    frame_image = im.convert("RGB")
                 
                 # Get canvas dimensions
                 canvas_width = self.preview_canvas.winfo_width()
@@ -2321,7 +2402,7 @@ class AVReviewDialog:
                     canvas_width, canvas_height = 640, 360
                 
                 # Calculate aspect ratio and resize
-                height, width = frame_rgb.shape[:2]
+                width, height = frame_image.size
                 aspect_ratio = width / height
                 
                 if canvas_width / canvas_height > aspect_ratio:
@@ -2332,10 +2413,9 @@ class AVReviewDialog:
                     new_height = int(new_width / aspect_ratio)
                 
                 # Resize frame
-                frame_resized = cv2.resize(frame_rgb, (new_width, new_height))
+                pil_image = frame_image.resize((new_width, new_height), Image.Resampling.LANCZOS)
                 
-                # Convert to PIL Image and then to PhotoImage
-                pil_image = Image.fromarray(frame_resized)
+                # Convert to PhotoImage
                 self.first_frame_photo = ImageTk.PhotoImage(pil_image)
                 
                 # Add to image references to prevent garbage collection
@@ -2372,12 +2452,33 @@ class AVReviewDialog:
         except Exception as e:
             print(f"⚠️ 加载视频第一帧失败: {e}")
             self.preview_canvas.create_text(
-                self.preview_canvas.winfo_width()//2, 
+                self.preview_canvas.winfo_width()//2,
                 self.preview_canvas.winfo_height()//2,
                 text=f"加载视频失败: {str(e)}", fill="red", font=("Arial", 10)
             )
 
 
+    def _show_filmstrip_frame(self, t):
+        """Show the filmstrip tile nearest to ``t`` in the preview canvas; no-op until the filmstrip is ready"""
+        if not self.source_video_path:
+            return
+        strip = filmstrip.get(self.source_video_path)
+        tile = strip.tile_at(t) if strip else None
+        if tile is None:
+            return
+        canvas_width = self.preview_canvas.winfo_width()
+        canvas_height = self.preview_canvas.winfo_height()
+        if canvas_width <= 1 or canvas_height <= 1:
+            return
+        scale = min(canvas_width / tile.width, canvas_height / tile.height)
+        image = tile.resize((max(1, int(tile.width * scale)), max(1, int(tile.height * scale))), Image.Resampling.BILINEAR)
+        photo = ImageTk.PhotoImage(image)
+        self.image_references.append(photo)
+        if len(self.image_references) > 5:
+            self.image_references.pop(0)
+        self.preview_canvas.delete("all")
+        self.preview_canvas.create_image(canvas_width//2, canvas_height//2, image=photo, anchor=tk.CENTER)
+
 
     def update_video_frame(self):
         """Update video frame in preview canvas with audio sync"""
@@ -2,7 +2,6 @@
 from __future__ import annotations
 
 import os
-import subprocess
 import tempfile
 import threading
 import time
@@ -22,7 +21,8 @@ except ImportError:
 
 from PIL import Image, ImageTk
 
-from utility.ffmpeg_audio_processor import ffmpeg_path, ffprobe_path
+from utility import ffmpeg_scheduler, filmstrip, media_probe
+from utility.ffmpeg_audio_processor import ffmpeg_path
 
 _PREVIEW_SPEED_MIN = 0.7
 _PREVIEW_SPEED_MAX = 1.2
@@ -44,7 +44,14 @@ def _snap_mp4_preview_volume(raw: float) -> float:
 
 
 def _probe_mp4_meta(path: str) -> tuple[float, float, int]:
+    """(时长, 帧率, 帧数)：优先读共享探测缓存（打开对话框时已由 probe_many 预热），缺字段再回退 cv2。"""
     abs_path = os.path.abspath(path)
+    meta = media_probe.summarize(media_probe.get_probe_cache(None).probe(abs_path))
+    if meta and 1 <= meta["fps"] <= 240 and (meta["frame_count"] > 0 or meta["video_duration"] > 0):
+        fps = meta["fps"]
+        fc = meta["frame_count"] or int(round(meta["video_duration"] * fps))
+        dur = meta["video_duration"] or fc / fps
+        return max(0.01, dur), fps, max(1, fc)
     dur = 0.01
     fps = 30.0
     fc = 1
@@ -61,17 +68,8 @@ def _probe_mp4_meta(path: str) -> tuple[float, float, int]:
 
 
 def _ffprobe_video_has_audio(file_path: str) -> bool:
-    try:
-        r = subprocess.run(
-            [
-                ffprobe_path, "-v", "error", "-select_streams", "a",
-                "-show_entries", "stream=codec_type", "-of", "csv=p=0", file_path,
-            ],
-            check=True, capture_output=True, text=True, encoding="utf-8", errors="ignore",
-        )
-        return bool(r.stdout.strip())
-    except Exception:
-        return False
+    info = media_probe.get_probe_cache(None).probe(file_path)
+    return media_probe.first_stream(info, "audio") is not None
 
 
 def _ffmpeg_atempo_filter(speed: float) -> str:
@@ -99,7 +97,7 @@ def _ffmpeg_extract_segment_raw_wav(
     vol = float(volume or 1.0)
     af = f"volume={vol}" if abs(vol - 1.0) > 0.001 else "anull"
     try:
-        r = subprocess.run(
+        r = ffmpeg_scheduler.run(
             [
                 ffmpeg_path, "-y",
                 "-ss", f"{max(0.0, float(start)):.6f}",
@@ -110,6 +108,7 @@ def _ffmpeg_extract_segment_raw_wav(
                 out_wav,
             ],
             check=False, capture_output=True, text=True, encoding="utf-8", errors="ignore",
+            priority=ffmpeg_scheduler.INTERACTIVE,
         )
         return r.returncode == 0 and os.path.isfile(out_wav)
     except Exception:
@@ -126,7 +125,7 @@ def _ffmpeg_apply_atempo_wav(in_wav: str, speed: float, out_wav: str) -> bool:
         except Exception:
             return False
     try:
-        r = subprocess.run(
+        r = ffmpeg_scheduler.run(
             [
                 ffmpeg_path, "-y", "-i", in_wav,
                 "-af", chain,
@@ -134,6 +133,7 @@ def _ffmpeg_apply_atempo_wav(in_wav: str, speed: float, out_wav: str) -> bool:
                 out_wav,
             ],
             check=False, capture_output=True, text=True, encoding="utf-8", errors="ignore",
+            priority=ffmpeg_scheduler.INTERACTIVE,
         )
         return r.returncode == 0 and os.path.isfile(out_wav)
     except Exception:
@@ -213,6 +213,13 @@ def ask_mp4_pick_with_trim_preview(
         dlg.transient(parent)
     dlg.grab_set()
 
+    # 后台并发探测整个列表，切换文件时直接命中缓存
+    threading.Thread(
+        target=media_probe.probe_many,
+        args=([os.path.join(folder_path, fn) for fn in choices],),
+        daemon=True,
+    ).start()
+
     result: list = [None]
     clip = [_ClipTrim(os.path.join(folder_path, choices[0]))]
     sel_fn = [choices[0]]
@@ -442,6 +449,25 @@ def ask_mp4_pick_with_trim_preview(
         preview_canvas.create_image(cw // 2, ch // 2, anchor=tk.CENTER, image=photo[0])
         _apply_ui()
 
+    def _show_scrub_frame(t: float) -> None:
+        """拖动时间轴：有胶片条（utility/filmstrip.py）就直接显示最近一格，松手后再精确解码。"""
+        c = _c()
+        strip = filmstrip.get(c.path)
+        tile = strip.tile_at(t) if strip else None
+        if tile is None:
+            _show_frame(t)
+            return
+        current_t[0] = _snap_time(t)
+        pil = tile.copy()
+        cw = max(preview_canvas.winfo_width(), 360)
+        ch = max(preview_canvas.winfo_height(), 200)
+        scale = min((cw - 8) / pil.width, (ch - 8) / pil.height)
+        pil = pil.resize((max(1, int(pil.width * scale)), max(1, int(pil.height * scale))), Image.Resampling.BILINEAR)
+        photo[0] = ImageTk.PhotoImage(pil)
+        preview_canvas.delete("all")
+        preview_canvas.create_image(cw // 2, ch // 2, anchor=tk.CENTER, image=photo[0])
+        _apply_ui()
+
     def _init_pygame() -> None:
         if not pygame or pygame_ok[0]:
             return
@@ -691,11 +717,13 @@ def ask_mp4_pick_with_trim_preview(
             c.end = _snap_time(max(t, c.start + _PREVIEW_MIN_CLIP_SEC))
         elif tl_drag[0] == "scrub":
             current_t[0] = t
-            _show_frame(t)
+            _show_scrub_frame(t)
             return
         _apply_ui()
 
     def _on_tl_release(_e) -> None:
+        if tl_drag[0] == "scrub" and not playing[0]:
+            _show_frame(current_t[0])
         tl_drag[0] = None
 
     timeline.bind("<Configure>", lambda _e: _draw_timeline())
@@ -737,6 +765,7 @@ def ask_mp4_pick_with_trim_preview(
         sel_fn[0] = fn
         clip[0] = _ClipTrim(full)
         c = clip[0]
+        filmstrip.request(full, urgent=True)
         current_t[0] = c.start
         _apply_ui()
         _show_frame(c.start)
@@ -28,7 +28,7 @@ from PIL import Image, ImageTk
 
 import config
 from utility.ffmpeg_audio_processor import FfmpegAudioProcessor
-from utility.ffmpeg_processor import FfmpegProcessor, ffmpeg_path
+from utility.ffmpeg_processor import FfmpegProcessor, corner_logo_layer, ffmpeg_path
 from utility.file_util import safe_copy_overwrite, safe_remove
 
 
@@ -77,13 +77,16 @@ def _fmt_time(sec: float) -> str:
     return f"{m:d}:{s:05.2f}"
 
 
-def _probe_video_meta(path: str, ff: FfmpegProcessor) -> tuple[float, float, int]:
-    """返回 (duration_sec, fps, frame_count)。"""
+def _probe_video_meta(path: str, ff: FfmpegProcessor, meta: dict | None = None) -> tuple[float, float, int]:
+    """返回 (duration_sec, fps, frame_count)。``meta`` 为 ``ff.probe_many`` 的结果，缺帧率/帧数时才回退 cv2。"""
     abs_path = os.path.abspath(path)
-    dur = float(ff.get_playback_duration(abs_path, fresh=True) or 0.0)
+    dur = float(ff.get_playback_duration(abs_path) or 0.0)
     fps = 30.0
     fc = 0
-    if cv2 is not None:
+    if meta and 1 <= float(meta.get("fps") or 0) <= 240:
+        fps = float(meta["fps"])
+        fc = int(meta.get("frame_count") or 0)
+    if fc <= 0 and cv2 is not None:
         cap = cv2.VideoCapture(abs_path)
         if cap.isOpened():
             fps = float(cap.get(cv2.CAP_PROP_FPS) or 30.0)
@@ -123,6 +126,11 @@ class SummaryMp4ReviewDialog:
 
         self.clips: list[_ClipState] = []
         if initial_segments:
+            metas = self.ff.probe_many(
+                os.path.normpath((seg.get("path") or "").strip())
+                for seg in initial_segments
+                if isinstance(seg, dict) and (seg.get("path") or "").strip()
+            )
             for seg in initial_segments:
                 if not isinstance(seg, dict):
                     continue
@@ -130,7 +138,7 @@ class SummaryMp4ReviewDialog:
                 if not p or not os.path.isfile(p) or not p.lower().endswith(".mp4"):
                     print(f"⚠️ 审阅窗跳过无效片段: {p or seg}")
                     continue
-                dur, fps, fc = _probe_video_meta(p, self.ff)
+                dur, fps, fc = _probe_video_meta(p, self.ff, metas.get(p))
                 c = _ClipState(p, dur, fps, fc)
                 try:
                     c.start = float(seg.get("start", 0.0))
@@ -155,8 +163,9 @@ class SummaryMp4ReviewDialog:
             ]
             if not paths:
                 raise ValueError("无有效 MP4")
+            metas = self.ff.probe_many(paths)
             for p in paths:
-                dur, fps, fc = _probe_video_meta(p, self.ff)
+                dur, fps, fc = _probe_video_meta(p, self.ff, metas.get(p))
                 self.clips.append(_ClipState(p, dur, fps, fc))
             print(f"📎 审阅窗载入 {len(self.clips)} 个 MP4（输入 {len(mp4_paths or [])} 项）")
 
@@ -502,8 +511,9 @@ class SummaryMp4ReviewDialog:
     def _add_clips_from_paths(self, paths: list[str]) -> None:
         self._save_trim_to_clip()
         added = 0
+        metas = self.ff.probe_many(paths)
         for p in paths:
-            dur, fps, fc = _probe_video_meta(p, self.ff)
+            dur, fps, fc = _probe_video_meta(p, self.ff, metas.get(p))
             self.clips.append(_ClipState(p, dur, fps, fc))
             added += 1
         if not added:
@@ -928,13 +938,12 @@ def run_trim_concat_watermark_worker(
     dest_name: str,
     on_done,
 ) -> None:
-    """后台：逐段 trim → 末帧延长 → concat → watermark → 写入 gen_video。"""
+    """后台：逐段 trim → 末帧延长 → concat + watermark（同一次编码）→ 写入 gen_video。"""
 
     def _worker():
         out_ok = ""
         err_msg = ""
         stage_tmps: list[str] = []
-        concat_tmp = ""
         wm_tmp = ""
         try:
             os.makedirs(gen_dir, exist_ok=True)
@@ -957,20 +966,17 @@ def run_trim_concat_watermark_worker(
                 if frozen != tp:
                     stage_tmps.append(frozen)
                 processed.append(frozen)
-            if len(processed) == 1:
-                source = processed[0]
-            else:
-                source = ff.concat_videos(processed, True)
-                concat_tmp = source or ""
-                if not source:
-                    err_msg = f"拼接 {len(processed)} 段失败。"
-                    return
-            wm_tmp = config.get_temp_file(pid, "mp4")
-            ok = ff.apply_watermark_to_video(
-                source, wm_tmp, wm_path, wm_opts or {}
-            )
-            if not ok:
-                err_msg = "叠加水印失败。"
+            # 放大到成片画幅 + 右下角水印并入拼接的那次编码（单段时只做这一遍）
+            base_filter, frame = ff.brand_base_filter(processed[0])
+            frame_w, frame_h = frame or (ff.width, ff.height)
+            layer = corner_logo_layer(wm_path, wm_opts or {}, "br", frame_w, frame_h)
+            try:
+                wm_tmp = ff.concat_videos(processed, True, overlays=[layer], base_filter=base_filter) or ""
+            except Exception as ex:
+                print(f"❌ concat + watermark failed: {ex}")
+                wm_tmp = ""
+            if not wm_tmp:
+                err_msg = f"拼接 {len(processed)} 段并叠加水印失败。"
                 return
             dest_abs = os.path.join(gen_dir, dest_name)
             safe_copy_overwrite(wm_tmp, dest_abs)
@@ -982,16 +988,11 @@ def run_trim_concat_watermark_worker(
             err_msg = str(ex)
         finally:
             for t in stage_tmps:
-                if t and t != out_ok and t != concat_tmp:
+                if t and t != out_ok:
                     try:
                         safe_remove(t)
                     except Exception:
                         pass
-            if concat_tmp and concat_tmp not in stage_tmps and concat_tmp != out_ok:
-                try:
-                    safe_remove(concat_tmp)
-                except Exception:
-                    pass
             if wm_tmp:
                 try:
                     safe_remove(wm_tmp)
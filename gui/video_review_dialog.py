@@ -1,7 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import os
-import subprocess
 import tempfile
 import threading
 import time
@@ -18,6 +17,8 @@ except ImportError:
     PYGAME_AVAILABLE = False
     print("警告: pygame 不可用，音频播放功能将被禁用")
 
+from utility import ffmpeg_scheduler
+
 
 class VideoReviewDialog:
     """Dialog for reviewing and configuring video replacement"""
@@ -492,7 +493,7 @@ class VideoReviewDialog:
                 self.audio_file_path
             ]
             
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = ffmpeg_scheduler.run(cmd, capture_output=True, text=True, priority=ffmpeg_scheduler.INTERACTIVE)
             if result.returncode == 0 and os.path.exists(self.audio_file_path):
                 print(f"✓ 音频提取成功: {self.audio_file_path}")
             else:
@@ -4,11 +4,18 @@ from utility.audio_transcriber import AudioTranscriber
 from gui.downloader import MediaDownloader
 from utility import sd_image_processor
 from utility.sd_image_processor import SDProcessor
-from utility.ffmpeg_processor import FfmpegProcessor
+from utility.ffmpeg_processor import FfmpegProcessor, resolve_brand_overlays_for_project
 from utility.ffmpeg_audio_processor import FfmpegAudioProcessor
+from utility.render_cache import file_identity
+from utility.timeline_renderer import TimelineRenderer
+from utility.audio_timeline import AudioClip, AudioTimeline
+from utility import filmstrip, frame_cache
 import os
 import copy
+import hashlib
 import json
+import threading
+import time
 import shutil
 import re
 from datetime import datetime
@@ -713,6 +720,33 @@ class MagicWorkflow:
         return narr, visual_style
 
 
+    PROBE_MEDIA_EXTS = (".mp4", ".mov", ".mkv", ".webm", ".wav", ".mp3", ".m4a", ".aac")
+
+    def prewarm_media_probe(self):
+        """后台批量 ffprobe 所有场景媒体（写入项目探测缓存），随后的时长/音轨查询不再逐个起子进程。"""
+        paths = [
+            v for s in self.scenes for v in s.values()
+            if isinstance(v, str) and v.lower().endswith(self.PROBE_MEDIA_EXTS) and os.path.isfile(v)
+        ]
+        if paths:
+            threading.Thread(target=self.ffmpeg_processor.probe_many, args=(paths,), daemon=True).start()
+
+
+    PREWARM_FRAME_MEDIA_TYPES = ("clip", "narration", "zero")
+
+    def prewarm_frame_cache(self):
+        """后台抽取各场景视频的首帧/末帧缩略图（utility/frame_cache.py），场景切换时预览图直接命中磁盘缓存。
+        按场景顺序抽取（GUI 从第一个场景打开）；随后排队生成胶片条（utility/filmstrip.py），供时间轴拖动使用。
+        """
+        paths = [
+            get_file_path(s, media_type) for s in self.scenes for media_type in self.PREWARM_FRAME_MEDIA_TYPES
+        ]
+        paths = [p for p in paths if p and p.lower().endswith((".mp4", ".mov", ".mkv", ".webm"))]
+        if paths:
+            frame_cache.prewarm(paths)
+            filmstrip.prewarm(paths)
+
+
     def load_scenes(self):
         _narr_default, _visual_style_default = self._defaults_from_project_config()
         scenes_file = config.get_scenes_path(self.pid)
@@ -744,6 +778,8 @@ class MagicWorkflow:
                 if not story_scene.get("caption"):
                     story_scene["caption"] = config.get_channel_config(self.channel)["channel_name"]
             self.save_scenes_to_json()
+            self.prewarm_media_probe()
+            self.prewarm_frame_cache()
             return
 
         self.scenes = []
@@ -1369,61 +1405,132 @@ class MagicWorkflow:
                 self.sd_processor.sound_to_video(prompt=right_prompt, file_prefix=right_file_prefix, image_path=right_image, sound_path=sound_path, animate_mode=animate_mode, silence=False)
 
 
-    def finalize_video(self, with_transitions, replace_final_audio_with_zero=False):
-        video_segments = []
-        for s in self.scenes:
-            #valid_narrator = None
-            #if add_narration and "narration" in s and "narrator" in s and s["narration"] and s["narrator"]:
-            #    valid_narrator = s["narrator"]
+    FINALIZE_MANIFEST = "segments.json"
+    FINALIZE_PIECES_DIR = "pieces"
+    # 逐场景分段只是拼接前的中间文件，用快速近无损档位编码；成片由拼接步骤按质量编码
+    FINALIZE_INTERMEDIATE_PROFILE = "fast"
+
+    def _finalize_scene_fingerprint(self, s, with_transitions, profile):
+        """成片分段指纹：clip / clip_audio 的文件身份 + 延长秒数 + 是否带转场 + 编码档位；任一变化即需重渲染该段。"""
+        payload = {
+            "profile": profile,
+            "clip": file_identity(s.get("clip")),
+            "clip_audio": file_identity(s.get("clip_audio")),
+            "extension": float(s.get("extension", 0) or 0),
+            "with_transitions": bool(with_transitions),
+        }
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
 
-            ext = float(s.get("extension", 0) or 0)
 
-            #if valid_narrator and ("left" in valid_narrator):
-            #    video_segments.append({"path":s["narration"], "transition":"fade", "duration":1.0, "extend":ext})
-            #    #v = self.ffmpeg_processor.add_audio_to_video(s["narration"], s["narration_audio"], True)
-            #    #video_segments.append({"path":v, "transition":"fade", "duration":1.0, "extend":ext})
+    def finalize_video(self, with_transitions, replace_final_audio_with_zero=False, incremental=False, single_pass=False, brand_overlays=False):
+        """合成成片到 ``config.publish_final_video_path``。
 
-            v = self.ffmpeg_processor.add_audio_to_video(s["clip"], s["clip_audio"], True)
-            #video_segments.append({"path":s["clip"], "transition":"fade", "duration":1.0, "extend":ext})
-            video_segments.append({"path":v, "transition":"fade", "duration":1.0, "extend":ext})
+        ``incremental=True``：保留 ``publish/<pid>/`` 下上次的 ``<指纹>.mp4`` 分段与 ``segments.json`` 指纹表，
+        指纹未变的场景直接复用分段（按指纹而非位置匹配，插入/删除/调换场景不影响其余场景）；带转场时改用 concat_videos_with_transitions_incremental，只重渲染受影响的过渡片段。
+        ``single_pass=True``：不生成逐场景分段，由 TimelineRenderer 把整条时间线编译成一张滤镜图一次编码。
+        ``brand_overlays=True``：频道水印（右下）与角标（左上）在最终拼接/转场的那次编码里一并叠加，不再另跑整片编码。
+        """
+        overlays = []
+        if brand_overlays:
+            overlays = resolve_brand_overlays_for_project(
+                project_manager.PROJECT_CONFIG or {}, self.ffmpeg_processor.width, self.ffmpeg_processor.height
+            )
+            print(f"🏷️  finalize: {len(overlays)} brand overlay(s) applied in the final encode")
+        if single_pass:
+            renderer = TimelineRenderer(self.ffmpeg_processor, overlays=overlays)
+            video_temp = renderer.render(self.scenes, with_transitions)
+            segment_durations = [c["segment_duration"] for c in renderer.clips]
+        else:
+            video_temp, segment_durations = self._finalize_segments(with_transitions, incremental, overlays)
+        self._finalize_output(video_temp, segment_durations, replace_final_audio_with_zero)
 
-            #if valid_narrator and (not "left" in valid_narrator):
-            #    video_segments.append({"path":s["narration"], "transition":"fade", "duration":1.0, "extend":ext})
-            #    #v = self.ffmpeg_processor.add_audio_to_video(s["narration"], s["narration_audio"], True)
-            #    #video_segments.append({"path":v, "transition":"fade", "duration":1.0, "extend":0})
 
+    def _finalize_segments(self, with_transitions, incremental, overlays=None):
+        """逐场景生成 ``publish/<pid>/<指纹>.mp4`` 后拼接；返回 (成片临时路径, 各分段时长)。"""
         final_video_dir = f"{self.publish_path}/{self.pid}"
         if not os.path.exists(final_video_dir):
             os.makedirs(final_video_dir)
-        for file in os.listdir(final_video_dir):
-            os.remove(os.path.join(final_video_dir, file))
+        manifest_path = os.path.join(final_video_dir, self.FINALIZE_MANIFEST)
+        pieces_dir = os.path.join(final_video_dir, self.FINALIZE_PIECES_DIR)
 
-        for i, v in enumerate(video_segments):
-            video_path = f"{final_video_dir}/{i:04d}.mp4"
-            if v["extend"] > 0.0 and with_transitions:
+        # 上次成片的分段指纹；分段文件以指纹命名，同一指纹的文件即可复用
+        reusable = set()
+        if incremental and os.path.isfile(manifest_path):
+            try:
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    reusable = {m.get("fingerprint") for m in json.load(f).get("segments", [])}
+            except (OSError, ValueError, AttributeError) as e:
+                print(f"⚠️ finalize manifest unreadable, full rebuild: {e}")
+                reusable = set()
+        if not incremental:
+            for file in os.listdir(final_video_dir):
+                path = os.path.join(final_video_dir, file)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.remove(path)
+
+        video_segments = []
+        manifest = []
+        rebuilt = 0
+        started = time.perf_counter()
+        # 不带转场时各分段会被 concat_videos 流复制进成片，因此直接按成片质量编码
+        profile = self.FINALIZE_INTERMEDIATE_PROFILE if with_transitions else "quality"
+        # 档位显式传给每次编码（同时进入渲染缓存 key），不改共享 FfmpegProcessor 的状态
+        for s in self.scenes:
+            ext = float(s.get("extension", 0) or 0)
+            fingerprint = self._finalize_scene_fingerprint(s, with_transitions, profile)
+            video_path = f"{final_video_dir}/{fingerprint}.mp4"
+            manifest.append({"file": os.path.basename(video_path), "fingerprint": fingerprint})
+            video_segments.append({"path":video_path, "transition":"fade", "duration":1.0, "extend":ext})
+
+            if fingerprint in reusable and os.path.isfile(video_path):
+                continue
+
+            v = self.ffmpeg_processor.add_audio_to_video(s["clip"], s["clip_audio"], True, profile=profile)
+            if ext > 0.0 and with_transitions:
                 # create new function to extend the clip (simple extend last frame (if extend > 0.0))
-                v_temp = self.ffmpeg_processor.extend_video(v["path"], v["extend"])
-            else:
-                v_temp = v["path"]
-            safe_copy_overwrite(v_temp, video_path)
-            video_segments[i]["path"] = video_path
+                v = self.ffmpeg_processor.extend_video(v, ext, profile=profile)
+            safe_copy_overwrite(v, video_path)
+            self.ffmpeg_processor.invalidate_duration_cache(video_path)
+            # 内容相同的场景（同一指纹）共用一个分段文件，只渲染一次
+            reusable.add(fingerprint)
+            rebuilt += 1
+        print(f"⏱️  finalize: {rebuilt} scene segments rendered in {time.perf_counter() - started:.2f}s (intermediate profile: {profile})")
+
+        if incremental:
+            keep = {m["file"] for m in manifest} | {self.FINALIZE_MANIFEST, self.FINALIZE_PIECES_DIR}
+            for file in os.listdir(final_video_dir):
+                if file not in keep:
+                    safe_remove(os.path.join(final_video_dir, file))
+            print(f"🧮 finalize: {rebuilt}/{len(manifest)} scene segments rebuilt")
+        write_json(manifest_path, {"segments": manifest})
 
         #video_temp = self.ffmpeg_processor._concat_videos_with_transitions(video_segments, frames_deduct=5.95, keep_audio_if_has=True)
 
-
-        if with_transitions:
-            video_temp = self.ffmpeg_processor.concat_videos_with_transitions(video_segments, keep_audio_if_has=True)
+        if with_transitions and incremental:
+            video_temp = self.ffmpeg_processor.concat_videos_with_transitions_incremental(
+                [seg["path"] for seg in video_segments], pieces_dir, keep_audio_if_has=True, overlays=overlays
+            )
+        elif with_transitions:
+            video_temp = self.ffmpeg_processor.concat_videos_with_transitions(video_segments, keep_audio_if_has=True, overlays=overlays)
         else:
-            video_temp = self.ffmpeg_processor.concat_videos([seg["path"] for seg in video_segments], keep_audio=True)
+            video_temp = self.ffmpeg_processor.concat_videos([seg["path"] for seg in video_segments], keep_audio=True, overlays=overlays)
+
+        segment_durations = [self.ffmpeg_processor.get_duration(seg["path"]) for seg in video_segments]
+        return video_temp, segment_durations
+
 
+    def _finalize_output(self, video_temp, segment_durations, replace_final_audio_with_zero):
         if replace_final_audio_with_zero:
             # 按时间线、连续同一 story（id 同一万档）分段。
             # 首场景有 zero_audio：用其铺满本 story 成片总时长（必要时裁切或循环）。
-            # 否则：按场景顺序拼接本 story 内所有 clip_audio，再裁切/静音补齐到与本 story 成片总时长一致。
-            # 最后再按 story 顺序 concat 成整条成片音轨。
-            per_story_audios = []
+            # 否则：按场景顺序排布本 story 内所有 clip_audio，超出本 story 成片时长处截断，不足处留静音（同原 extend_audio，不加淡出）。
+            # 整条成片音轨描述为一条音频时间线（utility/audio_timeline.py），一次合成。
+            timeline = AudioTimeline()
             n = len(self.scenes)
             idx = 0
+            story_start = 0.0
             aud = self.ffmpeg_audio_processor
             while idx < n:
                 scene0 = self.scenes[idx]
@@ -1431,39 +1538,37 @@ class MagicWorkflow:
                 story_dur = 0.0
                 j = idx
                 while j < n and int(self.scenes[j].get("id", 0) / 10000) == root_id:
-                    seg_path = video_segments[j]["path"]
-                    story_dur += self.ffmpeg_processor.get_duration(seg_path)
+                    story_dur += segment_durations[j]
                     j += 1
+                story_end = story_start + story_dur
 
                 za = get_file_path(scene0, "zero_audio")
-                if za and os.path.isfile(za):
-                    tiled = aud.audio_trim_or_loop_to_duration(za, story_dur)
+                if za and os.path.isfile(za) and aud.get_duration(za) > 0:
+                    timeline.add(AudioClip(za, start=story_start, length=story_dur, loop=True))
                 else:
-                    clip_paths = []
+                    clips = []
+                    cursor = story_start
                     for k in range(idx, j):
                         ca = get_file_path(self.scenes[k], "clip_audio")
-                        if ca and os.path.isfile(ca):
-                            clip_paths.append(ca)
-                    if not clip_paths:
-                        tiled = aud.make_silence(story_dur)
+                        if not ca or not os.path.isfile(ca) or cursor >= story_end:
+                            continue
+                        visible = min(aud.get_duration(ca), story_end - cursor)
+                        if visible > 0:
+                            clips.append(AudioClip(ca, start=cursor, length=visible))
+                            cursor += visible
+                    if clips:
+                        for clip in clips:
+                            timeline.add(clip)
                     else:
-                        merged = aud.concat_audios(clip_paths)
-                        if not merged:
-                            tiled = aud.make_silence(story_dur)
-                        else:
-                            tiled = aud.extend_audio(merged, 0.0, story_dur)
-                            if not tiled:
-                                tiled = aud.make_silence(story_dur)
-
-                if not tiled:
-                    tiled = aud.make_silence(story_dur)
-                per_story_audios.append(tiled)
+                        timeline.add(AudioClip(aud.silence_segment(story_dur), start=story_start))
 
+                story_start = story_end
                 idx = j
 
-            full_story_audio = aud.concat_audios(per_story_audios) if per_story_audios else None
+            timeline.duration = story_start
+            full_story_audio = aud.render_audio_timeline(timeline) if timeline.clips else None
             if full_story_audio:
-                video_temp = self.ffmpeg_processor.add_audio_to_video(video_temp, full_story_audio)
+                video_temp = self.ffmpeg_processor.add_audio_to_video(video_temp, full_story_audio, final=True)
 
         final_video_path = config.publish_final_video_path(self.pid)
         os.replace(video_temp, final_video_path)
@@ -1481,7 +1586,10 @@ class MagicWorkflow:
 
 
     def make_background_audio(self):
-        audio_segments = []
+        # 按场景顺序排布：无 zero 配置的场景为静音；zero 段从 zero_start 起裁到 zero_end（首尾 1 秒淡入淡出）。
+        # 描述为一条音频时间线（utility/audio_timeline.py），一次合成，不再逐段写临时 WAV 再 concat。
+        timeline = AudioTimeline()
+        cursor = 0.0
         started = None
         last_end = 0.0
         for s in self.scenes:
@@ -1494,17 +1602,24 @@ class MagicWorkflow:
             zero_end = s.get("zero_end", None)
 
             if not zero_end or not zero_volume or zero_clip_position < 0.0 or zero_clip_position >= duration-0.1:
-                audio_segments.append( self.ffmpeg_audio_processor.make_silence(duration) )
+                timeline.add(AudioClip(self.ffmpeg_audio_processor.silence_segment(duration), start=cursor))
+                cursor += duration
                 continue
 
             if not started:
                 started = s.get("zero_start", None)
                 if zero_clip_position > 0.0:
-                    audio_segments.append( self.ffmpeg_audio_processor.make_silence(zero_clip_position) )
+                    timeline.add(AudioClip(self.ffmpeg_audio_processor.silence_segment(zero_clip_position), start=cursor))
+                    cursor += zero_clip_position
 
             if started:
                 if zero_ending:
-                    audio_segments.append( self.ffmpeg_audio_processor.audio_cut_fade(zero, started, zero_end-started, 1.0, 1.0, zero_volume) )
+                    # 源不足时截短（同 audio_cut_fade），时间线游标按实际长度前进
+                    length = min(zero_end - started, self.ffmpeg_audio_processor.get_duration(zero) - started)
+                    if length > 0:
+                        timeline.add(AudioClip(zero, start=cursor, in_point=started, length=length,
+                                               gain=zero_volume, fade_in=1.0, fade_out=1.0))
+                        cursor += length
                     started = None
 
             if not zero_end:
@@ -1512,7 +1627,8 @@ class MagicWorkflow:
             else:
                 last_end = zero_end
 
-        audio_temp = self.ffmpeg_audio_processor.concat_audios(audio_segments)
+        timeline.duration = cursor
+        audio_temp = self.ffmpeg_audio_processor.render_audio_timeline(timeline)
         return audio_temp
 
 
@@ -0,0 +1,293 @@
+"""
+进程内音频引擎：解码后的 PCM 以 NumPy float32 缓冲（``(采样数, 2)``，44.1 kHz 立体声）在内存中做拼接、混音、
+增益、淡入淡出、循环与裁切，最后一次写出 WAV。
+
+FfmpegAudioProcessor 的 concat / mix / cut_fade / extend / trim_or_loop 原先各起一个 ffmpeg 进程并写临时 WAV，
+finalize_video、make_background_audio 每个项目串起几十次；这里：
+- ffmpeg 只用于解码（非 44.1 kHz 16-bit PCM WAV 的源）；本格式的 WAV 直接用 ``wave`` 读，写出也用 ``wave``；
+- 解码结果按文件身份（``render_cache.file_identity``）做按字节限额的 LRU，同一个源在一个流程里只解码一次；
+  引擎自己写出的 WAV 把缓冲同时放进缓存，后续步骤读它时不再解码；
+- 输出与原 ffmpeg 命令一致：pcm_s16le、44100 Hz、立体声；混音为 ``amix normalize=0`` 语义（直接相加，写出时截幅）。
+"""
+from __future__ import annotations
+
+import math
+import os
+import subprocess
+import threading
+import wave
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+from utility import ffmpeg_scheduler
+from utility.render_cache import file_identity
+
+ffmpeg_path = "ffmpeg"
+
+ENGINE_SAMPLE_RATE = 44100
+ENGINE_CHANNELS = 2
+# 解码缓存上限（字节）；44.1 kHz 立体声 float32 约 353 KB/秒，256 MB ≈ 12 分钟
+DECODE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+class AudioEngineError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class SilenceSegment:
+    """虚拟静音段：不落盘，拼接时才展开成缓冲（见 FfmpegAudioProcessor.silence_segment / concat_audios）。"""
+    duration: float
+
+
+class _BufferLRU:
+    """按缓冲字节数限额的 LRU（线程安全）。"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = int(max_bytes)
+        self._items: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            buf = self._items.get(key)
+            if buf is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return buf
+
+    def put(self, key, buf) -> None:
+        if buf.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._items[key] = buf
+            self._bytes += buf.nbytes
+            while self._bytes > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= evicted.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._bytes = 0
+
+
+_decoded = _BufferLRU(DECODE_CACHE_MAX_BYTES)
+
+
+def samples(seconds: float) -> int:
+    return max(0, int(round(float(seconds) * ENGINE_SAMPLE_RATE)))
+
+
+def duration_of(buf: np.ndarray) -> float:
+    return len(buf) / ENGINE_SAMPLE_RATE
+
+
+# ---- 解码 / 写出 ----
+
+def _read_native_wav(path: str, start: float = 0.0, duration: Optional[float] = None) -> Optional[np.ndarray]:
+    """44.1 kHz 16-bit 单/双声道 PCM WAV 直接读（只读 ``[start, start+duration)`` 的帧）；其他格式返回 None（走 ffmpeg）。"""
+    try:
+        with wave.open(path, "rb") as w:
+            if w.getsampwidth() != 2 or w.getframerate() != ENGINE_SAMPLE_RATE or w.getnchannels() not in (1, 2):
+                return None
+            channels = w.getnchannels()
+            total = w.getnframes()
+            first = min(total, samples(start))
+            count = total - first if duration is None else min(total - first, samples(duration))
+            w.setpos(first)
+            raw = w.readframes(count)
+    except (wave.Error, EOFError, OSError):
+        return None
+    data = np.frombuffer(raw[: len(raw) // (2 * channels) * 2 * channels], dtype="<i2").reshape(-1, channels)
+    buf = data.astype(np.float32) / 32768.0
+    if channels == 1:
+        buf = np.repeat(buf, 2, axis=1)
+    return buf
+
+
+def _ffmpeg_decode(path: str, start: float = 0.0, duration: Optional[float] = None) -> np.ndarray:
+    cmd = [ffmpeg_path, "-v", "error"]
+    if start > 0:
+        cmd += ["-ss", f"{start:.6f}"]
+    cmd += ["-i", path]
+    if duration is not None:
+        cmd += ["-t", f"{duration:.6f}"]
+    cmd += [
+        "-vn", "-ac", str(ENGINE_CHANNELS), "-ar", str(ENGINE_SAMPLE_RATE),
+        "-f", "f32le", "-c:a", "pcm_f32le", "-",
+    ]
+    try:
+        result = ffmpeg_scheduler.run(cmd, capture_output=True)
+    except (OSError, subprocess.SubprocessError) as e:
+        raise AudioEngineError(f"decode failed ({os.path.basename(path)}): {e}") from e
+    if result.returncode != 0:
+        err = (result.stderr or b"").decode("utf-8", errors="ignore").strip()
+        raise AudioEngineError(f"decode failed ({os.path.basename(path)}): {err[-300:]}")
+    frame_bytes = 4 * ENGINE_CHANNELS
+    usable = len(result.stdout) // frame_bytes * frame_bytes
+    return np.frombuffer(result.stdout[:usable], dtype="<f4").reshape(-1, ENGINE_CHANNELS)
+
+
+def decode(path: str, start: float = 0.0, duration: Optional[float] = None) -> np.ndarray:
+    """解码成 ``(n, 2)`` float32（只读，需要原地修改时先 copy）；失败抛 AudioEngineError。
+
+    给了 ``start`` / ``duration`` 时只解码这一段（ffmpeg ``-ss`` / ``-t``，原生 WAV 直接定位帧），
+    超出源长度的部分被截掉；整个文件已在缓存里时直接从中切出。
+    """
+    if not path or not os.path.isfile(path):
+        raise AudioEngineError(f"audio file not found: {path}")
+    start = max(0.0, float(start or 0.0))
+    if duration is not None:
+        duration = max(0.0, float(duration))
+    identity = file_identity(path)
+    windowed = start > 0 or duration is not None
+    if windowed:
+        whole = _decoded.get(identity)
+        if whole is not None:
+            return trim(whole, start, duration)
+    key = (identity, start, duration) if windowed else identity
+    buf = _decoded.get(key)
+    if buf is not None:
+        return buf
+    buf = _read_native_wav(path, start, duration)
+    if buf is None:
+        buf = _ffmpeg_decode(path, start, duration)
+    buf.flags.writeable = False
+    _decoded.put(key, buf)
+    return buf
+
+
+def write_wav(buf: np.ndarray, output_path: str) -> str:
+    """截幅后写 pcm_s16le WAV，并把（截幅后的）缓冲放进解码缓存。"""
+    pcm = np.clip(np.round(np.asarray(buf, dtype=np.float32) * 32768.0), -32768, 32767).astype("<i2")
+    if pcm.ndim == 1:
+        pcm = np.repeat(pcm[:, None], ENGINE_CHANNELS, axis=1)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with wave.open(output_path, "wb") as w:
+        w.setnchannels(ENGINE_CHANNELS)
+        w.setsampwidth(2)
+        w.setframerate(ENGINE_SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+    stored = pcm.astype(np.float32) / 32768.0
+    stored.flags.writeable = False
+    _decoded.put(file_identity(output_path), stored)
+    return output_path
+
+
+def clear_cache() -> None:
+    _decoded.clear()
+
+
+# ---- 运算（都返回新缓冲，不修改输入） ----
+
+def silence(duration: float) -> np.ndarray:
+    return np.zeros((samples(duration), ENGINE_CHANNELS), dtype=np.float32)
+
+
+def trim(buf: np.ndarray, start: float = 0.0, length: Optional[float] = None) -> np.ndarray:
+    """``[start, start+length)``；超出源长度的部分被截掉（与 ``-ss``/``-t`` 一致，不补静音）。"""
+    s0 = min(len(buf), samples(start))
+    s1 = len(buf) if length is None else min(len(buf), s0 + samples(length))
+    return buf[s0:s1]
+
+
+def pad_to(buf: np.ndarray, duration: float) -> np.ndarray:
+    """末尾补静音到 ``duration``（已够长则不变）。"""
+    n = samples(duration)
+    if len(buf) >= n:
+        return buf
+    return np.concatenate([buf, np.zeros((n - len(buf), buf.shape[1]), dtype=np.float32)])
+
+
+def loop_to(buf: np.ndarray, duration: float) -> np.ndarray:
+    """循环拼接并截到恰好 ``duration``；空缓冲返回静音。"""
+    n = samples(duration)
+    if not len(buf):
+        return silence(duration)
+    reps = -(-n // len(buf))
+    return np.tile(buf, (reps, 1))[:n] if reps > 1 else buf[:n]
+
+
+def concat(buffers: Iterable[np.ndarray]) -> np.ndarray:
+    parts = [b for b in buffers if b is not None and len(b)]
+    if not parts:
+        return silence(0)
+    return np.concatenate(parts).astype(np.float32, copy=False)
+
+
+def mix(buffers: Sequence[np.ndarray]) -> np.ndarray:
+    """等权相加，长度取最长（``amix duration=longest normalize=0``）。"""
+    parts = [b for b in buffers if b is not None]
+    if not parts:
+        return silence(0)
+    out = np.zeros((max(len(b) for b in parts), ENGINE_CHANNELS), dtype=np.float32)
+    for b in parts:
+        out[:len(b)] += b
+    return out
+
+
+def place(out: np.ndarray, buf: np.ndarray, offset: float) -> None:
+    """把 ``buf`` 叠加（相加）到 ``out`` 的 ``offset`` 秒处，超出 ``out`` 的部分丢弃（原地修改 ``out``）。"""
+    s0 = samples(offset)
+    if s0 >= len(out) or not len(buf):
+        return
+    n = min(len(buf), len(out) - s0)
+    out[s0:s0 + n] += buf[:n]
+
+
+def gain(buf: np.ndarray, volume: float) -> np.ndarray:
+    if volume == 1.0:
+        return buf
+    return buf * np.float32(volume)
+
+
+def _fade_curve(n: int, curve: str) -> np.ndarray:
+    """0→1 的增益曲线（与 ffmpeg afade 同名曲线一致）。"""
+    x = (np.arange(n, dtype=np.float64) + 0.5) / n
+    if curve == "esin":
+        g = 1.0 - np.cos(math.pi / 4.0 * ((2.0 * x - 1.0) ** 3 + 1.0))
+    elif curve == "qsin":
+        g = np.sin(x * math.pi / 2.0)
+    else:  # tri
+        g = x
+    return g.astype(np.float32)
+
+
+def fade(buf: np.ndarray, fade_in: float = 0.0, fade_out: float = 0.0, curve: str = "esin") -> np.ndarray:
+    """开头 ``fade_in`` 秒淡入、结尾 ``fade_out`` 秒淡出。"""
+    n_in = min(len(buf), samples(fade_in)) if fade_in > 0 else 0
+    n_out = min(len(buf), samples(fade_out)) if fade_out > 0 else 0
+    if not n_in and not n_out:
+        return buf
+    out = np.array(buf, dtype=np.float32, copy=True)
+    if n_in:
+        out[:n_in] *= _fade_curve(n_in, curve)[:, None]
+    if n_out:
+        out[len(out) - n_out:] *= _fade_curve(n_out, curve)[::-1, None]
+    return out
+
+
+def fade_out_at(buf: np.ndarray, start: float, duration: float, curve: str = "esin") -> np.ndarray:
+    """``afade=t=out:st=start:d=duration`` 语义：``start`` 之前不变，之后 ``duration`` 秒淡出，再往后静音。"""
+    s0 = samples(start)
+    if duration <= 0 or s0 >= len(buf):
+        return buf
+    n = samples(duration)
+    out = np.array(buf, dtype=np.float32, copy=True)
+    s1 = min(len(out), s0 + n)
+    if n:
+        out[s0:s1] *= _fade_curve(n, curve)[::-1][: s1 - s0, None]
+    out[s1:] = 0.0
+    return out
@@ -0,0 +1,86 @@
+"""
+声明式音频时间线：一组片段（时间线位置、源的入/出点、增益、淡入淡出、循环）一次渲染成一个 WAV。
+
+原先 make_background_audio / 成片音轨重建按顺序 ``audio_cut_fade`` → ``make_silence`` → ``concat_audios`` 串起来，
+每一步写一个临时 WAV、下一步再读回来；这里先把结构描述成时间线，再用 audio_engine 在内存中一次合成：
+
+    timeline = AudioTimeline()
+    timeline.add(AudioClip(zero_wav, start=12.0, in_point=3.5, length=20.0, gain=0.6, fade_in=1.0, fade_out=1.0))
+    timeline.add(AudioClip(processor.silence_segment(4.0), start=32.0))
+    wav = processor.render_audio_timeline(timeline)
+
+- 同一源被多个片段引用时只解码一次（audio_engine 解码缓存）；
+- 片段相加混合（重叠部分叠加，与 ``amix normalize=0`` 一致），未覆盖的时间为数字静音；
+- 源为 ``audio_engine.SilenceSegment`` 时由渲染方提供的 ``silence_buffer`` 展开（noise.wav 底噪）。
+"""
+from __future__ import annotations
+
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Union
+
+import numpy as np
+
+from utility import audio_engine
+
+Source = Union[str, audio_engine.SilenceSegment]
+
+
+@dataclass
+class AudioClip:
+    source: Source
+    # 在时间线上的起点（秒）
+    start: float = 0.0
+    # 源的入点（秒）
+    in_point: float = 0.0
+    # 在时间线上的长度；None 为源从入点到结尾（静音段为其自身时长）
+    length: Optional[float] = None
+    gain: float = 1.0
+    fade_in: float = 0.0
+    fade_out: float = 0.0
+    # 源不够 ``length`` 时：True 循环，False 截短（同 ``-ss``/``-t``，不补静音）
+    loop: bool = False
+
+
+@dataclass
+class AudioTimeline:
+    clips: List[AudioClip] = field(default_factory=list)
+    # 总时长；None 为最后一个片段的结尾
+    duration: Optional[float] = None
+
+    def add(self, clip: AudioClip) -> AudioClip:
+        self.clips.append(clip)
+        return clip
+
+    def _clip_buffer(self, clip: AudioClip, silence_buffer: Callable[[float], np.ndarray]) -> Optional[np.ndarray]:
+        if isinstance(clip.source, audio_engine.SilenceSegment):
+            buf = silence_buffer(clip.source.duration if clip.length is None else clip.length)
+        else:
+            try:
+                src = audio_engine.decode(clip.source)
+            except audio_engine.AudioEngineError as e:
+                print(f"⚠️ audio timeline: 跳过无法解码的片段 {clip.source}: {e}")
+                return None
+            buf = audio_engine.trim(src, clip.in_point)
+            if clip.length is not None:
+                buf = audio_engine.loop_to(buf, clip.length) if clip.loop else audio_engine.trim(buf, 0.0, clip.length)
+        buf = audio_engine.fade(buf, clip.fade_in, clip.fade_out)
+        return audio_engine.gain(buf, clip.gain)
+
+    def render(self, output_path: str, silence_buffer: Callable[[float], np.ndarray] = audio_engine.silence) -> Optional[str]:
+        """按时间线一次合成并写出 pcm_s16le WAV；没有任何片段时返回 None。"""
+        if not self.clips:
+            return None
+        started = time.perf_counter()
+        buffers = [(clip, self._clip_buffer(clip, silence_buffer)) for clip in self.clips]
+        total = self.duration
+        if total is None:
+            total = max((clip.start + audio_engine.duration_of(buf) for clip, buf in buffers if buf is not None), default=0.0)
+        out = audio_engine.silence(total)
+        for clip, buf in buffers:
+            if buf is not None:
+                audio_engine.place(out, buf, clip.start)
+        audio_engine.write_wav(out, output_path)
+        print(f"🎚️  audio timeline: {len(self.clips)} clips → {total:.2f}s in {time.perf_counter() - started:.2f}s ({os.path.basename(output_path)})")
+        return output_path
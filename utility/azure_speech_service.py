@@ -4,8 +4,12 @@ from typing import Dict, List
 import hashlib
 import re
 from .ffmpeg_audio_processor import FfmpegAudioProcessor
+from . import tts_cache
+from .file_util import safe_copy_overwrite
 import config
 
+_AZURE_OUTPUT_FORMAT = "audio-16khz-128kbitrate-mono-mp3"
+
 
 class AzureSpeechService:
     def __init__(self, pid: str, subscription_key: str = None, region: str = None):
@@ -167,7 +171,7 @@ class AzureSpeechService:
         return ssml
 
 
-    def synthesize_speech(self, ssml_text: str, output_format: str = "audio-16khz-128kbitrate-mono-mp3") -> bytes:
+    def synthesize_speech(self, ssml_text: str, output_format: str = _AZURE_OUTPUT_FORMAT) -> bytes:
         # if not self.access_token:
         self.get_access_token()
         
@@ -236,11 +240,16 @@ class AzureSpeechService:
         audio_path = os.path.abspath(f"{self.temp_dir}/{self.string_to_code(ssml)}.mp3")
         if os.path.exists(audio_path):
             return audio_path
+        # 跨项目 TTS 缓存：SSML 内已含音色/风格/语速，整段作为文本；voice 位放输出格式
+        cached = tts_cache.lookup("azure", _AZURE_OUTPUT_FORMAT, ssml)
+        if cached and safe_copy_overwrite(cached, audio_path):
+            return audio_path
         # Synthesize speech
-        audio_data = self.synthesize_speech(ssml)
+        audio_data = self.synthesize_speech(ssml, _AZURE_OUTPUT_FORMAT)
         # Save to file if specified
         with open(audio_path, 'wb') as f:
             f.write(audio_data)
+        tts_cache.store("azure", _AZURE_OUTPUT_FORMAT, ssml, audio_path)
 
         return audio_path
 
@@ -0,0 +1,95 @@
+"""
+机器级磁盘缓存的容量上限：``<root>/<key[:2]>/<条目>`` 布局（条目为文件或目录），总大小超过上限时按 mtime 从旧到新删除。
+
+frame_cache / filmstrip 等共用：命中时 ``touch`` 刷新 mtime（即最近使用时间），写入后 ``added`` 记账；
+首次记账时扫描一次目录得到当前总量，之后随写入累加，超限才重新扫描并淘汰到上限的 ``evict_ratio``。
+正在写入的临时文件/目录（名字含 ``.tmp``）不计入也不删除。
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+from typing import Callable, Optional
+
+
+class DiskBudget:
+    def __init__(self, name: str, root: Callable[[], str], max_bytes: int, evict_ratio: float = 0.9):
+        self.name = name
+        # 根目录取值推迟到使用时（config.MACHINE_CACHE_PATH 可能在导入后才设置）
+        self._root = root
+        self.max_bytes = int(max_bytes)
+        self.evict_ratio = float(evict_ratio)
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None
+
+    @staticmethod
+    def touch(path: str) -> None:
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+    @staticmethod
+    def entry_size(path: str) -> int:
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        total = 0
+        for dirpath, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(dirpath, name))
+                except OSError:
+                    pass
+        return total
+
+    def _scan(self) -> list:
+        entries = []
+        root = self._root()
+        if not os.path.isdir(root):
+            return entries
+        for sub in os.scandir(root):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if ".tmp" in entry.name:
+                    continue
+                try:
+                    entries.append((entry.stat().st_mtime, self.entry_size(entry.path), entry.path))
+                except OSError:
+                    continue
+        return entries
+
+    def _evict_locked(self) -> None:
+        entries = self._scan()
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_bytes:
+            started = time.perf_counter()
+            target = int(self.max_bytes * self.evict_ratio)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                try:
+                    if os.path.isdir(path):
+                        shutil.rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            print(
+                f"🧹 {self.name} cache: evicted {removed} entries, {total / 1024 / 1024:.0f} MB left "
+                f"({time.perf_counter() - started:.2f}s)"
+            )
+        self._total = total
+
+    def added(self, nbytes: int) -> None:
+        """记入新写入的 ``nbytes``；超过上限时淘汰。"""
+        with self._lock:
+            if self._total is not None:
+                self._total += int(nbytes)
+            if self._total is None or self._total > self.max_bytes:
+                self._evict_locked()
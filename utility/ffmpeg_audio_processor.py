@@ -1,19 +1,24 @@
 import os
 import subprocess
+import threading
 import config
 from utility.file_util import safe_copy_overwrite
+from utility import audio_engine, ffmpeg_capabilities, ffmpeg_scheduler, media_probe
+from utility.render_cache import file_identity
 
 
 ffmpeg_path = "ffmpeg"
 ffprobe_path = "ffprobe"
 
+# 底噪床长度（秒）：只缓存 noise.wav 开头这一段，任意时长的静音由它循环铺出
+NOISE_BED_SEC = 10.0
+
+# (noise.wav 文件身份, 底噪床缓冲)；只保留一份
+_noise_bed = None
+_silence_lock = threading.Lock()
 
-class FfmpegAudioProcessor:
-    # Class-level cache for duration values (shared across all instances)
-    _duration_cache = {}
-    # Class-level cache for CUDA availability
-    _cuda_available = None
 
+class FfmpegAudioProcessor:
 
     def __init__(self, pid):
         self.pid = pid
@@ -22,31 +27,54 @@ class FfmpegAudioProcessor:
 
     @classmethod
     def _check_cuda_availability(cls):
-        """检查 CUDA 硬件加速是否可用"""
-        if cls._cuda_available is not None:
-            return cls._cuda_available
+        """检查 CUDA 硬件加速是否可用（``-hwaccels`` 结果按 ffmpeg 二进制缓存，见 utility/ffmpeg_capabilities.py）"""
+        return ffmpeg_capabilities.has_hwaccel("cuda")
 
-        try:
-            cmd = [ffmpeg_path, "-hwaccels"]
-            result = subprocess.run(
-                cmd, 
-                check=True, 
-                capture_output=True, 
-                text=True, 
-                encoding='utf-8', 
-                errors='ignore'
-            )
-            cls._cuda_available = "cuda" in result.stdout
-            return cls._cuda_available
-        except Exception as e:
-            print(f"⚠️  无法检查 CUDA 可用性: {e}")
-            cls._cuda_available = False
-            return cls._cuda_available
 
+    @staticmethod
+    def _silence_buffer(duration):
+        """noise.wav 底噪循环铺到 ``duration``。
 
-    def make_silence(self, duration):
+        只缓存一份 NOISE_BED_SEC 秒的底噪床，每次按需 loop_to，长静音不常驻内存；
+        不加淡出（原 make_silence 以 fade_in=0 调 audio_cut_fade，淡出落在结尾之后）。
+        """
+        global _noise_bed
+        seconds = max(0.0, float(duration))
         noise_wav_path = config.BASE_PROGRAM_PATH+"/noise.wav"
-        return self.audio_cut_fade(noise_wav_path, 0, duration, 0, 1.0)
+        try:
+            identity = file_identity(noise_wav_path)
+            with _silence_lock:
+                bed = _noise_bed[1] if _noise_bed and _noise_bed[0] == identity else None
+            if bed is None:
+                bed = audio_engine.decode(noise_wav_path, 0.0, NOISE_BED_SEC)
+                with _silence_lock:
+                    _noise_bed = (identity, bed)
+        except (OSError, audio_engine.AudioEngineError) as e:
+            print(f"⚠️ noise.wav 不可用，使用数字静音: {e}")
+            return audio_engine.silence(seconds)
+        return audio_engine.loop_to(bed, seconds)
+
+    def silence_segment(self, duration):
+        """不落盘的静音段，交给 concat_audios 展开；只用于拼接，需要独立文件时用 make_silence。"""
+        return audio_engine.SilenceSegment(max(0.0, float(duration)))
+
+    def render_audio_timeline(self, timeline):
+        """渲染 utility/audio_timeline.AudioTimeline 为临时 WAV（一次合成；静音段用 noise.wav 底噪展开）。"""
+        output_path = config.get_temp_file(self.pid, "wav")
+        try:
+            return timeline.render(output_path, silence_buffer=self._silence_buffer)
+        except OSError as e:
+            print(f"❌ 音频时间线渲染失败: {e}")
+            return None
+
+    def make_silence(self, duration):
+        """静音（noise.wav 底噪）写成独立的临时 WAV（调用方可能移动/改写该文件，所以每次一个新文件；不起 ffmpeg）。"""
+        output_path = config.get_temp_file(self.pid, "wav")
+        try:
+            return audio_engine.write_wav(self._silence_buffer(duration), output_path)
+        except OSError as e:
+            print(f"❌ 生成静音失败: {e}")
+            return None
 
 
     def split_audio(self, original_clip, position):
@@ -54,7 +82,7 @@ class FfmpegAudioProcessor:
         s2nd = config.get_temp_file(self.pid, "wav")
         try:
             # 1st part: from start (0) to position
-            subprocess.run([
+            ffmpeg_scheduler.run([
                 ffmpeg_path, "-y",
                 "-i", original_clip,
                 "-t", str(position),   # duration = position sec
@@ -65,7 +93,7 @@ class FfmpegAudioProcessor:
             ], check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
 
             # 2nd part: from position to end
-            subprocess.run([
+            ffmpeg_scheduler.run([
                 ffmpeg_path, "-y",
                 "-i", original_clip,
                 "-ss", str(position),  # start from position
@@ -85,17 +113,10 @@ class FfmpegAudioProcessor:
     def to_wav(self, input_audio_path):
         output_audio_path = config.get_temp_file(self.pid, "wav")
         try:
-            subprocess.run([
-                ffmpeg_path, "-y",
-                "-i", input_audio_path,
-                "-c:a", "pcm_s16le",
-                "-ar", "44100", 
-                "-ac", "2",
-                output_audio_path
-            ], check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            return output_audio_path
-        except subprocess.CalledProcessError as e:
-            print(f"FFmpeg Error converting AAC to WAV: {e.stderr}")
+            # 44.1 kHz 16-bit WAV 直接读，其他格式由 ffmpeg 解码（utility/audio_engine.py）
+            return audio_engine.write_wav(audio_engine.decode(input_audio_path), output_audio_path)
+        except (audio_engine.AudioEngineError, OSError) as e:
+            print(f"FFmpeg Error converting AAC to WAV: {e}")
             return None
 
 
@@ -118,7 +139,7 @@ class FfmpegAudioProcessor:
                 output_audio_path
             ])
             
-            subprocess.run(
+            ffmpeg_scheduler.run(
                 cmd, 
                 check=True, 
                 capture_output=True, 
@@ -136,28 +157,17 @@ class FfmpegAudioProcessor:
         output_audio_path = config.get_temp_file(self.pid, output_format)
 
         # if the video has no audio channel, return None
-        try:
-            # Check if video has audio streams using ffprobe
-            result = subprocess.run([
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "a",
-                "-show_entries", "stream=codec_type",
-                "-of", "csv=p=0",
-                video_path
-            ], check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            if not result.stdout.strip():
-                print(f"No audio streams found in video: {os.path.basename(video_path)}")
-                return None
-                
-        except subprocess.CalledProcessError as e:
-            print(f"FFprobe Error checking audio streams: {e.stderr}")
+        info = media_probe.get_probe_cache(self.pid).probe(video_path)
+        if info is None:
+            print(f"FFprobe Error checking audio streams: {video_path}")
+            return None
+        if media_probe.first_stream(info, "audio") is None:
+            print(f"No audio streams found in video: {os.path.basename(video_path)}")
             return None
 
         try:
             if output_format == "mp3":
-                subprocess.run([
+                ffmpeg_scheduler.run([
                     ffmpeg_path, "-y",
                     "-i", video_path,
                     "-vn",
@@ -168,7 +178,7 @@ class FfmpegAudioProcessor:
                     output_audio_path
                 ], check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
             else: # wav
-                subprocess.run([
+                ffmpeg_scheduler.run([
                     ffmpeg_path, "-y",
                     "-i", video_path,
                     "-vn",
@@ -194,46 +204,28 @@ class FfmpegAudioProcessor:
         output_path = config.get_temp_file(self.pid, "wav")
         
         try:
-            cmd = [ffmpeg_path, '-y']
-            
+            valid_audio_list = []
             for audio_file in audio_list:
                 if audio_file and os.path.exists(audio_file):
-                    cmd.extend(['-i', audio_file])
+                    valid_audio_list.append(audio_file)
                 else:
                     print(f"警告：音频文件不存在或为空: {audio_file}")
-                    continue
             
-            valid_inputs = sum(1 for audio in audio_list if audio and os.path.exists(audio))
-            if valid_inputs == 0:
+            if len(valid_audio_list) == 0:
                 print("错误：没有找到有效的音频文件")
                 return None
-            elif valid_inputs == 1:
-                valid_file = next(audio for audio in audio_list if audio and os.path.exists(audio))
-                return self.to_wav(valid_file)
-            
-            # Mix all inputs with equal volume, keep longest duration
-            filter_complex = f"amix=inputs={valid_inputs}:duration=longest:normalize=0"
-            
-            cmd.extend([
-                '-filter_complex', filter_complex,
-                '-ac', '2',  # stereo output
-                '-ar', '44100',  # sample rate
-                '-f', 'wav',
-                output_path
-            ])
-            
-            print(f"🎵 混合 {valid_inputs} 个音频文件...")
-            subprocess.run(cmd, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            elif len(valid_audio_list) == 1:
+                return self.to_wav(valid_audio_list[0])
             
-            if os.path.exists(output_path):
-                print(f"✅ 音频混合完成: {output_path}")
-                return output_path
-            else:
-                print("❌ 音频混合失败：输出文件未生成")
-                return None
+            # Mix all inputs with equal volume, keep longest duration（amix normalize=0 语义，内存中完成）
+            print(f"🎵 混合 {len(valid_audio_list)} 个音频文件...")
+            mixed = audio_engine.mix([audio_engine.decode(audio) for audio in valid_audio_list])
+            audio_engine.write_wav(mixed, output_path)
+            print(f"✅ 音频混合完成: {output_path}")
+            return output_path
                 
-        except subprocess.CalledProcessError as e:
-            print(f"❌ FFmpeg音频混合错误: {e.stderr}")
+        except audio_engine.AudioEngineError as e:
+            print(f"❌ 音频混合错误: {e}")
             return None
         except Exception as e:
             print(f"❌ 音频混合异常: {str(e)}")
@@ -241,58 +233,39 @@ class FfmpegAudioProcessor:
 
 
     def concat_audios(self, audio_list):
+        """``audio_list`` 的元素为音频路径或 silence_segment() 返回的虚拟静音段（拼接时才展开，不落盘）。"""
         if not audio_list or len(audio_list) == 0:
             return None
         
         output_path = config.get_temp_file(self.pid, "wav")
         
-        if len(audio_list) == 1:
+        if len(audio_list) == 1 and not isinstance(audio_list[0], audio_engine.SilenceSegment):
             # Convert to wav for consistency
             return self.to_wav(audio_list[0])
 
         try:
-            valid_audio_list = [audio for audio in audio_list if audio and os.path.exists(audio)]
+            valid_audio_list = [
+                audio for audio in audio_list
+                if isinstance(audio, audio_engine.SilenceSegment) or (audio and os.path.exists(audio))
+            ]
             
             if len(valid_audio_list) == 0:
                 print("错误：没有找到有效的音频文件")
                 return None
-            elif len(valid_audio_list) == 1:
+            elif len(valid_audio_list) == 1 and not isinstance(valid_audio_list[0], audio_engine.SilenceSegment):
                 return self.to_wav(valid_audio_list[0])
 
-            # filter_complex + aresample：避免 concat demuxer 在采样率/声道不一致时整段加速
-            n = len(valid_audio_list)
-            cmd = [ffmpeg_path, "-y"]
-            for audio in valid_audio_list:
-                cmd.extend(["-i", audio])
-            filter_parts = []
-            for i in range(n):
-                filter_parts.append(
-                    f"[{i}:a]aformat=sample_fmts=s16:channel_layouts=stereo:sample_rates=44100,"
-                    f"aresample=44100[a{i}]"
-                )
-            concat_in = "".join(f"[a{i}]" for i in range(n))
-            filter_parts.append(f"{concat_in}concat=n={n}:v=0:a=1[out]")
-            cmd.extend([
-                "-filter_complex", ";".join(filter_parts),
-                "-map", "[out]",
-                "-c:a", "pcm_s16le",
-                "-ar", "44100",
-                "-ac", "2",
-                output_path,
-            ])
-            
-            subprocess.run(cmd, check=True, capture_output=True, 
-                         text=True, encoding='utf-8', errors='ignore')
-            
-            if os.path.exists(output_path):
-                print(f"✅ 成功连接 {len(valid_audio_list)} 个音频文件: {output_path}")
-                return output_path
-            else:
-                print("❌ 音频连接失败：输出文件未生成")
-                return None
+            # 各段解码为 44.1 kHz 立体声后在内存中拼接（同一源只解码一次），一次写出
+            joined = audio_engine.concat(
+                self._silence_buffer(audio.duration) if isinstance(audio, audio_engine.SilenceSegment) else audio_engine.decode(audio)
+                for audio in valid_audio_list
+            )
+            audio_engine.write_wav(joined, output_path)
+            print(f"✅ 成功连接 {len(valid_audio_list)} 个音频文件: {output_path}")
+            return output_path
 
-        except subprocess.CalledProcessError as e:
-            print(f"❌ FFmpeg音频连接错误: {e.stderr}")
+        except audio_engine.AudioEngineError as e:
+            print(f"❌ 音频连接错误: {e}")
             return None
         except Exception as e:
             print(f"❌ 音频连接异常: {str(e)}")
@@ -344,7 +317,7 @@ class FfmpegAudioProcessor:
             print(f"主音频时长: {main_audio_duration:.2f}s, 主音量: {main_volume}, 开始时间: {start_time}s, 剩余时间: {remaining_time:.2f}s")
             print(f"混音文件时长: {mix_sound_duration:.2f}s, 混音音量: {mix_volume}")
             
-            subprocess.run([
+            ffmpeg_scheduler.run([
                 ffmpeg_path, "-y",
                 "-i", audio_path,
                 "-i", mix_sound_path,
@@ -398,44 +371,18 @@ class FfmpegAudioProcessor:
             print(f"ℹ️ 音频时长 ({available_duration:.2f}s) 已满足目标时长 ({target_length:.2f}s)，进行裁剪")
             return self.audio_cut_fade(audio_path, start_time, target_length, 0, 1.0)
         
-        # 需要扩展：先裁剪音频，然后添加静音
+        # 需要扩展：从 start_time 解码到结尾后补静音，内存中完成
         try:
-            # 裁剪音频（从 start_time 到结尾）
-            cut_audio_path = self.audio_cut_fade(audio_path, start_time, available_duration, 0, 1.0)
-            
-            # 检查裁剪是否成功
-            if not cut_audio_path or not os.path.exists(cut_audio_path):
-                print(f"❌ 音频裁剪失败: {cut_audio_path}")
-                return None
-            
-            # 计算需要添加的静音时长
             output_path = config.get_temp_file(self.pid, "wav")
             silence_duration = target_length - available_duration
             
             print(f'🔇 扩展音频: 原始时长 {available_duration:.2f}s -> 目标时长 {target_length:.2f}s (添加 {silence_duration:.2f}s 静音)')
             
-            # 将裁剪后的音频与静音连接
-            subprocess.run([
-                ffmpeg_path, "-y",
-                "-i", cut_audio_path,
-                "-f", "lavfi",
-                "-i", f"anullsrc=channel_layout=stereo:sample_rate=44100:duration={silence_duration}",
-                "-filter_complex", "[0:a][1:a]concat=n=2:v=0:a=1",
-                "-ac", "2",
-                "-ar", "44100",
-                "-c:a", "pcm_s16le",
-                output_path
-            ], check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            # 验证输出文件是否生成
-            if not os.path.exists(output_path):
-                print(f"❌ 扩展音频失败：输出文件未生成")
-                return None
-            
-            return output_path
+            cut = audio_engine.decode(audio_path, start_time)
+            return audio_engine.write_wav(audio_engine.pad_to(cut, target_length), output_path)
                 
-        except subprocess.CalledProcessError as e:
-            print(f"❌ FFmpeg 错误 (extend_audio): {e.stderr}")
+        except audio_engine.AudioEngineError as e:
+            print(f"❌ 音频解码错误 (extend_audio): {e}")
             return None
         except Exception as e:
             print(f"❌ 扩展音频时发生错误: {e}")
@@ -456,19 +403,10 @@ class FfmpegAudioProcessor:
             return self.audio_cut_fade(audio_path, 0.0, float(target_duration_sec), 0, 0, 1.0)
         output_path = config.get_temp_file(self.pid, "wav")
         try:
-            subprocess.run([
-                ffmpeg_path, "-y",
-                "-stream_loop", "-1",
-                "-i", audio_path,
-                "-t", str(float(target_duration_sec)),
-                "-ac", "2",
-                "-ar", "44100",
-                "-c:a", "pcm_s16le",
-                output_path,
-            ], check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            return output_path if os.path.exists(output_path) else None
-        except subprocess.CalledProcessError as e:
-            print(f"❌ FFmpeg 错误 (audio_trim_or_loop_to_duration): {e.stderr}")
+            looped = audio_engine.loop_to(audio_engine.decode(audio_path), float(target_duration_sec))
+            return audio_engine.write_wav(looped, output_path)
+        except audio_engine.AudioEngineError as e:
+            print(f"❌ 音频解码错误 (audio_trim_or_loop_to_duration): {e}")
         except Exception as e:
             print(f"❌ audio_trim_or_loop_to_duration: {e}")
         return self.make_silence(target_duration_sec)
@@ -490,55 +428,24 @@ class FfmpegAudioProcessor:
             if not (0.1 <= volume <= 5.0):
                 raise ValueError(f'Volume must be between 0.1 and 5.0, got {volume}')
             
-            # Build audio filter components conditionally
-            filter_parts = []
-            
-            # Add fade effects only if fade_length > 0
-            if fade_in > 0:
-                filter_parts.append(f"afade=t=in:st=0:d={fade_in}:curve=esin")
-
+            # 只解码 [start_time, start_time+output_length) → 淡入/淡出 → 音量，内存中完成后一次写出。
+            # 淡出沿用原 afade 参数：从 output_length - fade_in 处开始、持续 fade_out 秒（fade_in=0 时落在结尾之后，即不淡出）
+            buf = audio_engine.decode(raw_auddio_path, start_time, output_length)
+            buf = audio_engine.fade(buf, fade_in, 0, curve="esin")
             if fade_out > 0:
-                fade_out_start = max(0, output_length - fade_in)
-                filter_parts.append(f"afade=t=out:st={fade_out_start}:d={fade_out}:curve=esin")
-            
-            # Add volume adjustment only if volume != 1.0
+                buf = audio_engine.fade_out_at(buf, max(0, output_length - fade_in), fade_out, curve="esin")
             if volume != 1.0:
-                filter_parts.append(f"volume={volume}")
+                buf = audio_engine.gain(buf, volume)
                 print(f'🔊 Volume adjustment applied: {volume} (1.0=normal, <1.0=quieter, >1.0=louder)')
-            else:
-                print(f'🔊 Volume adjustment skipped (volume={volume})')
-            
-            # Build FFmpeg command
-            cmd = [
-                ffmpeg_path, "-y",
-                "-ss", str(start_time),      # Start from the specified time
-                "-i", raw_auddio_path,       # Input audio file
-                "-t", str(output_length),    # Trim the audio to the specified output length
-            ]
-            
-            # Add audio filter only if there are filter parts to apply
-            if filter_parts:
-                audio_filter = ",".join(filter_parts)
-                cmd.extend(["-af", audio_filter])
-                print(f'🎵 Audio filter applied: {audio_filter}')
-            else:
-                print(f'🎵 No audio filters applied - using raw audio')
-            
-            cmd.extend([
-                "-ac", "2",
-                "-ar", "44100",
-                "-c:a", "pcm_s16le",
-                output_path
-            ])
             
             print(f'⏱️  Audio timing: start={start_time}s, length={output_length}s, fade={fade_in}s')
 
-            subprocess.run(cmd, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
+            audio_engine.write_wav(buf, output_path)
             
             print(f'✅ Audio processing completed: {output_path}')
             
-        except subprocess.CalledProcessError as e:
-            print(f"FFmpeg Error in fade_audio: {e.stderr}")
+        except audio_engine.AudioEngineError as e:
+            print(f"Audio decode error in fade_audio: {e}")
         except Exception as e:
             print(f"An error occurred in fade_audio: {e}")
 
@@ -548,37 +455,15 @@ class FfmpegAudioProcessor:
     def get_duration(self, filename):
         if not filename:
             return 0.0
-        
-        # Check cache first
-        if filename in FfmpegAudioProcessor._duration_cache:
-            return FfmpegAudioProcessor._duration_cache[filename]
-        
-        try:    
-            result = subprocess.run([
-                ffprobe_path,
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                filename
-                ], check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-            
-            if result.returncode == 0 and result.stdout.strip():
-                duration = float(result.stdout.strip())
-                # Save to cache
-                FfmpegAudioProcessor._duration_cache[filename] = duration
-                return duration
-            return 0.0
-        except Exception as e:
-            print(f"FFmpeg Error: {e}")
-            return 0.0
+        # ffprobe 结果与 FfmpegProcessor 共用同一项目缓存（utility/media_probe.py）
+        return media_probe.format_duration(media_probe.get_probe_cache(self.pid).probe(filename))
 
     @classmethod
     def clear_duration_cache(cls):
-        """Clear all cached duration values"""
-        cls._duration_cache.clear()
+        """Clear all cached probe results"""
+        media_probe.clear_all()
 
     @classmethod
     def invalidate_duration_cache(cls, filename):
-        """Remove a specific file from the duration cache (use when file is modified)"""
-        if filename in cls._duration_cache:
-            del cls._duration_cache[filename]
+        """Remove a specific file from the probe cache (use when file is modified)"""
+        media_probe.invalidate(filename)
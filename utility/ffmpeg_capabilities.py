@@ -0,0 +1,286 @@
+"""
+本机 ffmpeg 能力探测与编码档位选择。
+
+探测内容：``-encoders`` / ``-filters`` / ``-hwaccels`` 列表、CPU 线程数、NVENC 是否真能编码
+（列出 h264_nvenc 但没有可用 GPU 的机器很常见，因此用 lavfi 测试源实编几帧确认）。
+无可用 NVENC 时做一次 libx264 自测：1080p 测试源按若干 preset / 线程数各编一小段，
+选出速度达标的最慢（画质最好）preset 与最快的线程设置，作为 ``_get_encoder_config`` 的默认值。
+
+磁盘缓存：``config.MACHINE_CACHE_PATH/ffmpeg_capabilities.json``，key 为 ffmpeg 二进制 sha256 + 主机名/CPU
+（该目录可能被多台机器共享），条目超过 ``CAPABILITIES_TTL_SEC`` 重新探测。
+NVENC 结果不落盘：GPU/驱动会变、探测时也可能偶发失败，每个进程实测一次（几帧，约 1 秒）。
+同一进程内只探测一次（``get_capabilities``）；探测在锁外进行，并发调用方等待结果。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import threading
+import time
+from typing import Optional
+
+import config
+from utility import ffmpeg_scheduler
+
+ffmpeg_path = "ffmpeg"
+
+# 探测逻辑/字段变更时 bump，旧缓存失效
+CAPABILITIES_VERSION = 2
+# 磁盘缓存有效期（秒）；过期后重新探测（编码器列表、x264 自测）
+CAPABILITIES_TTL_SEC = 7 * 24 * 3600
+# x264 自测：候选 preset（画质从低到高）与判定「够快」的编码帧率（1080p）
+X264_PRESET_CANDIDATES = ("veryfast", "faster", "fast", "medium")
+X264_MIN_ENCODE_FPS = 30.0
+X264_SELFTEST_FRAMES = 90
+X264_SELFTEST_SIZE = "1920x1080"
+
+NVENC_PROFILE = {
+    "codec": "h264_nvenc",
+    "preset": "fast",
+    "quality": ["-cq", "18"],  # Use CQ for NVENC
+    "hwaccel": ["-hwaccel", "cuda"],
+}
+X264_DEFAULT_PROFILE = {
+    "codec": "libx264",
+    "preset": "medium",
+    "quality": ["-crf", "18"],  # Use CRF for x264
+    "hwaccel": [],
+}
+
+_lock = threading.Lock()
+_capabilities: Optional[dict] = None
+# 正在探测时的完成事件（持有者在锁外探测，其他调用方等待）
+_probing: Optional[threading.Event] = None
+
+
+def _cache_file() -> str:
+    return os.path.join(config.MACHINE_CACHE_PATH, "ffmpeg_capabilities.json")
+
+
+def _binary_hash(binary: str) -> str:
+    h = hashlib.sha256()
+    with open(binary, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _store_key(binary: str) -> str:
+    """ffmpeg 二进制 + 本机身份：共享缓存目录里各机器的 x264 自测结果互不混用。"""
+    machine = f"{platform.node()}|{platform.machine()}|{os.cpu_count() or 1}"
+    return hashlib.sha256(f"{_binary_hash(binary)}|{machine}".encode("utf-8")).hexdigest()
+
+
+def _run(args, timeout=60) -> subprocess.CompletedProcess:
+    return ffmpeg_scheduler.run(
+        [ffmpeg_path, "-hide_banner", *args],
+        capture_output=True, text=True, encoding="utf-8", errors="ignore", timeout=timeout,
+    )
+
+
+def _list_names(args, min_flag_len) -> list[str]:
+    """解析 ``-encoders`` / ``-filters`` 的表格输出：标志列之后的第一列为名称。"""
+    names = []
+    result = _run(args)
+    for line in (result.stdout or "").splitlines():
+        parts = line.split()
+        if len(parts) >= 2 and len(parts[0]) >= min_flag_len and set(parts[0]) <= set("VASFXBDTCI.|-") and parts[1] != "=":
+            names.append(parts[1])
+    return names
+
+
+def _list_hwaccels() -> list[str]:
+    result = _run(["-hwaccels"])
+    lines = (result.stdout or "").splitlines()
+    if lines and lines[0].lower().startswith("hardware acceleration"):
+        lines = lines[1:]
+    return [ln.strip() for ln in lines if ln.strip()]
+
+
+def _encode_test(codec_args, frames, size="256x256") -> Optional[float]:
+    """lavfi testsrc 实编 ``frames`` 帧到 null；成功返回编码帧率，失败返回 None。"""
+    cmd = [
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate=60",
+        "-frames:v", str(frames), "-pix_fmt", "yuv420p", *codec_args, "-f", "null", "-",
+    ]
+    started = time.perf_counter()
+    try:
+        result = _run(cmd, timeout=120)
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    if result.returncode != 0:
+        return None
+    return frames / max(1e-6, time.perf_counter() - started)
+
+
+def _x264_selftest(threads: int) -> dict:
+    """选 preset：候选中编码帧率达标的最慢一档；再比较自动线程与显式线程数。"""
+    results = {}
+    chosen = X264_PRESET_CANDIDATES[0]
+    for preset in X264_PRESET_CANDIDATES:
+        fps = _encode_test(["-c:v", "libx264", "-preset", preset, "-crf", "18"], X264_SELFTEST_FRAMES, X264_SELFTEST_SIZE)
+        results[preset] = round(fps or 0.0, 1)
+        if fps is None or fps < X264_MIN_ENCODE_FPS:
+            break
+        chosen = preset
+    thread_args = []
+    auto_fps = results.get(chosen) or 0.0
+    if threads > 2:
+        explicit = _encode_test(
+            ["-c:v", "libx264", "-preset", chosen, "-crf", "18", "-threads", str(threads)],
+            X264_SELFTEST_FRAMES, X264_SELFTEST_SIZE,
+        )
+        if explicit and explicit > auto_fps * 1.05:
+            thread_args = ["-threads", str(threads)]
+    print(f"🧪 x264 self-test fps {results} → preset {chosen}{' ' + ' '.join(thread_args) if thread_args else ''}")
+    return {"preset": chosen, "threads": thread_args, "fps": results}
+
+
+def probe_capabilities() -> dict:
+    """实际探测编码器/滤镜/硬件加速列表（不读缓存、不含 NVENC 实测）。ffmpeg 不可用时返回 ``{"available": False}``。"""
+    threads = os.cpu_count() or 1
+    try:
+        encoders = _list_names(["-encoders"], 6)
+        filters = _list_names(["-filters"], 3)
+        hwaccels = _list_hwaccels()
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"⚠️  ffmpeg capability probe failed: {e}")
+        return {"available": False, "threads": threads}
+    return {
+        "available": True,
+        "encoders": encoders,
+        "filters": filters,
+        "hwaccels": hwaccels,
+        "threads": threads,
+        "x264": None,
+    }
+
+
+def probe_nvenc(encoders) -> bool:
+    return "h264_nvenc" in encoders and _encode_test(["-c:v", "h264_nvenc"], 5) is not None
+
+
+def _read_store() -> dict:
+    try:
+        with open(_cache_file(), "r", encoding="utf-8") as f:
+            store = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return store if isinstance(store, dict) else {}
+
+
+def _write_store_entry(key: str, binary: str, caps: dict) -> None:
+    store = _read_store()
+    now = time.time()
+    # 顺带清掉过期条目（旧二进制、其他机器的陈旧结果）
+    store = {
+        k: v for k, v in store.items()
+        if isinstance(v, dict) and now - float(v.get("probed_at", 0)) < CAPABILITIES_TTL_SEC
+    }
+    store[key] = {
+        "version": CAPABILITIES_VERSION, "binary": binary, "host": platform.node(),
+        "probed_at": now, "capabilities": caps,
+    }
+    try:
+        os.makedirs(os.path.dirname(_cache_file()), exist_ok=True)
+        tmp = f"{_cache_file()}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(store, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, _cache_file())
+    except OSError as e:
+        print(f"⚠️  could not write ffmpeg capability cache: {e}")
+
+
+def _resolve_capabilities() -> dict:
+    """磁盘缓存（按二进制 + 本机、未过期）→ 实测；NVENC 总是实测。"""
+    binary = shutil.which(ffmpeg_path)
+    if not binary:
+        print(f"⚠️  ffmpeg not found on PATH ({ffmpeg_path})")
+        return {"available": False, "threads": os.cpu_count() or 1}
+    started = time.perf_counter()
+    key = _store_key(binary)
+    entry = _read_store().get(key)
+    fresh = (
+        isinstance(entry, dict)
+        and entry.get("version") == CAPABILITIES_VERSION
+        and time.time() - float(entry.get("probed_at", 0)) < CAPABILITIES_TTL_SEC
+    )
+    caps = dict(entry["capabilities"]) if fresh else probe_capabilities()
+    if not caps.get("available"):
+        return caps
+    dirty = not fresh
+
+    nvenc_ok = probe_nvenc(caps.get("encoders", []))
+    if not nvenc_ok and "libx264" in caps.get("encoders", []) and not caps.get("x264"):
+        caps["x264"] = _x264_selftest(caps["threads"])
+        dirty = True
+    if dirty:
+        _write_store_entry(key, binary, caps)
+    print(
+        f"🔧 ffmpeg capabilities {'loaded' if fresh else 'probed'} in {time.perf_counter() - started:.1f}s "
+        f"(nvenc={nvenc_ok})"
+    )
+    return {**caps, "nvenc_ok": nvenc_ok}
+
+
+def get_capabilities() -> dict:
+    """本进程缓存 → 磁盘缓存 → 实测。探测在锁外进行，同时到达的调用方等待同一次探测的结果。"""
+    global _capabilities, _probing
+    with _lock:
+        if _capabilities is not None:
+            return _capabilities
+        owner = _probing is None
+        if owner:
+            _probing = threading.Event()
+        event = _probing
+    if not owner:
+        event.wait()
+        with _lock:
+            return _capabilities if _capabilities is not None else {"available": False, "threads": os.cpu_count() or 1}
+
+    caps = {"available": False, "threads": os.cpu_count() or 1}
+    try:
+        caps = _resolve_capabilities()
+    finally:
+        with _lock:
+            _capabilities = caps
+            _probing = None
+        event.set()
+    return caps
+
+
+def warm_up() -> None:
+    """后台线程预先探测（GUI 启动时调用），首个渲染任务不必等待自测。"""
+    threading.Thread(target=get_capabilities, daemon=True).start()
+
+
+def has_encoder(name: str) -> bool:
+    return name in get_capabilities().get("encoders", [])
+
+
+def has_filter(name: str) -> bool:
+    return name in get_capabilities().get("filters", [])
+
+
+def has_hwaccel(name: str) -> bool:
+    return name in get_capabilities().get("hwaccels", [])
+
+
+def encoder_profile() -> dict:
+    """成片编码档位：NVENC 可用则用 NVENC，否则 libx264（preset/线程取自测结果，无自测时为 medium）。"""
+    caps = get_capabilities()
+    if caps.get("nvenc_ok"):
+        profile = dict(NVENC_PROFILE)
+        if "cuda" not in caps.get("hwaccels", []):
+            profile["hwaccel"] = []
+        return profile
+    profile = dict(X264_DEFAULT_PROFILE)
+    x264 = caps.get("x264")
+    if x264:
+        profile["preset"] = x264["preset"]
+        profile["threads"] = list(x264.get("threads") or [])
+    return profile
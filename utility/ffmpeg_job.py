@@ -0,0 +1,252 @@
+"""
+ffmpeg / ffprobe 子进程作业：流式进度、取消、超时与有界 stderr。
+
+``FfmpegProcessor.run_ffmpeg_command`` 经由这里执行。编码类命令（有 ``-i`` 且输出到文件）自动加
+``-progress pipe:1 -nostats``，按块解析 ``frame`` / ``out_time_us`` / ``speed`` 等字段回调 ``on_progress``；
+其余命令（ffprobe、``ffmpeg -encoders``）照常完整收集 stdout。stderr 只保留最后 ``STDERR_TAIL_LINES`` 行，
+失败时以 ``subprocess.CalledProcessError``（``stderr`` 为尾部日志）抛出，与原先 ``subprocess.run(check=True)`` 兼容。
+``run()`` / ``run_async()`` 先向 ``utility/ffmpeg_scheduler.py`` 领取槽位再启动子进程。
+
+同步用法::
+
+    job = FfmpegJob(cmd, on_progress=print, timeout=600)
+    result = job.run()            # 另一线程可调用 job.cancel()
+
+asyncio 用法（任务被 cancel 时同时终止 ffmpeg）::
+
+    result = await FfmpegJob(cmd).run_async()
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+import os
+import subprocess
+import threading
+import time
+from typing import Callable, Optional
+
+from utility import ffmpeg_scheduler
+
+# stderr 环形缓冲保留的行数（长渲染的 stderr 可达数十 MB）
+STDERR_TAIL_LINES = 400
+# cancel/超时先 terminate，等待此秒数仍未退出则 kill
+TERMINATE_GRACE_SEC = 5.0
+
+
+class FfmpegJobCancelled(Exception):
+    """作业被 ``cancel()`` 终止。"""
+
+    def __init__(self, cmd, stderr=""):
+        super().__init__(f"ffmpeg job cancelled: {os.path.basename(str(cmd[0]))}")
+        self.cmd = cmd
+        self.stderr = stderr
+
+
+def _wants_progress(cmd) -> bool:
+    """仅对「有输入、输出到文件」的 ffmpeg 命令注入 -progress（ffprobe 与 stdout 输出需要原样 stdout）。"""
+    if not cmd or "ffprobe" in os.path.basename(str(cmd[0])).lower():
+        return False
+    if "-i" not in cmd or "-progress" in cmd:
+        return False
+    last = str(cmd[-1])
+    return last != "-" and not last.startswith("pipe:")
+
+
+def _parse_out_time(block: dict) -> float:
+    # out_time_ms 实际单位也是微秒（ffmpeg 历史遗留）
+    for key in ("out_time_us", "out_time_ms"):
+        value = block.get(key)
+        if value and value.lstrip("-").isdigit():
+            return max(0.0, int(value) / 1_000_000)
+    return 0.0
+
+
+class FfmpegJob:
+    """单个 ffmpeg/ffprobe 子进程。``duration`` 已知时进度回调会带 ``percent``。"""
+
+    def __init__(
+        self,
+        cmd,
+        *,
+        on_progress: Optional[Callable[[dict], None]] = None,
+        timeout: Optional[float] = None,
+        duration: Optional[float] = None,
+        stderr_lines: int = STDERR_TAIL_LINES,
+        kind: Optional[str] = None,
+        priority: Optional[int] = None,
+    ):
+        self.progress_enabled = _wants_progress(cmd)
+        if self.progress_enabled:
+            # 全局选项放在输出路径之前即可生效
+            cmd = list(cmd[:-1]) + ["-progress", "pipe:1", "-nostats", cmd[-1]]
+        self.cmd = list(cmd)
+        self.on_progress = on_progress
+        self.timeout = timeout
+        self.duration = duration
+        # 调度池（默认按命令推断）与优先级（默认按发起线程推断），见 ffmpeg_scheduler
+        self.kind = kind
+        self.priority = priority
+        self.progress: dict = {}
+        self.returncode: Optional[int] = None
+        self._stderr = collections.deque(maxlen=max(1, int(stderr_lines)))
+        self._stdout: list[str] = []
+        self._proc: Optional[subprocess.Popen] = None
+        self._readers: list[threading.Thread] = []
+        self._cancelled = threading.Event()
+        self._started_at = 0.0
+
+    # ---- 生命周期 ----
+
+    def start(self) -> "FfmpegJob":
+        if self._proc is not None:
+            return self
+        self._started_at = time.perf_counter()
+        self._proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True, encoding="utf-8", errors="ignore",
+        )
+        stdout_reader = self._read_progress if self.progress_enabled else self._read_stdout
+        self._readers = [
+            threading.Thread(target=stdout_reader, daemon=True),
+            threading.Thread(target=self._read_stderr, daemon=True),
+        ]
+        for t in self._readers:
+            t.start()
+        return self
+
+    def wait(self) -> subprocess.CompletedProcess:
+        """等待结束；失败抛 CalledProcessError，超时抛 TimeoutExpired，取消抛 FfmpegJobCancelled。"""
+        self.start()
+        deadline = self._started_at + self.timeout if self.timeout else None
+        while True:
+            try:
+                self.returncode = self._proc.wait(timeout=0.2)
+                break
+            except subprocess.TimeoutExpired:
+                pass
+            if self._cancelled.is_set():
+                self._terminate()
+                self._join_readers()
+                raise FfmpegJobCancelled(self.cmd, self.stderr_tail)
+            if deadline is not None and time.perf_counter() >= deadline:
+                self._terminate()
+                self._join_readers()
+                raise subprocess.TimeoutExpired(self.cmd, self.timeout, output=self.stdout, stderr=self.stderr_tail)
+        self._join_readers()
+        if self._cancelled.is_set():
+            raise FfmpegJobCancelled(self.cmd, self.stderr_tail)
+        if self.returncode != 0:
+            raise subprocess.CalledProcessError(self.returncode, self.cmd, output=self.stdout, stderr=self.stderr_tail)
+        return subprocess.CompletedProcess(self.cmd, self.returncode, self.stdout, self.stderr_tail)
+
+    def run(self) -> subprocess.CompletedProcess:
+        """领取调度槽位后启动并等待；排队期间被 cancel 同样抛 FfmpegJobCancelled。"""
+        scheduler = ffmpeg_scheduler.get_scheduler()
+        priority = scheduler.current_priority() if self.priority is None else self.priority
+        try:
+            with scheduler.slot(self.cmd, self.kind, priority, cancel_event=self._cancelled):
+                return self.start().wait()
+        except ffmpeg_scheduler.SlotCancelled:
+            raise FfmpegJobCancelled(self.cmd) from None
+
+    async def run_async(self) -> subprocess.CompletedProcess:
+        """在默认线程池里排队并等待子进程；协程被取消时终止 ffmpeg 并继续抛出 CancelledError。"""
+        loop = asyncio.get_running_loop()
+        if self.priority is None:
+            # 优先级按 await 的发起方（通常是主线程事件循环）而不是线程池线程推断
+            self.priority = ffmpeg_scheduler.get_scheduler().current_priority()
+        try:
+            return await loop.run_in_executor(None, self.run)
+        except asyncio.CancelledError:
+            self.cancel()
+            raise
+
+    def cancel(self) -> None:
+        """可从任意线程调用；``wait()`` 随后抛出 FfmpegJobCancelled。"""
+        self._cancelled.set()
+        if self._proc is not None and self._proc.poll() is None:
+            self._terminate()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._started_at if self._started_at else 0.0
+
+    @property
+    def stdout(self) -> str:
+        return "".join(self._stdout)
+
+    @property
+    def stderr_tail(self) -> str:
+        return "".join(self._stderr)
+
+    # ---- 内部 ----
+
+    def _terminate(self) -> None:
+        proc = self._proc
+        if proc is None or proc.poll() is not None:
+            return
+        proc.terminate()
+        try:
+            proc.wait(timeout=TERMINATE_GRACE_SEC)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+
+    def _join_readers(self) -> None:
+        for t in self._readers:
+            t.join(timeout=TERMINATE_GRACE_SEC)
+
+    def _read_stdout(self) -> None:
+        for chunk in iter(lambda: self._proc.stdout.read(65536), ""):
+            self._stdout.append(chunk)
+
+    def _read_stderr(self) -> None:
+        for line in self._proc.stderr:
+            self._stderr.append(line)
+
+    def _read_progress(self) -> None:
+        block: dict = {}
+        for line in self._proc.stdout:
+            key, sep, value = line.strip().partition("=")
+            if not sep:
+                continue
+            block[key] = value
+            if key != "progress":
+                continue
+            self._emit_progress(block)
+            block = {}
+
+    def _emit_progress(self, block: dict) -> None:
+        time_sec = _parse_out_time(block)
+        try:
+            frame = int(block.get("frame") or 0)
+        except ValueError:
+            frame = 0
+        try:
+            fps = float(block.get("fps") or 0.0)
+        except ValueError:
+            fps = 0.0
+        progress = {
+            "frame": frame,
+            "fps": fps,
+            "time_sec": time_sec,
+            "speed": (block.get("speed") or "").strip(),
+            "elapsed": self.elapsed,
+            "done": block.get("progress") == "end",
+        }
+        if self.duration and self.duration > 0:
+            progress["percent"] = 100.0 if progress["done"] else min(100.0, time_sec / self.duration * 100.0)
+        self.progress = progress
+        if self.on_progress is not None:
+            try:
+                self.on_progress(progress)
+            except Exception as e:
+                print(f"⚠️ ffmpeg progress callback error: {e}")
@@ -1,13 +1,22 @@
 import os
 import json
+import hashlib
 import subprocess
 import shutil
 import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from config import FONT_0, FONT_1, FONT_3, FONT_4, FONT_7, FONT_8
 import config
+from utility.render_cache import RenderCache, file_identity
+from utility import media_probe
+from utility import ffmpeg_capabilities
+from utility.ffmpeg_job import FfmpegJob
+from utility.transition_planner import plan_transitions
+from utility import overlay_stage
+from utility import frame_cache
 import random
 import unicodedata
 
@@ -21,12 +30,30 @@ STANDARD_AUDIO_CHANNELS = 2
 DIMENSION_MATCH_TOLERANCE_PX = 2
 # 重编码输出帧率：与 STANDARD_FPS 足够接近时沿用源帧率，减少 30→60 等插帧带来的耗时与体积
 FPS_ENCODE_NEAR_STANDARD_TOLERANCE = 10
+# concat_videos 流复制结果与各段时长之和的允许偏差（秒）：基础值 + 每段（AAC 帧边界/priming 误差）
+CONCAT_COPY_TOLERANCE_BASE = 0.1
+CONCAT_COPY_TOLERANCE_PER_SEGMENT = 0.05
 
 # NVENC limitations
 NVENC_MAX_WIDTH = 4096
 NVENC_MAX_HEIGHT = 4096
 NVENC_MAX_PIXELS = 8192 * 8192  # Maximum total pixels
 
+# build_video_on_segments 并行渲染分块时的默认线程数（每个线程驱动一个 ffmpeg 进程；ffmpeg 自身也多线程，故取核数一半）
+CHUNK_RENDER_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))
+# concat_videos_with_transitions 单张 xfade 图的最大输入数（长 xfade 链不稳定且内存随输入数增长）；超过则按平衡树分轮合并
+XFADE_TREE_FANIN = 8
+
+# 中间文件（trim/extend/fade 等逐步处理的 temp 产物）的编码档位；成片（转场拼接/最终合成）始终走 _get_encoder_config
+# quality：与成片相同（NVENC 或 x264 medium CRF18）；fast：x264 ultrafast + CRF10（视觉无损、编码快）；
+# lossless：x264 ultrafast qp0（无损，体积大，适合只活在 temp 里的多跳链路）
+INTERMEDIATE_PROFILES = {
+    "quality": None,
+    "fast": {"codec": "libx264", "preset": "ultrafast", "quality": ["-crf", "10"]},
+    "lossless": {"codec": "libx264", "preset": "ultrafast", "quality": ["-qp", "0"]},
+}
+DEFAULT_INTERMEDIATE_PROFILE = "quality"
+
 ffmpeg_path = "ffmpeg" 
 ffprobe_path = "ffprobe"
 
@@ -145,11 +172,64 @@ def resolve_headmark_for_project(
     return (path, overlay_corner_opts(hm)) if path else (None, {})
 
 
+def publish_frame_size(width, height) -> tuple[int, int]:
+    """叠加水印/角标的成片画幅：横屏 1920×1080，竖屏 1080×1920（与 NotebookLM_Processor 一致）。"""
+    return (1920, 1080) if width >= height else (1080, 1920)
+
+
+def corner_logo_layer(logo_path: str, opts: dict | None, corner: str, frame_w: int, frame_h: int) -> overlay_stage.OverlayLayer:
+    """角标 PNG → 叠加层。corner: ``br`` 右下角；``tl`` 左上角。opts: margin_x, margin_y, max_width, max_height（可选）。
+
+    ``max_width`` / ``max_height`` 不小于画幅时视为不限制；缩放前后都强制 rgba，保持透明 PNG 的 alpha。
+    """
+    corner = (corner or "br").lower()
+    if corner not in ("br", "tl"):
+        raise ValueError("corner must be 'br' or 'tl'")
+    opts = opts or {}
+    margin_x = opts.get("margin_x", 20)
+    margin_y = opts.get("margin_y", 20)
+    max_w = opts.get("max_width")
+    max_h = opts.get("max_height")
+    if max_w is not None and max_w >= frame_w:
+        max_w = None
+    if max_h is not None and max_h >= frame_h:
+        max_h = None
+    if max_w is not None and max_h is not None:
+        scl = f"scale={int(max_w)}:{int(max_h)}:force_original_aspect_ratio=decrease"
+    elif max_w is not None:
+        scl = f"scale={int(max_w)}:-1"
+    elif max_h is not None:
+        scl = f"scale=-1:{int(max_h)}"
+    else:
+        scl = ""
+    if corner == "br":
+        x, y = f"W-w-{margin_x}", f"H-h-{margin_y}"
+    else:
+        x, y = str(margin_x), str(margin_y)
+    return overlay_stage.OverlayLayer(path=str(logo_path), x=x, y=y, scale=scl)
+
+
+def resolve_brand_overlays_for_project(
+    project_config: dict | None,
+    frame_w: int,
+    frame_h: int,
+) -> list[overlay_stage.OverlayLayer]:
+    """PROJECT_CONFIG 的右下角水印 + 左上角角标 → 叠加层（找不到 PNG 的跳过），供成片编码时一并叠加。"""
+    layers = []
+    wm_path, wm_opts = resolve_watermark_for_project(project_config)
+    if wm_path:
+        layers.append(corner_logo_layer(wm_path, wm_opts, "br", frame_w, frame_h))
+    hm_path, hm_opts = resolve_headmark_for_project(project_config)
+    if hm_path:
+        layers.append(corner_logo_layer(hm_path, hm_opts, "tl", frame_w, frame_h))
+    return layers
+
+
 class FfmpegProcessor:
-    # Class-level cache for duration values (shared across all instances)
-    _duration_cache = {}
+    # render_cache 目录 → RenderCache（同一项目的多个实例共享）
+    _render_caches = {}
 
-    def __init__(self, pid, language, video_width=None, video_height=None):
+    def __init__(self, pid, language, video_width=None, video_height=None, intermediate_profile=None):
         self.pid = pid
         # Get video dimensions from parameters or use defaults (1920x1080)
         self.width = int(video_width) if video_width else 1920
@@ -173,48 +253,50 @@ class FfmpegProcessor:
         # 验证并修复字体路径
         self._validate_and_fix_font_path()
 
+        # 逐场景 ffmpeg 输出（trim/resize/add_audio/extend/fade）按内容寻址缓存，见 utility/render_cache.py
+        self.render_cache_enabled = True
+        # 中间文件编码档位，见 INTERMEDIATE_PROFILES
+        self.set_intermediate_profile(intermediate_profile or DEFAULT_INTERMEDIATE_PROFILE)
+
+
+    def set_intermediate_profile(self, name):
+        if name not in INTERMEDIATE_PROFILES:
+            raise ValueError(f"Unknown intermediate profile: {name!r} (choose from {', '.join(INTERMEDIATE_PROFILES)})")
+        self.intermediate_profile = name
+
+
 
 
-    def run_ffmpeg_command(self, cmd):
+    def run_ffmpeg_command(self, cmd, on_progress=None, timeout=None, duration=None):
+        """执行 ffmpeg/ffprobe（见 utility/ffmpeg_job.py）；失败抛 CalledProcessError，stderr 为尾部日志。
+
+        ``on_progress(dict)`` 接收 frame/time_sec/speed（给出 ``duration`` 时含 percent）；``timeout`` 秒后终止。
+        """
         #print(f"------------\n{' '.join(cmd)}\n------------")
-        result = subprocess.run(cmd, check=True, capture_output=True, text=True, encoding='utf-8', errors='ignore')
-        return result
+        return FfmpegJob(cmd, on_progress=on_progress, timeout=timeout, duration=duration).run()
 
 
 
-    nvenc_available = None
     def _check_nvenc_availability(self):
-        if self.nvenc_available is not None:
-            return self.nvenc_available
-
-        try:
-            cmd = [ffmpeg_path, "-encoders"]
-            result = self.run_ffmpeg_command(cmd)
-            self.nvenc_available = "h264_nvenc" in result.stdout
-            return self.nvenc_available
-        except Exception as e:
-            print(f"⚠️  Could not check NVENC availability: {e}")
-            self.nvenc_available = False
-            return self.nvenc_available
+        """NVENC 是否真能编码（进程内只探测一次，结果按 ffmpeg 二进制缓存到磁盘，见 utility/ffmpeg_capabilities.py）。"""
+        return bool(ffmpeg_capabilities.get_capabilities().get("nvenc_ok"))
 
 
     def _get_encoder_config(self):
-        """Get encoder configuration based on resolution compatibility."""
-        if self._check_nvenc_availability():
-            return {
-                "codec": "h264_nvenc",
-                "preset": "fast",
-                "quality": ["-cq", "18"],  # Use CQ for NVENC
-                "hwaccel": ["-hwaccel", "cuda"]  # Specify GPU device
-                #"hwaccel": ["-hwaccel_device", "0", "-hwaccel", "cuda"]  # Specify GPU device
-            }
-        else:
-            return {
-                "codec": "libx264",
-                "preset": "medium",
-                "quality": ["-crf", "18"],  # Use CRF for x264
-                "hwaccel": []  # No hardware acceleration for software encoding
-            }
+        """成片编码配置：NVENC 可用时 h264_nvenc，否则 libx264（preset/线程数取本机自测结果）。"""
+        return ffmpeg_capabilities.encoder_profile()
+
+
+    def _get_intermediate_encoder_config(self, profile=None):
+        """中间文件编码配置：按 ``profile``（默认实例的 ``intermediate_profile``）覆盖编码器，解码端 hwaccel 仍沿用 _get_encoder_config。
+
+        单次调用的档位通过参数传入，不改实例状态：同一个 FfmpegProcessor 被 GUI 与后台线程共用。
+        """
+        base = self._get_encoder_config()
+        profile = INTERMEDIATE_PROFILES[profile or self.intermediate_profile]
+        if profile is None:
+            return base
+        return {**profile, "hwaccel": base["hwaccel"]}
 
 
     def _get_input_args(self):
@@ -223,15 +305,16 @@ class FfmpegProcessor:
         return config["hwaccel"]
 
 
-    def _get_output_args(self):
-        """Get output arguments (codec, preset, quality) based on resolution."""
-        config = self._get_encoder_config()
+    def _get_output_args(self, final=False, profile=None):
+        """Get output arguments (codec, preset, quality); ``final=False`` uses the intermediate ``profile``."""
+        config = self._get_encoder_config() if final else self._get_intermediate_encoder_config(profile)
         args = []
         
         # Add codec and quality settings
         args.extend(["-c:v", config["codec"]])
         args.extend(["-preset", config["preset"]])
         args.extend(config["quality"])
+        args.extend(config.get("threads", []))
         
         return args
 
@@ -305,12 +388,12 @@ class FfmpegProcessor:
             ]
     
     
-    def _get_video_output_args(self, fps=None, pix_fmt="yuv420p", keyframe_interval=True):
+    def _get_video_output_args(self, fps=None, pix_fmt="yuv420p", keyframe_interval=True, final=False, profile=None):
         args = [
             "-pix_fmt", pix_fmt,
             "-r", str(fps or STANDARD_FPS)
         ]
-        args.extend(self._get_output_args())
+        args.extend(self._get_output_args(final=final, profile=profile))
         
         if keyframe_interval:
             fps_val = fps or STANDARD_FPS
@@ -376,6 +459,54 @@ class FfmpegProcessor:
         return os.path.abspath(config.get_temp_path(self.pid))
 
 
+    def _get_render_cache(self):
+        cache_dir = os.path.join(self.temp_dir, "render_cache")
+        cache = FfmpegProcessor._render_caches.get(cache_dir)
+        if cache is None:
+            cache = RenderCache(cache_dir)
+            FfmpegProcessor._render_caches[cache_dir] = cache
+        return cache
+
+
+    def _render_signature(self, final=False, profile=None):
+        """参与缓存 key 的输出设置：目标分辨率、标准帧率与编码器配置（含中间文件档位 ``profile``）。"""
+        profile = profile or self.intermediate_profile
+        enc = self._get_encoder_config() if final else self._get_intermediate_encoder_config(profile)
+        return {
+            "profile": "final" if final else profile,
+            "size": [self.width, self.height],
+            "fps": STANDARD_FPS,
+            "audio": [STANDARD_AUDIO_RATE, STANDARD_AUDIO_CHANNELS],
+            "codec": enc["codec"],
+            "preset": enc["preset"],
+            "quality": enc["quality"],
+        }
+
+
+    def _cached_render(self, op, inputs, params, ext, render, profile=None):
+        """命中渲染缓存则复制出新的临时文件返回；否则调用 ``render()`` 并把产物写入缓存。
+
+        ``render()`` 返回输出路径；若返回值就是某个输入（无需处理/失败回退）则不缓存。
+        ``profile`` 须与 ``render()`` 实际编码所用的中间文件档位是同一个值（调用方显式传给两者）。
+        """
+        if not self.render_cache_enabled:
+            return render()
+        cache = self._get_render_cache()
+        key = cache.make_key(op, inputs, {**params, "_render": self._render_signature(profile=profile)})
+        if key is None:
+            return render()
+
+        output_path = config.get_temp_file(self.pid, ext)
+        if cache.fetch(key, ext, output_path):
+            print(f"♻️  render cache hit: {op} ← {os.path.basename(str(inputs[0]))}")
+            return output_path
+
+        result = render()
+        if result and result not in inputs and os.path.isfile(result):
+            cache.store(key, ext, result)
+        return result
+
+
     def convert_to_mp4(self, input_path):
         output_path = config.get_temp_file(self.pid, "mp4")
         """Converts a video file to MP4 format and resizes to configured dimensions."""
@@ -425,6 +556,14 @@ class FfmpegProcessor:
 
         _probe: 可选，为 probe_video_stream_basic 的返回值，避免与 GUI 重复 ffprobe。
         """
+        return self._cached_render(
+            "resize_video", [video_path],
+            {"width": width, "height": height, "startx": startx, "starty": starty}, "mp4",
+            lambda: self._resize_video(video_path, width, height, startx, starty, _probe),
+        )
+
+
+    def _resize_video(self, video_path, width, height, startx=None, starty=None, _probe=None):
         try:
             if _probe is not None:
                 crop_width = _probe.get("width")
@@ -494,6 +633,14 @@ class FfmpegProcessor:
         """
         裁剪视频片段；``speed`` 为播放倍率（0.7–1.2：>1 加速，<1 减速），音画同步变速。
         """
+        return self._cached_render(
+            "trim_video", [video_path],
+            {"start": start_time, "end": end_time, "volume": volume, "speed": speed}, "mp4",
+            lambda: self._trim_video(video_path, start_time, end_time, volume, speed),
+        )
+
+
+    def _trim_video(self, video_path, start_time=0, end_time=None, volume=1.0, speed=1.0):
         try:
             speed = float(speed or 1.0)
             if speed <= 0:
@@ -828,17 +975,27 @@ class FfmpegProcessor:
         return output_path
 
 
-    def extend_video(self, video_path, extend_duration):
+    def extend_video(self, video_path, extend_duration, profile=None):
         """
         用最后一帧克隆延长视频末尾 extend_duration 秒。
         Args:
             video_path: 输入视频路径
             extend_duration: 延长秒数 (<=0 则直接返回原路径)
+            profile: 中间文件编码档位（INTERMEDIATE_PROFILES 的键），默认实例档位
         Returns:
             延长后的视频路径（临时文件），失败或 extend_duration<=0 则返回原路径
         """
         if not video_path or extend_duration <= 0:
             return video_path
+        profile = profile or self.intermediate_profile
+        return self._cached_render(
+            "extend_video", [video_path], {"extend": round(float(extend_duration), 5)}, "mp4",
+            lambda: self._extend_video(video_path, extend_duration, profile),
+            profile=profile,
+        )
+
+
+    def _extend_video(self, video_path, extend_duration, profile=None):
         try:
             output_path = config.get_temp_file(self.pid, "mp4")
             cmd = self._ffmpeg_input_args(video_path)
@@ -846,7 +1003,7 @@ class FfmpegProcessor:
             if has_audio:
                 cmd.extend(["-af", f"apad=pad_dur={extend_duration:.5f}"])
                 cmd.extend(self._get_audio_encode_args())
-            cmd.extend(self._get_video_output_args(keyframe_interval=True))
+            cmd.extend(self._get_video_output_args(keyframe_interval=True, profile=profile))
             cmd.extend(self._get_output_optimization_args())
             cmd.extend([
                 "-vf", f"tpad=stop_duration={extend_duration:.5f}:stop_mode=clone",
@@ -1168,7 +1325,21 @@ class FfmpegProcessor:
         audio_path,
         match_audio_length=True,
         when_longer="speed",
+        final=False,
+        profile=None,
     ):
+        """``final=True``：输出即成片（如 finalize_video 替换整条音轨），视频用成片编码而非中间文件档位。
+        ``profile``：中间文件编码档位（INTERMEDIATE_PROFILES 的键），默认实例档位。"""
+        profile = profile or self.intermediate_profile
+        return self._cached_render(
+            "add_audio_to_video", [video_path, audio_path],
+            {"match_audio_length": match_audio_length, "when_longer": when_longer, "final": final}, "mp4",
+            lambda: self._add_audio_to_video(video_path, audio_path, match_audio_length, when_longer, final, profile),
+            profile=profile,
+        )
+
+
+    def _add_audio_to_video(self, video_path, audio_path, match_audio_length, when_longer, final=False, profile=None):
         temp_file = config.get_temp_file(self.pid, "mp4")
         
         try:
@@ -1183,14 +1354,14 @@ class FfmpegProcessor:
 
                 if duration_diff > 0.1 or duration_diff < -0.1:
                     video_path = self.adjust_video_to_duration(
-                        video_path, audio_duration, when_longer=when_longer
+                        video_path, audio_duration, when_longer=when_longer, profile=profile
                     )
                     self.invalidate_duration_cache(video_path)
 
             cmd = self._ffmpeg_input_args(video_path, audio_path)
 
             cmd.extend(self._get_audio_encode_args())
-            cmd.extend(self._get_video_output_args(keyframe_interval=False))
+            cmd.extend(self._get_video_output_args(keyframe_interval=False, final=final, profile=profile))
             cmd.extend(self._get_output_optimization_args())
             cmd.extend([
                 "-map", "0:v:0",
@@ -1212,57 +1383,31 @@ class FfmpegProcessor:
 
     def has_audio_stream(self, video_path):
         """检测视频文件是否包含音频轨道"""
-        try:
-            result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "a:0",
-                "-show_entries", "stream=codec_type",
-                "-of", "csv=p=0",
-                video_path
-            ])
-            
-            # 如果命令执行成功且输出包含"audio"，则认为有音频流
-            has_audio = result.returncode == 0 and result.stdout.strip() == "audio"
-            print(f"音频检测 - 文件: {video_path}, 有音频: {has_audio}, 输出: '{result.stdout.strip()}', 错误码: {result.returncode}")
-            return has_audio
-        except Exception as e:
-            print(f"音频检测异常 - 文件: {video_path}, 错误: {e}")
-            return False
+        info = self._probe(video_path)
+        has_audio = media_probe.first_stream(info, "audio") is not None
+        print(f"音频检测 - 文件: {video_path}, 有音频: {has_audio}")
+        return has_audio
 
 
     def get_video_fps(self, video_path: str) -> int:
         """Get the FPS of a video"""
-        try:
-            result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "quiet",
-                "-select_streams", "v",
-                "-show_entries", "stream=r_frame_rate",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                video_path
-            ])
-
-            fps_str = result.stdout.strip()
-            
-            # Handle fractional FPS like "30000/1001"  
-            # '24/1\n90000/1'
-            if '\n' in fps_str:
-                fps_str = fps_str.split('\n')[0]
-            if '/' in fps_str:
-                numerator, denominator = fps_str.split('/')
-                fps = float(numerator) / float(denominator)
-            else:
-                fps = float(fps_str)
-            
-            return int(round(fps))
-        except Exception as e:
-            print(f"Error getting video FPS: {e}")
+        stream = media_probe.first_stream(self._probe(video_path), "video")
+        fps = media_probe.parse_rate(stream.get("r_frame_rate")) if stream else 0.0
+        if fps <= 0:
+            print(f"Error getting video FPS: {video_path}")
             return None
+        return int(round(fps))
 
 
     # to fade the video with fade_in_length and fade_out_length, without aLpha channel
     def fade_video(self, video_path, fade_in_length, fade_out_length):
+        return self._cached_render(
+            "fade_video", [video_path], {"fade_in": fade_in_length, "fade_out": fade_out_length}, "mp4",
+            lambda: self._fade_video(video_path, fade_in_length, fade_out_length),
+        )
+
+
+    def _fade_video(self, video_path, fade_in_length, fade_out_length):
         output_path = config.get_temp_file(self.pid, "mp4")
         video_length = self.get_duration(video_path)
         has_audio = self.has_audio_stream(video_path)
@@ -1344,39 +1489,14 @@ class FfmpegProcessor:
 
 
     def extract_frame(self, video_path, first):
-        frame_path = os.path.join(self.temp_dir, f"frame_{uuid.uuid4().hex[:8]}.webp")
-        try:
-            if first:
-                self.run_ffmpeg_command([
-                    ffmpeg_path, "-y",
-                    "-i", video_path,
-                    "-vframes", "1",  # 只提取一帧（第一帧）
-                    "-c:v", "libwebp",  # 使用 WebP 编码器
-                    "-compression_level", "4",  # 压缩级别 (0-6, 4为平衡速度和质量)
-                    "-q:v", "75",  # 质量参数 (0-100, 75为高质量)
-                    frame_path
-                ])
-            else:
-                # 用 duration 计算最后一帧位置，避免 -sseof -0.1 在极短视频上失败
-                duration = self.get_duration(video_path)
-                if duration < 0.2:  # 视频极短，直接取第一帧
-                    return self.extract_frame(video_path, True)
-                seek_pos = max(0, duration - 0.15)  # 末尾前 0.15 秒
-                self.run_ffmpeg_command([
-                    ffmpeg_path, "-y",
-                    "-ss", str(seek_pos),
-                    "-i", video_path,
-                    "-vframes", "1",  # 只提取一帧
-                    "-c:v", "libwebp",  # 使用 WebP 编码器
-                    "-compression_level", "4",  # 压缩级别 (0-6, 4为平衡速度和质量)
-                    "-q:v", "75",  # 质量参数 (0-100, 75为高质量)
-                    frame_path
-                ])
-            return frame_path
-            
-        except Exception as e:
-            print(f"❌ Error extracting frame: {e}")
+        """首帧/末帧原尺寸 webp（取自 frame_cache 的磁盘缓存）；返回临时文件副本，调用方可自由移动/改写。"""
+        cached = frame_cache.get_frame(video_path, "first" if first else "last", "full")
+        if not cached:
+            print(f"❌ Error extracting frame: {video_path}")
             return None
+        frame_path = os.path.join(self.temp_dir, f"frame_{uuid.uuid4().hex[:8]}.webp")
+        shutil.copyfile(cached, frame_path)
+        return frame_path
 
 
     def video_fade(self, video_path, fade_in_length, fade_out_length, audio_fade):
@@ -1462,35 +1582,11 @@ class FfmpegProcessor:
 
 
     def check_video_size(self, video_path):
-        try:
-            # Get width
-            width_result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                video_path
-            ])
-            
-            # Get height
-            height_result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=height",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                video_path
-            ])
-            
-            width = int(width_result.stdout.strip())
-            height = int(height_result.stdout.strip())
-            
-            return (width, height)
-            
-        except Exception as e:
-            print(f"FFprobe Error getting video size: {e}")
+        width, height = self.get_resolution(video_path)
+        if width is None or height is None:
+            print(f"FFprobe Error getting video size: {video_path}")
             return (0, 0)
+        return (width, height)
 
 
     def _analyze_audio_availability(self, video_segments):
@@ -1533,426 +1629,109 @@ class FfmpegProcessor:
         return audio_analysis
 
 
-    def _align_time_to_frame(self, time_sec, fps=STANDARD_FPS):
-        """
-        Align a time value to exact frame boundary to avoid floating point precision issues.
-        This ensures xfade offsets are frame-accurate.
-        """
-        # Convert to frame count (round to nearest frame)
-        frame_count = round(time_sec * fps)
-        # Convert back to sec with exact precision
-        aligned_time = frame_count / fps
-        return aligned_time
-
-
     def _concat_videos_with_transitions(self, video_segments, frames_deduct, keep_audio_if_has):
+        """按 video_segments 的 transition/duration 做 xfade 拼接；第 i 段末帧延长「下一处过渡时长 + 本段 extend」。
+
+        ``frames_deduct``（可为小数）为每处过渡额外提前的帧数，整数部分每处都扣，小数部分均匀分摊（见 transition_planner.distribute_deduct）。
+        延长、统一帧率/分辨率与 xfade 在同一张 filter_complex 中完成，时间线由 plan_transitions 预先算好。
+        """
         video_out_path = config.get_temp_file(self.pid, "mp4")
 
         n_videos = len(video_segments)
-        
-        # Smart frame deduction: handle fractional frames
-        # Integer part: frames deducted for every transition
-        # Fractional part: determines extra frame deduction interval
-        # Example: 6.2 means 6 frames base + extra frames distributed across transitions
-        frames_deduct_base = int(frames_deduct)  # Base frames to deduct
-        frames_deduct_fraction = frames_deduct - frames_deduct_base  # Fractional part
-        
-        # For N transitions, fractional part means: add extra_frames over N transitions
-        # Example: 26 transitions × 0.2 = 5.2 extra frames → 5 extra frames
-        total_transitions = n_videos - 1
-        extra_frames_total = int(round(frames_deduct_fraction * total_transitions))  # Total extra frames to distribute
-        
-        if extra_frames_total > 0:
-            extra_frame_interval = total_transitions / extra_frames_total  # Spacing between extra frames
-            print(f"   ⏱️  Smart frame deduction: {frames_deduct_base} base frames + {extra_frames_total} extra frames distributed across {total_transitions} transitions")
-            print(f"      Average: {frames_deduct:.3f} frames per transition")
-            print(f"      Total: base={frames_deduct_base * total_transitions} + extra={extra_frames_total} = {frames_deduct_base * total_transitions + extra_frames_total} frames")
+        effects = []
+        for seg in video_segments[1:]:
+            effect = seg["transition"]
+            effects.append(random.choice(config.TRANSITION_EFFECTS) if effect == "random" else effect)
+        plan = plan_transitions(
+            [self.get_video_stream_duration(seg["path"]) for seg in video_segments],
+            [
+                float(seg.get("extend", 0) or 0) + (video_segments[i + 1]["duration"] if i < n_videos - 1 else 0)
+                for i, seg in enumerate(video_segments)
+            ],
+            [seg["duration"] for seg in video_segments[1:]],
+            STANDARD_FPS,
+            frames_deduct=frames_deduct,
+            effects=effects,
+        )
+        total_deducted = sum(c.deduct_frames for c in plan.clips)
+        print(f"   ⏱️  Frame deduction: {frames_deduct} per transition → {total_deducted} frames over {n_videos - 1} transitions")
+        plan.print_table()
+
+        input_args = []
+        for video_seg in video_segments:
+            input_args.extend(["-i", video_seg["path"]])
+
+        # xfade 要求各段分辨率与帧率一致：先统一帧率，克隆末帧延长并截到计划帧数，再缩放
+        video_filters = [
+            plan.clip_video_filter(i, f"fps={STANDARD_FPS}:round=near", f"scale={self.width}:{self.height}", f"v{i}")
+            for i in range(n_videos)
+        ]
+        video_filters.extend(plan.xfade_filters([f"v{i}" for i in range(n_videos)], "vout"))
+
+        audio_filters = []
+        if keep_audio_if_has:
+            has_audio = [self.has_audio_stream(seg["path"]) for seg in video_segments]
+            print(f"      🔊 Audio analysis: {sum(has_audio)} videos with audio, {n_videos - sum(has_audio)} without")
+            audio_filters = plan.audio_filters(has_audio, STANDARD_AUDIO_RATE, "audio_out")
+            drift = abs(plan.total_frames - plan.audio_frames) / STANDARD_FPS
+            if drift > 0.5:
+                print(f"      ⚠️  WARNING: Audio/Video duration mismatch: {drift:.2f}s difference (frames_deduct shortens video only)")
+
+        all_filters = video_filters + audio_filters
+        filter_complex = ";".join(all_filters)
+        print(f"   📊 Filter summary: {len(all_filters)} filters, {len(filter_complex)} characters")
+
+        cmd = [ffmpeg_path, "-y"] + input_args + [
+            # NOTE: Removed "-hwaccel", "cuda" to avoid conflicts with filter_complex operations
+            "-filter_complex", filter_complex,
+            "-map", "[vout]",
+        ]
+        if keep_audio_if_has:
+            cmd.extend(["-map", "[audio_out]"])
+            cmd.extend(self._get_audio_encode_args())
+
+        # Hardware encoders can have problems with very long filter chains
+        if n_videos > 10:
+            print(f"      📝 Using software encoder (libx264) for {n_videos} videos to ensure stability")
+            cmd.extend(["-c:v", "libx264", "-preset", "medium", "-crf", "20"])
         else:
-            extra_frame_interval = 0
-            print(f"   ⏱️  Frame deduction: {frames_deduct_base} frames per transition")
-            print(f"      For {total_transitions} transitions: total {frames_deduct_base * total_transitions} frames")
-        
-        # NEW APPROACH: Extend videos AND standardize in one step using filter
-        extended_video_paths = []
-        temp_files_to_cleanup = []
-        extended_durations = []
-        
+            cmd.extend(["-c:v", "h264_nvenc", "-preset", "fast", "-crf", "20"])
+        cmd.extend(self._get_video_output_args(keyframe_interval=False))
+        cmd.extend(self._get_output_optimization_args())
+        cmd.append(video_out_path)
+
+        # Save filter_complex to file for debugging
+        filter_debug_path = os.path.join(self.temp_dir, "filter_complex_debug.txt")
+        with open(filter_debug_path, 'w', encoding='utf-8') as f:
+            f.write(f"Number of videos: {n_videos}\n")
+            f.write(f"Number of filters: {len(all_filters)}\n")
+            f.write(f"Filter complex length: {len(filter_complex)} characters\n\n")
+            f.write("Transition plan:\n")
+            for row in plan.table():
+                f.write(json.dumps(row) + "\n")
+            f.write("\nComplete filter_complex:\n")
+            f.write(filter_complex)
+            f.write("\n\n")
+            for i, filt in enumerate(all_filters):
+                f.write(f"Filter {i}: {filt}\n")
+        print(f"   🎬 Executing FFmpeg concat with {n_videos - 1} transitions (filter debug: {filter_debug_path})")
+
         try:
-            print(f"   🔄 Extending and standardizing {n_videos} videos...")
-            for i, video_seg in enumerate(video_segments):
-                try:
-                    original_duration = self.get_duration(video_seg["path"])
-                    
-                    # CRITICAL FIX: Each video needs to be extended by the NEXT transition duration
-                    # video_segments[i]["duration"] is the transition TO this video (from previous)
-                    # But we need to extend for the transition FROM this video (to next)
-                    # "extend" = user's scene extension (clone last frame), applies to THIS video
-                    seg_extend = float(video_seg.get("extend", 0) or 0)
-                    if i < n_videos - 1:
-                        # Not the last video - extend by next transition duration + this segment's extend
-                        extension_needed = video_segments[i + 1]["duration"] + seg_extend
-                    else:
-                        # Last video - no transition overlap, but may need extend (clone last frame)
-                        extension_needed = seg_extend
-                    
-                    temp_extended_path = os.path.join(self.temp_dir, f"ext_{i:03d}_{hash(video_seg['path']) % 10000}.mp4")
-                    
-                    print(f"      📹 Video {i+1}/{n_videos}: {original_duration:.2f}s + {extension_needed:.2f}s")
-                    
-                    # Extend AND standardize in one ffmpeg command
-                    if extension_needed > 0:
-                        # Need to extend video for transition (full extension, no deduction here)
-                        success = self._extend_and_standardize_video(
-                            video_seg["path"], 
-                            extension_needed, 
-                            temp_extended_path
-                        )
-                        
-                        if not success:
-                            raise RuntimeError(f"Failed to extend video {i+1}")
-                    else:
-                        # Last video - just standardize without extension
-                        print(f"         (Last video - standardizing without extension)")
-                        # Move to expected path
-                        import shutil
-                        shutil.copy2(video_seg["path"], temp_extended_path)
-                    
-                    # Verify extended video
-                    if not os.path.exists(temp_extended_path):
-                        raise RuntimeError(f"Extended video {i+1} was not created")
-                    
-                    verify_duration = self.get_duration(temp_extended_path)
-                    if verify_duration <= 0:
-                        raise RuntimeError(f"Extended video {i+1} has invalid duration: {verify_duration}")
-                    
-                    extended_video_paths.append(temp_extended_path)
-                    temp_files_to_cleanup.append(temp_extended_path)
-                    extended_durations.append(verify_duration)
-                    
-                    print(f"         ✅ Extended: {verify_duration:.2f}s")
-                    
-                except Exception as e:
-                    print(f"❌ CRITICAL ERROR processing video {i+1}/{n_videos}: {str(e)}")
-                    print(f"   Video path: {video_seg['path']}")
-                    raise
-            
-            print(f"✅ All videos extended and standardized!")
-            print(f"   Total videos: {len(extended_video_paths)} (expected: {n_videos})")
-            
-            # Verify we have all videos
-            if len(extended_video_paths) != n_videos:
-                raise RuntimeError(f"Video extension incomplete: got {len(extended_video_paths)} videos, expected {n_videos}")
-            
-            # Build input arguments using extended video paths
-            input_args = []
-            for video_path in extended_video_paths:
-                input_args.extend(["-i", video_path])
-            
-            print(f"   Building FFmpeg command with {len(input_args)//2} input files...")
-            
-            # Build video filter chain - USE MINIMAL PROCESSING to preserve baked effects
-            video_filters = []
-            
-            # CRITICAL: Apply both FPS and resolution standardization for xfade compatibility
-            print(f"   📝 Building video scale filters for {n_videos} videos...")
-            for i in range(n_videos):
-                # xfade requires all videos to have the same resolution, so we must scale
-                video_filters.append(f"[{i}:v]fps={STANDARD_FPS}:round=near,{self._get_simple_scale_filter(self.width, self.height)}[v{i}]")
-            print(f"      ✅ Created {len(video_filters)} video scale filters")
-            
-            # Build audio filter chain if processing audio
-            # CRITICAL: Audio must be trimmed to match video transitions
-            audio_filters = []
-            expected_audio_duration = 0  # Initialize
-            if keep_audio_if_has:
-                print(f"   📝 Building audio filters...")
-                # Check which videos have audio streams
-                has_audio = []
-                for i, video_path in enumerate(extended_video_paths):
-                    has_audio.append(self.has_audio_stream(video_path))
-                
-                audio_count = sum(has_audio)
-                no_audio_count = len(has_audio) - audio_count
-                print(f"      🔊 Audio analysis: {audio_count} videos with audio, {no_audio_count} without")
-                
-                # Process audio streams - TRIM to compensate for transitions
-                # LOGIC: Each video was extended by NEXT transition duration
-                #        So we trim by that same amount to get original audio length
-                for i in range(n_videos):
-                    if i < n_videos - 1:
-                        # Not the last video - trim by the SAME amount it was extended
-                        # Video i was extended by video_segments[i+1]["duration"]
-                        # So we trim by video_segments[i+1]["duration"] to restore original length
-                        transition_dur = video_segments[i + 1]["duration"]
-                        audio_to_keep = extended_durations[i] - transition_dur
-                    else:
-                        # Last video - was not extended, keep all
-                        audio_to_keep = extended_durations[i]
-                    
-                    if has_audio[i]:
-                        # Video has audio - extract and trim
-                        audio_filters.append(f"[{i}:a]aresample={STANDARD_AUDIO_RATE},aformat=sample_fmts=fltp:sample_rates={STANDARD_AUDIO_RATE}:channel_layouts=stereo,atrim=0:{audio_to_keep:.3f},asetpts=PTS-STARTPTS[a{i}]")
-                    else:
-                        # Video has no audio - create silent audio for trimmed duration
-                        audio_filters.append(f"anullsrc=channel_layout=stereo:sample_rate={STANDARD_AUDIO_RATE}:duration={audio_to_keep:.3f}[a{i}]")
-                    
-                    print(f"         Audio {i}: keeping {audio_to_keep:.2f}s of {extended_durations[i]:.2f}s")
-                
-                # Concatenate all trimmed audio streams
-                audio_inputs = "".join([f"[a{i}]" for i in range(n_videos)])
-                audio_concat_filter = f"{audio_inputs}concat=n={n_videos}:v=0:a=1[audio_out]"
-                audio_filters.append(audio_concat_filter)
-                
-                # Calculate expected audio duration
-                expected_audio_duration = sum([
-                    extended_durations[i] - (video_segments[i + 1]["duration"] if i < n_videos - 1 else 0)
-                    for i in range(n_videos)
-                ])
-                print(f"      ✅ Created {len(audio_filters)} audio filters")
-                print(f"      📊 Expected audio duration: {expected_audio_duration:.2f}s")
-            
-            # Chain xfade transitions with correct offset calculation using EXTENDED durations
-            current_video_label = "v0"
-            
-            # Add detailed debugging for xfade chain construction
-            print(f"   📝 Building xfade transition chain for {n_videos} videos...")
-            print(f"      Extended video durations:")
-            for i in range(n_videos):
-                print(f"         Video {i}: {extended_durations[i]:.2f}s")
-            
-            xfade_count = 0
-            # Calculate offset - for xfade, offset is in the first input stream's timeline
-            # Use frame-accurate calculation to avoid floating point errors
-            current_offset_frames = 0  # Track offset in frames for precision
-            extra_frames_used = 0  # Track how many extra frames have been used
-            
-            for i in range(1, n_videos):
-                video_seg = video_segments[i]
-                transition_duration = video_seg["duration"]
-                transition_effect = video_seg["transition"]
-                
-                # Calculate contribution in frames for precision
-                prev_video_frames = round(extended_durations[i-1] * STANDARD_FPS)
-                transition_frames = round(transition_duration * STANDARD_FPS)
-                
-                # Smart frame deduction: base frames + conditional extra frame
-                transition_index = i - 1  # 0-based transition index (0, 1, 2, ...)
-                frames_to_deduct = frames_deduct_base
-                
-                # Distribute extra frames evenly: use Bresenham-like algorithm
-                # Determine if this transition should get an extra frame
-                if extra_frames_total > 0:
-                    # Ideal position for next extra frame: (extra_frames_used + 1) * interval
-                    # Current position: transition_index + 1
-                    next_extra_position = (extra_frames_used + 1) * extra_frame_interval
-                    
-                    # If we've reached or passed the position for the next extra frame
-                    if (transition_index + 1) >= next_extra_position and extra_frames_used < extra_frames_total:
-                        frames_to_deduct += 1
-                        extra_frames_used += 1
-                        extra_marker = " (+1 extra)"
-                    else:
-                        extra_marker = ""
-                else:
-                    extra_marker = ""
-                
-                # Current offset in frames = previous offset + (prev_video - transition - deduction)
-                current_offset_frames += prev_video_frames - transition_frames - frames_to_deduct
-                
-                # Convert to sec with exact frame precision
-                current_offset = current_offset_frames / STANDARD_FPS
-                
-                if transition_effect == "random":
-                    effect_name = random.choice(config.TRANSITION_EFFECTS)
-                else:
-                    effect_name = transition_effect
-
-                next_video_label = f"vx{i}"
-                # Format offset with enough precision but frame-aligned
-                offset_str = f"{current_offset:.10f}"  # High precision for FFmpeg
-                xfade_filter = f"[{current_video_label}][v{i}]xfade=transition={effect_name}:duration={transition_duration}:offset={offset_str}[{next_video_label}]"
-                video_filters.append(xfade_filter)
-                xfade_count += 1
-                
-                # Show ALL transitions for debugging
-                print(f"      🔗 Transition {transition_index}: {effect_name} at offset={current_offset:.6f}s (frame {current_offset_frames}, dur={transition_duration:.2f}s, deducted={frames_to_deduct}{extra_marker} frames)")
-                print(f"         Mixing video {i-1} (ext={extended_durations[i-1]:.2f}s) with video {i} (ext={extended_durations[i]:.2f}s)")
-                
-                current_video_label = next_video_label
-            
-            print(f"      📊 Total extra frames used: {extra_frames_used}/{extra_frames_total}")
-            
-            # Calculate expected final duration using frame-accurate method
-            last_video_frames = round(extended_durations[-1] * STANDARD_FPS)
-            expected_final_frames = current_offset_frames + last_video_frames
-            expected_final_duration = expected_final_frames / STANDARD_FPS
-            print(f"      ✅ Created {xfade_count} xfade transitions")
-            print(f"      📐 Expected video duration from xfade chain: {expected_final_duration:.6f}s ({expected_final_frames} frames)")
-            
-            # Verify audio and video durations match
-            if keep_audio_if_has:
-                duration_diff = abs(expected_final_duration - expected_audio_duration)
-                if duration_diff > 0.5:
-                    print(f"      ⚠️  WARNING: Audio/Video duration mismatch: {duration_diff:.2f}s difference!")
-                    print(f"         Video: {expected_final_duration:.2f}s, Audio: {expected_audio_duration:.2f}s")
-                else:
-                    print(f"      ✅ Audio and Video durations match ({duration_diff:.2f}s diff)")
-            
-            # Combine all filters
-            all_filters = video_filters + audio_filters
-            filter_complex = ";".join(all_filters)
-            
-            print(f"   📊 Filter summary:")
-            print(f"      Total filters: {len(all_filters)} ({len(video_filters)} video + {len(audio_filters)} audio)")
-            print(f"      Filter complex length: {len(filter_complex)} characters")
-            print(f"      Final video output: [{current_video_label}]")
-            if keep_audio_if_has:
-                print(f"      Final audio output: [audio_out]")
-            
-            # Build FFmpeg command with HIGH QUALITY settings
-            cmd = [ffmpeg_path, "-y"] + input_args + [
-                # NOTE: Removed "-hwaccel", "cuda" to avoid conflicts with filter_complex operations
-                # GPU acceleration is still used via h264_nvenc encoder
-                "-filter_complex", filter_complex,
-                "-map", f"[{current_video_label}]"
-            ]
-            
-            # Add audio mapping if processing audio
-            if keep_audio_if_has:
-                cmd.extend(["-map", "[audio_out]"])
-                cmd.extend(self._get_audio_encode_args())
-            
-            # Use software encoding for complex filter operations to avoid hardware encoder issues
-            # Hardware encoders can have problems with very long filter chains
-            use_software_encoder = n_videos > 10  # Use software for >10 videos
-            
-            if use_software_encoder:
-                print(f"      📝 Using software encoder (libx264) for {n_videos} videos to ensure stability")
-                cmd.extend([
-                    "-c:v", "libx264",
-                    "-preset", "medium",
-                    "-crf", "20",
-                ])
-                cmd.extend(self._get_video_output_args(keyframe_interval=False))
-                cmd.extend(self._get_output_optimization_args())
-                cmd.append(video_out_path)
-            else:
-                cmd.extend([
-                    # HIGH QUALITY encoding to preserve baked effects
-                    "-c:v", "h264_nvenc",
-                    "-preset", "fast",
-                    "-crf", "20",
-                ])
-                cmd.extend(self._get_video_output_args(keyframe_interval=False))
-                cmd.extend(self._get_output_optimization_args())
-                cmd.append(video_out_path)
-            
-            # Execute FFmpeg command
-            print(f"   🎬 Executing FFmpeg concat with transitions...")
-            print(f"      Input videos: {len(extended_video_paths)}")
-            print(f"      Expected transitions: {n_videos - 1}")
-            
-            # Save filter_complex to file for debugging
-            filter_debug_path = os.path.join(self.temp_dir, "filter_complex_debug.txt")
-            with open(filter_debug_path, 'w', encoding='utf-8') as f:
-                f.write(f"Number of videos: {n_videos}\n")
-                f.write(f"Number of filters: {len(all_filters)}\n")
-                f.write(f"Filter complex length: {len(filter_complex)} characters\n\n")
-                f.write("Complete filter_complex:\n")
-                f.write(filter_complex)
-                f.write("\n\n")
-                for i, filt in enumerate(all_filters):
-                    f.write(f"Filter {i}: {filt}\n")
-            print(f"      🔍 Filter complex saved to: {filter_debug_path}")
-            
-            result = self.run_ffmpeg_command(cmd)
-            
-            # Check if FFmpeg succeeded
-            if result.returncode != 0:
-                print(f"❌ FFmpeg failed with return code: {result.returncode}")
-                print(f"❌ Error details:")
-                # Try to find the actual error message
-                if result.stderr:
-                    stderr_lines = result.stderr.strip().split('\n')
-                    # Look for error lines
-                    for line in stderr_lines[-20:]:  # Check last 20 lines
-                        if 'error' in line.lower() or 'fail' in line.lower() or 'invalid' in line.lower():
-                            print(f"   {line}")
-                print(f"❌ Full STDERR (first 2000 chars): {result.stderr[:2000]}")
-                raise RuntimeError(f"FFmpeg concatenation failed: {result.stderr[:500]}")
-            
-            # Print FFmpeg output for debugging
-            if result.stderr:
-                # Show last few lines of stderr which usually contains progress info
-                stderr_lines = result.stderr.strip().split('\n')
-                if len(stderr_lines) > 5:
-                    print(f"🔍 FFmpeg output (last 5 lines):")
-                    for line in stderr_lines[-5:]:
-                        print(f"   {line}")
-            
-            # Verify output file was created and has reasonable duration
-            if not os.path.exists(video_out_path):
-                raise RuntimeError(f"Output video was not created: {video_out_path}")
-            
-            final_duration = self.get_duration(video_out_path)
-            if final_duration <= 0:
-                raise RuntimeError(f"Output video has invalid duration: {final_duration}")
-            
-            # Calculate expected duration using smart frame deduction
-            total_original_duration = sum([self.get_duration(video_seg["path"]) for video_seg in video_segments])
-            total_transition_duration = sum([video_seg["duration"] for video_seg in video_segments[1:]])  # Exclude first video
-            
-            # Calculate total frames deducted using smart deduction logic
-            # Recalculate to ensure consistency
-            total_transitions = n_videos - 1
-            base_frames_deducted = frames_deduct_base * total_transitions
-            extra_frames_deducted = int(round(frames_deduct_fraction * total_transitions))
-            total_frames_deducted = base_frames_deducted + extra_frames_deducted
-            total_frames_deduction_sec = total_frames_deducted / STANDARD_FPS
-            
-            expected_duration = total_original_duration - total_transition_duration - total_frames_deduction_sec
-            
-            # Calculate frame difference for accuracy check
-            final_duration_frames = round(final_duration * STANDARD_FPS)
-            expected_duration_frames = round(expected_duration * STANDARD_FPS)
-            frame_diff = abs(final_duration_frames - expected_duration_frames)
-            
-            # Check if duration is significantly shorter than expected
-            duration_diff = abs(final_duration - expected_duration)
-            print(f"   📊 Duration comparison:")
-            print(f"      Original total: {total_original_duration:.2f}s")
-            print(f"      Transitions: -{total_transition_duration:.2f}s")
-            print(f"      Frames deduction: {base_frames_deducted} base + {extra_frames_deducted} extra = {total_frames_deducted} frames ({total_frames_deduction_sec:.6f}s)")
-            print(f"      Expected: {expected_duration:.6f}s ({expected_duration_frames} frames)")
-            print(f"      Actual: {final_duration:.6f}s ({final_duration_frames} frames)")
-            print(f"      Difference: {duration_diff:.6f}s ({frame_diff} frames)")
-            if duration_diff > 10.0:  # More than 10 sec difference
-                print(f"   ⚠️  WARNING: Output duration differs from expected by {duration_diff:.2f}s!")
-                print(f"      This suggests only partial videos were concatenated.")
-                # Don't raise error, just warn for now
-            
-            # Verify audio stream exists if we expected it
-            if keep_audio_if_has:
-                output_has_audio = self.has_audio_stream(video_out_path)
-                if output_has_audio:
-                    print(f"      ✅ Output video contains audio stream")
-                else:
-                    print(f"      ⚠️  Warning: Output video has no audio stream (expected audio)")
-            
-            # Cleanup temporary extended videos
-            for temp_file in temp_files_to_cleanup:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            print(f"🧹 Cleaned up {len(temp_files_to_cleanup)} temporary extended videos")
-            
-            return video_out_path
-            
-        except Exception as e:
-            # Cleanup temporary files before raising
-            for temp_file in temp_files_to_cleanup:
-                if os.path.exists(temp_file):
-                    os.remove(temp_file)
-            raise RuntimeError(f"Transition-based concatenation failed: {e}") from e
+            self.run_ffmpeg_command(cmd, duration=plan.total_duration)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Transition-based concatenation failed: {(e.stderr or '')[-500:]}") from e
+
+        if not os.path.exists(video_out_path):
+            raise RuntimeError(f"Output video was not created: {video_out_path}")
+        final_duration = self.get_duration(video_out_path)
+        if final_duration <= 0:
+            raise RuntimeError(f"Output video has invalid duration: {final_duration}")
+
+        final_frames = round(final_duration * STANDARD_FPS)
+        print(f"   📊 Duration: planned {plan.total_duration:.6f}s ({plan.total_frames} frames), actual {final_duration:.6f}s ({final_frames} frames), diff {abs(final_frames - plan.total_frames)} frames")
+        if keep_audio_if_has and not self.has_audio_stream(video_out_path):
+            print(f"      ⚠️  Warning: Output video has no audio stream (expected audio)")
+        return video_out_path
 
 
     # split image into left and right from center
@@ -2020,17 +1799,122 @@ class FfmpegProcessor:
         return f"file '{abs_path}'\n"
 
 
-    def concat_videos(self, video_paths, keep_audio):
+    # 流复制拼接要求各段一致的流参数；任一不同则必须重编码。
+    # extradata_hash（SPS/PPS）与 encoder 标签：NVENC 与 x264、或不同档位编码的分段即使分辨率/像素格式相同，
+    # 参数集也不同，-c copy 后只保留第一段的参数集，后面的段解码会花屏/中断，且时长校验发现不了
+    _CONCAT_VIDEO_KEYS = (
+        "codec_name", "profile", "level", "width", "height", "pix_fmt", "r_frame_rate", "time_base", "has_b_frames",
+        "extradata_hash", "encoder",
+    )
+    _CONCAT_AUDIO_KEYS = ("codec_name", "profile", "sample_rate", "channels", "channel_layout")
+
+    @staticmethod
+    def _concat_stream_field(stream, key):
+        if key == "encoder":
+            return (stream.get("tags") or {}).get("encoder")
+        return stream.get(key)
+
+    def _concat_stream_signature(self, video_path):
+        """首路视频/音频流的关键参数，用于判断能否 -c copy 拼接；无法探测返回 None。"""
+        info = self._probe(video_path)
+        video = media_probe.first_stream(info, "video")
+        audio = media_probe.first_stream(info, "audio")
+        if video is None:
+            return None
+        return {
+            "video": tuple(self._concat_stream_field(video, k) for k in self._CONCAT_VIDEO_KEYS),
+            "audio": tuple(self._concat_stream_field(audio, k) for k in self._CONCAT_AUDIO_KEYS) if audio else None,
+        }
+
+    def _concat_inputs_uniform(self, video_paths, keep_audio):
+        """各段编码参数是否完全一致（可流复制拼接）；返回 (是否一致, 原因)。"""
+        first = None
+        for p in video_paths:
+            sig = self._concat_stream_signature(p)
+            if sig is None:
+                return False, f"cannot probe {os.path.basename(p)}"
+            if keep_audio and sig["audio"] is None:
+                return False, f"no audio stream in {os.path.basename(p)}"
+            if first is None:
+                first = sig
+                continue
+            if sig["video"] != first["video"]:
+                diff = [k for k, a, b in zip(self._CONCAT_VIDEO_KEYS, first["video"], sig["video"]) if a != b]
+                return False, f"video {'/'.join(diff)} differs in {os.path.basename(p)}"
+            if keep_audio and sig["audio"] != first["audio"]:
+                diff = [k for k, a, b in zip(self._CONCAT_AUDIO_KEYS, first["audio"], sig["audio"]) if a != b]
+                return False, f"audio {'/'.join(diff)} differs in {os.path.basename(p)}"
+        return True, "uniform inputs"
+
+    def _concat_videos_stream_copy(self, video_paths, keep_audio, video_out_path):
+        """concat demuxer + ``-c copy``；输出缺失或时长与各段之和不符时返回 False（由调用方回退重编码）。"""
+        concat_file_path = os.path.join(self.temp_dir, f"copy_concat_list_{uuid.uuid4().hex[:8]}.txt")
+        try:
+            with open(concat_file_path, "w", encoding="utf-8") as f:
+                for video_path in video_paths:
+                    f.write(self._concat_demuxer_path_line(video_path))
+            cmd = [ffmpeg_path, "-y", "-f", "concat", "-safe", "0", "-i", concat_file_path, "-map", "0:v:0"]
+            if keep_audio:
+                cmd.extend(["-map", "0:a:0"])
+            else:
+                cmd.append("-an")
+            cmd.extend(["-c", "copy"])
+            cmd.extend(self._get_output_optimization_args())
+            cmd.append(video_out_path)
+            self.run_ffmpeg_command(cmd)
+        except subprocess.CalledProcessError as e:
+            print(f"⚠️ stream copy concat failed: {(e.stderr or '')[-500:]}")
+            return False
+        finally:
+            if os.path.exists(concat_file_path):
+                os.remove(concat_file_path)
+
+        if not os.path.isfile(video_out_path) or os.path.getsize(video_out_path) <= 0:
+            return False
+        self.invalidate_duration_cache(video_out_path)
+        expected = sum(self.get_duration(p) for p in video_paths)
+        actual = self.get_duration(video_out_path)
+        tolerance = CONCAT_COPY_TOLERANCE_BASE + CONCAT_COPY_TOLERANCE_PER_SEGMENT * len(video_paths)
+        if abs(actual - expected) > tolerance:
+            print(f"⚠️ stream copy concat duration {actual:.2f}s != expected {expected:.2f}s (±{tolerance:.2f}s)")
+            return False
+        return True
+
+
+    def concat_videos(self, video_paths, keep_audio, overlays=None, base_filter=None):
+        """按顺序拼接；各段流参数一致时 -c copy（几乎零耗时），否则或流复制失败时整段重编码。
+
+        ``overlays``（水印/角标等叠加层）与 ``base_filter``（叠加前的主画面缩放链）在拼接的那次编码里一并完成，
+        此时不走流复制。
+        """
         if len(video_paths) == 0:
             return None
 
         video_out_path = config.get_temp_file(self.pid, "mp4")
         if len(video_paths) == 1:
-            shutil.copy2(video_paths[0], video_out_path)
+            if overlays:
+                if not self.apply_overlays_to_video(video_paths[0], video_out_path, overlays, base_filter):
+                    raise RuntimeError("overlay pass failed")
+            else:
+                shutil.copy2(video_paths[0], video_out_path)
             return video_out_path
-        
+
+        started = time.perf_counter()
+        if overlays:
+            uniform, reason = False, f"{len(overlays)} overlay(s) in the concat encode"
+        else:
+            uniform, reason = self._concat_inputs_uniform(video_paths, keep_audio)
+        if uniform:
+            print(f"⚡ concat_videos: stream copy for {len(video_paths)} segments ({reason})")
+            if self._concat_videos_stream_copy(video_paths, keep_audio, video_out_path):
+                print(f"✅ Stream-copied {len(video_paths)} chunks in {time.perf_counter() - started:.2f}s: {video_out_path}")
+                return video_out_path
+            print("🔁 concat_videos: stream copy rejected, falling back to re-encode")
+        else:
+            print(f"🔁 concat_videos: re-encode ({reason})")
+
+        concat_file_path = os.path.join(self.temp_dir, f"chunk_concat_list_{uuid.uuid4().hex[:8]}.txt")
         try:
-            concat_file_path = os.path.join(self.temp_dir, "chunk_concat_list.txt")
             with open(concat_file_path, "w", encoding="utf-8") as f:
                 for video_path in video_paths:
                     f.write(self._concat_demuxer_path_line(video_path))
@@ -2041,12 +1925,25 @@ class FfmpegProcessor:
                 "-f", "concat",
                 "-safe", "0",
                 "-i", concat_file_path,
+            ]
+            if overlays:
+                concat_cmd.extend(overlay_stage.input_args(overlays))
+                filters = []
+                base = "0:v"
+                if base_filter:
+                    filters.append(f"[0:v]{base_filter}[v_base]")
+                    base = "v_base"
+                filters.extend(overlay_stage.filter_chain(overlays, base, 1, "vout", STANDARD_FPS))
+                concat_cmd.extend(["-filter_complex", ";".join(filters), "-map", "[vout]"])
+                if keep_audio:
+                    concat_cmd.extend(["-map", "0:a?"])
+            concat_cmd.extend([
                 "-c:v", "libx264",
                 "-preset", "medium",
                 "-crf", "18",
                 "-pix_fmt", "yuv420p",
                 "-r", str(STANDARD_FPS),
-            ]
+            ])
 
             if not keep_audio:
                 concat_cmd.append("-an")  # drop audio completely
@@ -2061,7 +1958,7 @@ class FfmpegProcessor:
             result = self.run_ffmpeg_command(concat_cmd)
             
             final_duration = self.get_duration(video_out_path)
-            print(f"✅ Successfully concatenated {len(video_paths)} chunks : {video_out_path}")
+            print(f"✅ Successfully concatenated {len(video_paths)} chunks in {time.perf_counter() - started:.2f}s: {video_out_path}")
             print(f"   📐 Final duration: {final_duration:.2f}s")
             # Cleanup concat file
             if os.path.exists(concat_file_path):
@@ -2072,14 +1969,13 @@ class FfmpegProcessor:
         except Exception as e:
             print(f"❌ Simple demuxer concatenation error: {e}")
             # Cleanup concat file
-            concat_file_path = os.path.join(self.temp_dir, "chunk_concat_list.txt")
             if os.path.exists(concat_file_path):
                 os.remove(concat_file_path)
             raise RuntimeError(f"Simple demuxer concatenation failed: {e}") from e
 
 
-    def concat_videos_with_transitions(self, video_segments, keep_audio_if_has=False, extend_sec=1.0, transition_sec=0.5):
-        """将多段视频先各延长 extend_sec（末帧定格），再经 xfade 的 **fade** 过渡拼接。
+    def concat_videos_with_transitions(self, video_segments, keep_audio_if_has=False, extend_sec=1.0, transition_sec=0.5, max_workers=None, overlays=None):
+        """将多段视频各延长 extend_sec（末帧定格，在同一张滤镜图内用 tpad 完成），再经 xfade 的 **fade** 过渡拼接。
 
         **稳定性说明**（相对其它过渡）：
         - `xfade=transition=fade` 是 FFmpeg 内置的最基础淡入淡出，文档与社区用例最多；分辨率与帧率一致时行为可预期。
@@ -2092,6 +1988,8 @@ class FfmpegProcessor:
         :param video_segments: list of dict，至少含 ``path`` 键
         :param extend_sec: 每段末尾延长秒数（末帧克隆），需 >= transition_sec
         :param transition_sec: 每处 xfade 过渡时长，应 < 每段延长后时长
+        :param max_workers: 片段数超过 ``XFADE_TREE_FANIN`` 时按树分轮合并，每轮并行的 ffmpeg 进程数（默认 ``CHUNK_RENDER_WORKERS``）
+        :param overlays: 成片叠加层（水印/角标等，见 resolve_brand_overlays_for_project），在最终那次编码里一并叠加
         """
         if not video_segments:
             return None
@@ -2113,141 +2011,357 @@ class FfmpegProcessor:
         video_out_path = config.get_temp_file(self.pid, "mp4")
         n = len(paths)
         if n == 1:
-            shutil.copy2(paths[0], video_out_path)
-            return video_out_path
-
-        temp_extended = []
-        extended_durations = []
-        try:
-            # 1) 每段：末帧延长 + 统一输出分辨率与帧率（xfade 前提）
-            for i, src in enumerate(paths):
-                out_ext = os.path.join(self.temp_dir, f"simple_xfade_ext_{i:03d}_{uuid.uuid4().hex[:8]}.mp4")
-                temp_extended.append(out_ext)
-                w, h = self.width, self.height
-                vf = (
-                    f"tpad=stop_duration={extend_sec:.5f}:stop_mode=clone,"
-                    f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
-                    f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:black,fps={STANDARD_FPS}"
-                )
-                cmd = [ffmpeg_path, "-y", "-i", src]
-                if self.has_audio_stream(src):
-                    cmd.extend(["-af", f"apad=pad_dur={extend_sec:.5f}"])
-                    cmd.extend(self._get_audio_encode_args())
-                else:
-                    cmd.append("-an")
-                cmd.extend(self._get_video_output_args(keyframe_interval=True))
-                cmd.extend(self._get_output_optimization_args())
-                cmd.extend(["-vf", vf, out_ext])
-                self.run_ffmpeg_command(cmd)
-                if not os.path.exists(out_ext):
-                    raise RuntimeError(f"Extended clip not created: {out_ext}")
-                d = self.get_duration(out_ext)
-                if d <= 0:
-                    raise RuntimeError(f"Invalid duration after extend: {out_ext}")
-                extended_durations.append(d)
-
-            # 2) xfade 链：transition=fade（最常用、参数最少）
-            input_args = []
-            for p in temp_extended:
-                input_args.extend(["-i", p])
-
-            video_filters = []
-            for i in range(n):
-                # 已在临时文件中统一分辨率与 fps，此处仅重置时间戳
-                video_filters.append(f"[{i}:v]setpts=PTS-STARTPTS[vv{i}]")
-
-            cur_label = "vv0"
-            for t in range(n - 1):
-                off = sum(extended_durations[: t + 1]) - (t + 1) * transition_sec
-                off = self._align_time_to_frame(off, STANDARD_FPS)
-                next_in = f"vv{t + 1}"
-                out_lab = f"vx{t + 1}" if t < n - 2 else "vout"
-                video_filters.append(
-                    f"[{cur_label}][{next_in}]xfade=transition=fade:duration={transition_sec:.6f}:offset={off:.6f}[{out_lab}]"
-                )
-                cur_label = out_lab
-
-            if keep_audio_if_has:
-                audio_filters = []
-                td = transition_sec
-                for i in range(n):
-                    dur_i = extended_durations[i]
-                    if i < n - 1:
-                        cut_dur = max(0.05, dur_i - td)
-                    else:
-                        cut_dur = dur_i
-                    if self.has_audio_stream(temp_extended[i]):
-                        audio_filters.append(
-                            f"[{i}:a]aresample={STANDARD_AUDIO_RATE},aformat=sample_fmts=fltp:sample_rates={STANDARD_AUDIO_RATE}:channel_layouts=stereo,"
-                            f"atrim=start=0:end={cut_dur:.6f},asetpts=PTS-STARTPTS[pa{i}]"
-                        )
-                    else:
-                        audio_filters.append(
-                            f"anullsrc=channel_layout=stereo:sample_rate={STANDARD_AUDIO_RATE}:duration={cut_dur:.6f}[pa{i}]"
-                        )
-                concat_inputs = "".join(f"[pa{i}]" for i in range(n))
-                audio_filters.append(
-                    f"{concat_inputs}concat=n={n}:v=0:a=1[audio_out]"
-                )
-                filter_complex = ";".join(video_filters + audio_filters)
-                cmd = [ffmpeg_path, "-y"] + input_args + [
-                    "-filter_complex", filter_complex,
-                    "-map", "[vout]", "-map", "[audio_out]",
-                    "-c:v", "libx264",
-                    "-preset", "medium",
-                    "-crf", "18",
-                ]
-                cmd.extend(self._get_video_output_args(keyframe_interval=False))
-                cmd.extend(self._get_audio_encode_args())
-                cmd.extend(self._get_output_optimization_args())
-                cmd.append(video_out_path)
+            if overlays:
+                if not self.apply_overlays_to_video(paths[0], video_out_path, overlays):
+                    raise RuntimeError("overlay pass failed")
             else:
-                filter_complex = ";".join(video_filters)
-                cmd = [ffmpeg_path, "-y"] + input_args + [
-                    "-filter_complex", filter_complex,
-                    "-map", "[vout]", "-an",
-                    "-c:v", "libx264",
-                    "-preset", "medium",
-                    "-crf", "18",
-                ]
-                cmd.extend(self._get_video_output_args(keyframe_interval=False))
-                cmd.extend(self._get_output_optimization_args())
-                cmd.append(video_out_path)
-
-            print(
-                f"🔨 concat_videos_simple_transitions: {n} clips, extend={extend_sec}s, "
-                f"video xfade={transition_sec}s; audio=hard-concat (no acrossfade)"
-            )
-            self.run_ffmpeg_command(cmd)
-
-            if not os.path.exists(video_out_path):
-                raise RuntimeError("Output not created")
-            fd = self.get_duration(video_out_path)
-            print(f"✅ simple xfade concat: {video_out_path} ({fd:.2f}s)")
+                shutil.copy2(paths[0], video_out_path)
             return video_out_path
 
+        # 帧级时间线：每段末帧克隆延长 extend_sec，相邻两段 fade 重叠 transition_sec（见 utility/transition_planner.py）
+        source_secs = [self.get_video_stream_duration(p) for p in paths]
+        plan = plan_transitions(source_secs, [extend_sec] * n, [transition_sec] * (n - 1), STANDARD_FPS)
+        plan.print_table()
+
+        print(
+            f"🔨 concat_videos_simple_transitions: {n} clips, extend={extend_sec}s, "
+            f"video xfade={transition_sec}s; audio=hard-concat (no acrossfade); fan-in {XFADE_TREE_FANIN} per graph"
+        )
+        items = [
+            {"path": p, "seconds": d, "pad": extend_sec, "has_audio": keep_audio_if_has and self.has_audio_stream(p)}
+            for p, d in zip(paths, source_secs)
+        ]
+        try:
+            self._xfade_tree_merge(items, transition_sec, keep_audio_if_has, video_out_path, max_workers, overlays)
         except Exception as e:
             print(f"❌ concat_videos_simple_transitions: {e}")
             raise
 
-        finally:
-            for p in temp_extended:
-                try:
-                    if p and os.path.isfile(p):
-                        os.remove(p)
-                except OSError:
-                    pass
-
-    def concat_videos_demuxer(self, video_segments, keep_audio_if_has=False):
-        if len(video_segments) == 1:
-            return video_segments[0]["path"]
+        if not os.path.exists(video_out_path):
+            raise RuntimeError("Output not created")
+        fd = self.get_duration(video_out_path)
+        print(f"✅ simple xfade concat: {video_out_path} ({fd:.2f}s, planned {plan.total_duration:.2f}s)")
+        return video_out_path
 
-        video_paths = [seg["path"] for seg in video_segments]
 
-        video_out_path = config.get_temp_file(self.pid, "mp4")
+    @staticmethod
+    def _balanced_groups(items, fanin):
+        """把 items 均分成 ceil(n / fanin) 组（各组大小相差不超过 1），保持顺序。"""
+        count = -(-len(items) // fanin)
+        size, extra = divmod(len(items), count)
+        groups, start = [], 0
+        for g in range(count):
+            end = start + size + (1 if g < extra else 0)
+            groups.append(items[start:end])
+            start = end
+        return groups
+
+
+    def _xfade_tree_merge(self, items, transition_sec, keep_audio, output_path, max_workers=None, overlays=None):
+        """平衡 k 叉树合并：每张图最多 ``XFADE_TREE_FANIN`` 路输入，同一轮的各组并行渲染，共 O(log_k n) 轮。
+
+        第 0 轮输入为源片段（统一帧率/尺寸 + 克隆末帧延长）；之后各轮输入为上一轮的组输出（不再延长）。
+        组与组之间同样重叠 T 帧做 xfade、上一组音轨裁掉末尾 T 帧，与把所有片段放进一张图的时间线逐帧一致：
+        组内末段保留完整 F 帧（含延长），正好提供与下一组首段重叠的 T 帧。
+        中间轮按中间文件档位编码，只有根节点用成片编码；``overlays`` 只在根节点叠加。
+        """
+        fanin = XFADE_TREE_FANIN
+        temps = []
+        level = 0
+        try:
+            while True:
+                groups = self._balanced_groups(items, fanin)
+                is_root = len(groups) == 1
+                started = time.perf_counter()
+
+                def _render(group, normalize=(level == 0), is_root=is_root):
+                    if len(group) == 1 and not normalize:
+                        return group[0]
+                    plan = plan_transitions(
+                        [it["seconds"] for it in group],
+                        [it["pad"] for it in group],
+                        [transition_sec] * (len(group) - 1),
+                        STANDARD_FPS,
+                    )
+                    out = output_path if is_root else config.get_temp_file(self.pid, "mp4")
+                    self._render_xfade_graph(group, plan, keep_audio, normalize, out, final=is_root, overlays=overlays if is_root else None)
+                    return {"path": out, "seconds": plan.total_frames / STANDARD_FPS, "pad": 0.0, "has_audio": keep_audio}
+
+                workers = max(1, min(int(max_workers or CHUNK_RENDER_WORKERS), len(groups)))
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    outputs = list(pool.map(_render, groups))
+                temps.extend(o["path"] for o in outputs if o["path"] != output_path and o not in items)
+                print(
+                    f"   🌲 xfade level {level}: {len(items)} inputs → {len(outputs)} "
+                    f"({workers} workers, {time.perf_counter() - started:.2f}s)"
+                )
+                if is_root:
+                    return output_path
+                items = outputs
+                level += 1
+        finally:
+            for path in temps:
+                if path != output_path and os.path.isfile(path):
+                    os.remove(path)
+
+
+    def _render_xfade_graph(self, items, plan, keep_audio, normalize, output_path, final, overlays=None):
+        """单张 xfade 图：``normalize`` 时统一帧率与尺寸并按计划克隆末帧延长；否则输入已是同规格的组输出。
+
+        ``overlays``（overlay_stage.OverlayLayer 列表）在 xfade 之后、同一次编码内叠加（成片水印/角标）。
+        """
+        w, h = self.width, self.height
+        cmd = [ffmpeg_path, "-y"]
+        for it in items:
+            cmd.extend(["-i", it["path"]])
+        n = len(items)
+        if overlays:
+            cmd.extend(overlay_stage.input_args(overlays))
+        if normalize:
+            norm = f"scale={w}:{h}:force_original_aspect_ratio=decrease,pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:black"
+            video_filters = [plan.clip_video_filter(i, f"fps={STANDARD_FPS}", norm, f"vv{i}") for i in range(n)]
+        else:
+            video_filters = [plan.clip_video_filter(i, out_label=f"vv{i}") for i in range(n)]
+        if overlays:
+            video_filters.extend(plan.xfade_filters([f"vv{i}" for i in range(n)], "vxout"))
+            video_filters.extend(overlay_stage.filter_chain(overlays, "vxout", n, "vout", STANDARD_FPS))
+        else:
+            video_filters.extend(plan.xfade_filters([f"vv{i}" for i in range(n)], "vout"))
+        if keep_audio:
+            audio_filters = plan.audio_filters([it["has_audio"] for it in items], STANDARD_AUDIO_RATE, "audio_out")
+            cmd.extend(["-filter_complex", ";".join(video_filters + audio_filters), "-map", "[vout]", "-map", "[audio_out]"])
+        else:
+            cmd.extend(["-filter_complex", ";".join(video_filters), "-map", "[vout]", "-an"])
+        # filter_complex 固定 libx264（NVENC 与长滤镜链兼容性差）；中间轮按中间文件档位
+        enc = {"codec": "libx264", "preset": "medium", "quality": ["-crf", "18"]}
+        if not final:
+            enc = INTERMEDIATE_PROFILES[self.intermediate_profile] or enc
+        cmd.extend(["-c:v", enc["codec"], "-preset", enc["preset"], *enc["quality"]])
+        cmd.extend(self._get_video_output_args(keyframe_interval=False, final=final))
+        if keep_audio:
+            cmd.extend(self._get_audio_encode_args())
+        cmd.extend(self._get_output_optimization_args())
+        cmd.append(output_path)
+        self.run_ffmpeg_command(cmd, duration=plan.total_duration)
+        if not os.path.isfile(output_path):
+            raise RuntimeError(f"xfade graph output not created: {output_path}")
+
+    def _xfade_piece_plan(self, clip_frames, transition_frames):
+        """把 xfade 时间线拆成独立可渲染的片段（单位：帧，均已含末帧延长）。
+
+        clip_frames[i] 为第 i 段延长后的帧数 F_i，T 为过渡帧数：
+        - ``body``：第 i 段中不参与任何过渡的部分 ``[T 或 0, F_i - T 或 F_i)``
+        - ``xfade``：第 i 段末尾 T 帧与第 i+1 段开头 T 帧的 fade 过渡
+        依次拼接后与 concat_videos_with_transitions 的整图输出逐帧一致，总长 ``sum(F) - (n-1)*T``。
+
+        中间段 ``F_i < 2T``（首尾段 ``F_i < T``）时前后两处过渡会重用同一批帧、拼出来比该总长更长，抛 ValueError。
+        """
+        n = len(clip_frames)
+        t = int(transition_frames)
+        for i, f in enumerate(clip_frames):
+            need = t * ((i > 0) + (i < n - 1))
+            if f < need:
+                raise ValueError(f"clip {i} has {f} frames, fewer than the {need} its transitions need")
+        pieces = []
+        for i, f in enumerate(clip_frames):
+            start = t if i > 0 else 0
+            end = f - t if i < n - 1 else f
+            if end > start:
+                pieces.append({"kind": "body", "clips": [i], "start_frame": start, "end_frame": end})
+            if i < n - 1:
+                pieces.append({"kind": "xfade", "clips": [i, i + 1], "start_frame": f - t, "end_frame": f})
+        return pieces
+
+
+    def _render_xfade_piece(self, piece, paths, extend_sec, transition_sec, transition_frames, output_path, overlays=None):
+        """渲染单个 body / xfade 片段（仅视频，统一分辨率、帧率与编码参数，便于后续 -c copy 拼接）。
+
+        ``overlays`` 只能是不带时间的静态层（水印/角标）：每个片段各自叠加，拼接后与整条叠加一致。
+        """
+        w, h = self.width, self.height
+        # tpad 多补几帧余量：帧数按时长估算，差 1 帧时也能取满 trim 区间
+        pad_sec = extend_sec + 4.0 / STANDARD_FPS
+        norm = (
+            f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+            f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:black,fps={STANDARD_FPS},"
+            f"tpad=stop_duration={pad_sec:.5f}:stop_mode=clone"
+        )
+        cmd = [ffmpeg_path, "-y"]
+        if piece["kind"] == "body":
+            cmd.extend(["-i", paths[piece["clips"][0]]])
+            filter_complex = (
+                f"[0:v]{norm},trim=start_frame={piece['start_frame']}:end_frame={piece['end_frame']},"
+                f"setpts=PTS-STARTPTS[v]"
+            )
+        else:
+            a, b = piece["clips"]
+            cmd.extend(["-i", paths[a], "-i", paths[b]])
+            filter_complex = (
+                f"[0:v]{norm},trim=start_frame={piece['start_frame']}:end_frame={piece['end_frame']},setpts=PTS-STARTPTS[va];"
+                f"[1:v]{norm},trim=start_frame=0:end_frame={transition_frames},setpts=PTS-STARTPTS[vb];"
+                f"[va][vb]xfade=transition=fade:duration={transition_sec:.6f}:offset=0[v]"
+            )
+        if overlays:
+            first = len(piece["clips"])
+            cmd.extend(overlay_stage.input_args(overlays))
+            filter_complex = filter_complex[:-len("[v]")] + "[vpiece];" + ";".join(
+                overlay_stage.filter_chain(overlays, "vpiece", first, "v", STANDARD_FPS)
+            )
+        cmd.extend(["-filter_complex", filter_complex, "-map", "[v]", "-an"])
+        # 片段会被 -c copy 直接拼成成片，故用成片编码
+        cmd.extend(self._get_video_output_args(keyframe_interval=False, final=True))
+        cmd.extend(self._get_output_optimization_args())
+        cmd.append(output_path)
+        self.run_ffmpeg_command(cmd)
+        if not os.path.isfile(output_path) or os.path.getsize(output_path) <= 0:
+            raise RuntimeError(f"xfade piece not created: {output_path}")
+
+
+    def concat_videos_with_transitions_incremental(self, video_paths, pieces_dir, keep_audio_if_has=True, extend_sec=1.0, transition_sec=0.5, max_workers=None, overlays=None):
+        """与 concat_videos_with_transitions 输出相同的时间线（末帧延长 + fade xfade + 硬切音轨），但按片段增量渲染。
+
+        时间线被拆成「段主体」与「相邻两段的过渡」两类片段，各自按输入文件身份 + 参数算 key 存入 ``pieces_dir``；
+        再次调用时未改动的片段直接复用，某段改动只重渲染该段主体及其前后两处过渡。
+        所有片段 -c copy 拼接视频，音轨单独一遍拼好后与视频 mux，避免逐片 AAC 帧边界累积误差。
+        ``overlays``（静态水印/角标）在渲染各片段时一并叠加，叠加层图片与参数计入片段 key。
+        """
+        if not video_paths:
+            return None
+        for p in video_paths:
+            if not p or not os.path.isfile(p):
+                raise ValueError(f"Invalid video segment path: {p!r}")
+        transition_sec = float(transition_sec)
+        extend_sec = float(extend_sec)
+        if transition_sec <= 0 or extend_sec <= 0:
+            raise ValueError("extend_sec and transition_sec must be positive")
+        if transition_sec > extend_sec:
+            transition_sec = extend_sec * 0.5
+            print(f"⚠️ transition_sec capped to {transition_sec:.3f}s (<= extend_sec)")
+
+        os.makedirs(pieces_dir, exist_ok=True)
+        n = len(video_paths)
+        transition_frames = int(round(transition_sec * STANDARD_FPS))
+        transition_sec = transition_frames / STANDARD_FPS
+        extend_frames = int(round(extend_sec * STANDARD_FPS))
+        clip_frames = [
+            int(round(self.get_video_stream_duration(p) * STANDARD_FPS)) + extend_frames
+            for p in video_paths
+        ]
+        identities = [file_identity(p) for p in video_paths]
+        signature = self._render_signature(final=True)
+        if overlays and any(layer.timed for layer in overlays):
+            raise ValueError("incremental xfade only supports static overlays")
+        overlay_key = [
+            {"file": file_identity(layer.path), "x": layer.x, "y": layer.y, "scale": layer.scale}
+            for layer in (overlays or [])
+        ]
+
+        try:
+            plan = self._xfade_piece_plan(clip_frames, transition_frames)
+        except ValueError as e:
+            # 片段太短无法拆成独立片段：退回整图渲染，保证时长与单独拼好的音轨一致
+            print(f"⚠️ incremental xfade not applicable ({e}), falling back to full transition graph")
+            return self.concat_videos_with_transitions(
+                video_paths, keep_audio_if_has=keep_audio_if_has, extend_sec=extend_sec,
+                transition_sec=transition_sec, max_workers=max_workers, overlays=overlays,
+            )
+        for piece in plan:
+            # 不含片段在时间线上的序号：插入/删除/调换场景后，内容与帧区间不变的片段仍命中
+            key = {
+                "kind": piece["kind"],
+                "frames": [piece["start_frame"], piece["end_frame"]],
+                "inputs": [identities[i] for i in piece["clips"]],
+                "extend": extend_sec, "transition": transition_sec,
+                "render": signature,
+            }
+            if overlay_key:
+                key["overlays"] = overlay_key
+            payload = json.dumps(key, sort_keys=True, default=str)
+            piece["path"] = os.path.join(pieces_dir, hashlib.sha1(payload.encode("utf-8")).hexdigest() + ".mp4")
+
+        # 内容相同的片段（重复场景）共用一个文件，只渲染一次
+        todo = list({piece["path"]: piece for piece in plan if not os.path.isfile(piece["path"])}.values())
+        print(f"🧩 incremental xfade: {n} clips → {len(plan)} pieces, {len(plan) - len(todo)} reused, {len(todo)} to render")
+
+        def _render(piece):
+            started = time.perf_counter()
+            part_path = piece["path"] + ".part.mp4"
+            self._render_xfade_piece(piece, video_paths, extend_sec, transition_sec, transition_frames, part_path, overlays)
+            os.replace(part_path, piece["path"])
+            return time.perf_counter() - started
+
+        workers = max(1, min(int(max_workers or CHUNK_RENDER_WORKERS), len(todo) or 1))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for piece, elapsed in zip(todo, pool.map(_render, todo)):
+                print(f"   ✅ {piece['kind']} {piece['clips']} frames [{piece['start_frame']}, {piece['end_frame']}) in {elapsed:.2f}s")
+
+        # 删除本次时间线不再引用的旧片段
+        used = {os.path.basename(piece["path"]) for piece in plan}
+        for name in os.listdir(pieces_dir):
+            if name.endswith(".mp4") and name not in used:
+                try:
+                    os.remove(os.path.join(pieces_dir, name))
+                except OSError:
+                    pass
+
+        concat_file_path = os.path.join(self.temp_dir, f"pieces_concat_list_{uuid.uuid4().hex[:8]}.txt")
+        video_out_path = config.get_temp_file(self.pid, "mp4")
+        try:
+            with open(concat_file_path, "w", encoding="utf-8") as f:
+                for piece in plan:
+                    f.write(self._concat_demuxer_path_line(piece["path"]))
+
+            cmd = [ffmpeg_path, "-y"]
+            if keep_audio_if_has:
+                # 音轨：第 i 段保留 (F_i - T) 帧时长（末段保留全部），不足部分静音补齐，与 xfade 时间线等长
+                audio_filters = []
+                for i, p in enumerate(video_paths):
+                    keep_frames = clip_frames[i] - transition_frames if i < n - 1 else clip_frames[i]
+                    keep_sec = keep_frames / STANDARD_FPS
+                    cmd.extend(["-i", p])
+                    if self.has_audio_stream(p):
+                        audio_filters.append(
+                            f"[{i}:a]aresample={STANDARD_AUDIO_RATE},aformat=sample_fmts=fltp:sample_rates={STANDARD_AUDIO_RATE}:channel_layouts=stereo,"
+                            f"apad,atrim=start=0:end={keep_sec:.6f},asetpts=PTS-STARTPTS[pa{i}]"
+                        )
+                    else:
+                        audio_filters.append(
+                            f"anullsrc=channel_layout=stereo:sample_rate={STANDARD_AUDIO_RATE}:duration={keep_sec:.6f}[pa{i}]"
+                        )
+                audio_filters.append("".join(f"[pa{i}]" for i in range(n)) + f"concat=n={n}:v=0:a=1[audio_out]")
+                cmd.extend(["-f", "concat", "-safe", "0", "-i", concat_file_path])
+                cmd.extend([
+                    "-filter_complex", ";".join(audio_filters),
+                    "-map", f"{n}:v:0", "-map", "[audio_out]",
+                    "-c:v", "copy",
+                ])
+                cmd.extend(self._get_audio_encode_args())
+            else:
+                cmd.extend(["-f", "concat", "-safe", "0", "-i", concat_file_path, "-map", "0:v:0", "-c:v", "copy", "-an"])
+            cmd.extend(["-movflags", "+faststart", video_out_path])
+            self.run_ffmpeg_command(cmd)
+        finally:
+            if os.path.exists(concat_file_path):
+                os.remove(concat_file_path)
+
+        if not os.path.exists(video_out_path):
+            raise RuntimeError("Output not created")
+        expected = (sum(clip_frames) - (n - 1) * transition_frames) / STANDARD_FPS
+        print(f"✅ incremental xfade concat: {video_out_path} ({self.get_duration(video_out_path):.2f}s, expected {expected:.2f}s)")
+        return video_out_path
+
+
+    def concat_videos_demuxer(self, video_segments, keep_audio_if_has=False, final=False):
+        if len(video_segments) == 1:
+            return video_segments[0]["path"]
+
+        video_paths = [seg["path"] for seg in video_segments]
+
+        video_out_path = config.get_temp_file(self.pid, "mp4")
         
+        # 每次调用独立的 list 文件：build_video_on_segments 会并行调用本方法
+        concat_file_path = os.path.join(self.temp_dir, f"chunk_concat_list_{uuid.uuid4().hex[:8]}.txt")
         try:
-            concat_file_path = os.path.join(self.temp_dir, "chunk_concat_list.txt")
             with open(concat_file_path, "w", encoding="utf-8") as f:
                 for video_path in video_paths:
                     f.write(self._concat_demuxer_path_line(video_path))
@@ -2261,7 +2375,7 @@ class FfmpegProcessor:
                 "-preset", "medium",
                 "-crf", "18",
             ]
-            concat_cmd.extend(self._get_video_output_args(keyframe_interval=False))
+            concat_cmd.extend(self._get_video_output_args(keyframe_interval=False, final=final))
             
             # Handle audio based on availability and settings
             if not keep_audio_if_has:
@@ -2289,13 +2403,17 @@ class FfmpegProcessor:
         except Exception as e:
             print(f"❌ Simple demuxer concatenation error: {e}")
             # Cleanup concat file
-            concat_file_path = os.path.join(self.temp_dir, "chunk_concat_list.txt")
             if os.path.exists(concat_file_path):
                 os.remove(concat_file_path)
             raise RuntimeError(f"Simple demuxer concatenation failed: {e}") from e
 
 
-    def build_video_on_segments(self, scenes):
+    def build_video_on_segments(self, scenes, max_workers=None):
+        """按 8 段一组渲染分块后再按顺序拼接。
+
+        各分块互相独立，用线程池并行驱动多个 ffmpeg 进程（``max_workers``，默认 ``CHUNK_RENDER_WORKERS``；
+        传 1 即退回串行）；完成顺序不定，但最终按分块原始顺序拼接。每块耗时会打印出来。
+        """
         video_segments = []
         audio_segments = []
         raw_scene_index = 0
@@ -2313,36 +2431,50 @@ class FfmpegProcessor:
         # Reduce chunk size to 8 videos max - transitions become unstable with too many videos
         chunk_size = 8
         video_chunks = [video_segments[i:i + chunk_size] for i in range(0, len(video_segments), chunk_size)]
-        
-        print(f"🎬 Processing {len(video_segments)} videos in {len(video_chunks)} chunks of up to {chunk_size} videos each (with transitions)")
-        
-        # Step 3: Process each chunk separately
+
+        workers = int(max_workers or CHUNK_RENDER_WORKERS)
+        workers = max(1, min(workers, len(video_chunks) or 1))
+        print(
+            f"🎬 Processing {len(video_segments)} videos in {len(video_chunks)} chunks of up to {chunk_size} videos each "
+            f"({workers} workers, intermediate profile: {self.intermediate_profile})"
+        )
+
+        def _render_chunk(i, chunk):
+            started = time.perf_counter()
+            # 只有一块时它就是最终输出，直接用成片编码
+            chunk_output = self.concat_videos_demuxer(chunk, final=len(video_chunks) == 1)
+
+            # Verify chunk was created successfully
+            if not os.path.exists(chunk_output):
+                raise RuntimeError(f"Chunk output file was not created: {chunk_output}")
+
+            chunk_duration = self.get_duration(chunk_output)
+            if chunk_duration <= 0:
+                raise RuntimeError(f"Chunk has invalid duration: {chunk_duration}")
+            return chunk_output, chunk_duration, time.perf_counter() - started
+
+        # Step 3: Process chunks concurrently, collect results in original order
         chunk_segs = []
         temp_files_to_cleanup = []
-        
-        for i, chunk in enumerate(video_chunks):
-            print(f"   📹 Processing chunk {i+1}/{len(video_chunks)} with {len(chunk)} videos...")
-            try:
-                chunk_output = self.concat_videos_demuxer(chunk)
-                
-                # Verify chunk was created successfully
-                if not os.path.exists(chunk_output):
-                    raise RuntimeError(f"Chunk output file was not created: {chunk_output}")
-                
-                chunk_duration = self.get_duration(chunk_output)
-                if chunk_duration <= 0:
-                    raise RuntimeError(f"Chunk has invalid duration: {chunk_duration}")
-                
-                chunk_segs.append({"path":chunk_output, "transition":"fade", "duration":1.0})
-                temp_files_to_cleanup.append(chunk_output)
-                print(f"   ✅ Chunk {i+1} processed successfully: {chunk_duration:.2f}s")
-                
-            except Exception as chunk_error:
-                print(f"❌ Error processing chunk {i+1}: {chunk_error}")
-                print(f"   📹 Chunk videos: {[seg['path'] for seg in chunk]}")
-                # Don't fail completely - try to continue with remaining chunks
-                # But warn about missing content
-                print(f"⚠️  Chunk {i+1} will be skipped - this may result in missing video content!")
+        render_started = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_render_chunk, i, chunk) for i, chunk in enumerate(video_chunks)]
+            for i, (chunk, future) in enumerate(zip(video_chunks, futures)):
+                try:
+                    chunk_output, chunk_duration, elapsed = future.result()
+                    chunk_segs.append({"path":chunk_output, "transition":"fade", "duration":1.0})
+                    temp_files_to_cleanup.append(chunk_output)
+                    print(f"   ✅ Chunk {i+1}/{len(video_chunks)} ({len(chunk)} videos): {chunk_duration:.2f}s video, rendered in {elapsed:.2f}s")
+
+                except Exception as chunk_error:
+                    print(f"❌ Error processing chunk {i+1}: {chunk_error}")
+                    print(f"   📹 Chunk videos: {[seg['path'] for seg in chunk]}")
+                    # Don't fail completely - try to continue with remaining chunks
+                    # But warn about missing content
+                    print(f"⚠️  Chunk {i+1} will be skipped - this may result in missing video content!")
+
+        print(f"⏱️  Chunk rendering wall time: {time.perf_counter() - render_started:.2f}s [{self.intermediate_profile}]")
         
         # Step 4: Final concatenation of all chunk videos
         if len(chunk_segs) == 0:
@@ -2363,91 +2495,44 @@ class FfmpegProcessor:
                 print(f"   📹 Chunk {i+1}: {chunk_duration:.2f}s - {chunk_seg['path']}")
             print(f"   📐 Total expected duration: {total_chunk_duration:.2f}s")
             
-            return self.concat_videos_demuxer(chunk_segs)
+            return self.concat_videos_demuxer(chunk_segs, final=True)
+
 
+    def _probe(self, filename):
+        """ffprobe 全量元数据（磁盘缓存，见 utility/media_probe.py）。"""
+        return media_probe.get_probe_cache(self.pid).probe(filename)
 
-    # cmd = f'..\ffmpeg\\bin\\ffprobe -v error -show_entries format=duration -of default=noprint_wrappers=1:nokey=1 "{filename}"'
     def get_duration(self, filename):
         if not filename:
             return 0.0
-        
-        # Check cache first
-        if filename in FfmpegProcessor._duration_cache:
-            return FfmpegProcessor._duration_cache[filename]
-        
-        try:    
-            result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "error",
-                "-show_entries", "format=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                filename
-                ])
-            
-            if result.returncode == 0 and result.stdout.strip():
-                duration = float(result.stdout.strip())
-                # Save to cache
-                FfmpegProcessor._duration_cache[filename] = duration
-                return duration
-            return 0.0
-        except Exception as e:
-            print(f"FFmpeg Error: {e}")
-            return 0.0
+        return media_probe.format_duration(self._probe(filename))
+
+    def probe_many(self, paths, max_workers=None):
+        """并发探测一批文件（写入共享探测缓存）；返回 ``{path: {duration, width, height, fps, has_audio, ...} 或 None}``。"""
+        return media_probe.probe_many(paths, self.pid, max_workers)
 
     def get_video_stream_duration(self, filename):
         """视频流时长（忽略更长的音轨，避免 format duration 误判）。"""
         if not filename:
             return 0.0
-        try:
-            result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                filename,
-            ])
-            if result.returncode == 0 and result.stdout.strip():
-                duration = float(result.stdout.strip())
-                if duration > 0:
-                    return duration
-        except Exception as e:
-            print(f"FFmpeg video stream duration error: {e}")
-        return self.get_duration(filename)
+        info = self._probe(filename)
+        return media_probe.stream_duration(info, "video") or media_probe.format_duration(info)
 
     @classmethod
     def clear_duration_cache(cls):
-        """Clear all cached duration values"""
-        cls._duration_cache.clear()
+        """Clear all cached probe results (in memory; the on-disk store is rewritten on next flush)"""
+        media_probe.clear_all()
 
     @classmethod
     def invalidate_duration_cache(cls, filename):
-        """Remove a specific file from the duration cache (use when file is modified)"""
-        if filename in cls._duration_cache:
-            del cls._duration_cache[filename]
-        abs_name = os.path.abspath(filename) if filename else ""
-        if abs_name and abs_name in cls._duration_cache:
-            del cls._duration_cache[abs_name]
+        """Remove a specific file from the probe cache (use when file is modified)"""
+        media_probe.invalidate(filename)
 
     def _ffprobe_stream_duration(self, filename: str, stream: str) -> float:
         if not filename:
             return 0.0
-        try:
-            result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", stream,
-                "-show_entries", "stream=duration",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                filename,
-            ])
-            if result.returncode == 0 and result.stdout.strip():
-                duration = float(result.stdout.strip())
-                if duration > 0:
-                    return duration
-        except Exception as e:
-            print(f"FFmpeg stream duration error ({stream}): {e}")
-        return 0.0
+        codec_type = {"v": "video", "a": "audio"}[stream.split(":")[0]]
+        return media_probe.stream_duration(self._probe(filename), codec_type)
 
     def get_playback_duration(self, filename, *, fresh: bool = False) -> float:
         """UI 播放用时长：format / 视频流 / 音频流 取最大；``fresh=True`` 时先清缓存再探测。"""
@@ -2462,56 +2547,21 @@ class FfmpegProcessor:
 
     def get_resolution(self, filename):
         """Get the resolution (width, height) of an image or video file"""
-        try:
-            result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height",
-                "-of", "default=noprint_wrappers=1:nokey=1",
-                filename
-            ])
-            
-            if result.stdout.strip():
-                lines = result.stdout.strip().split('\n')
-                if len(lines) >= 2:
-                    width = int(lines[0])
-                    height = int(lines[1])
-                    return width, height
-            return None, None
-        except Exception as e:
-            print(f"FFmpeg Error getting resolution: {e}")
+        stream = media_probe.first_stream(self._probe(filename), "video")
+        if not stream or stream.get("width") is None or stream.get("height") is None:
             return None, None
+        return int(stream["width"]), int(stream["height"])
 
     def _probe_video_size_and_fps(self, filename):
-        """一次 ffprobe 读取首路视频宽高与帧率，供 resize 与 GUI 复用，减少重复子进程。"""
-        try:
-            result = self.run_ffmpeg_command([
-                ffprobe_path,
-                "-v", "error",
-                "-select_streams", "v:0",
-                "-show_entries", "stream=width,height,r_frame_rate",
-                "-of", "json",
-                filename,
-            ])
-            data = json.loads(result.stdout or "{}")
-            streams = data.get("streams") or []
-            if not streams:
-                return None, None, None
-            s = streams[0]
-            w = int(s["width"]) if s.get("width") is not None else None
-            h = int(s["height"]) if s.get("height") is not None else None
-            r = (s.get("r_frame_rate") or "0/1").strip()
-            if "/" in r:
-                num, den = r.split("/", 1)
-                fps_f = float(num) / float(den) if float(den) != 0 else 0.0
-            else:
-                fps_f = float(r) if r else 0.0
-            fps_i = int(round(fps_f)) if fps_f > 0 else None
-            return w, h, fps_i
-        except Exception as e:
-            print(f"ffprobe size/fps: {e}")
+        """读取首路视频宽高与帧率（共用探测缓存），供 resize 与 GUI 复用。"""
+        stream = media_probe.first_stream(self._probe(filename), "video")
+        if not stream:
             return None, None, None
+        w = int(stream["width"]) if stream.get("width") is not None else None
+        h = int(stream["height"]) if stream.get("height") is not None else None
+        fps_f = media_probe.parse_rate(stream.get("r_frame_rate"))
+        fps_i = int(round(fps_f)) if fps_f > 0 else None
+        return w, h, fps_i
 
     def probe_video_stream_basic(self, video_path: str):
         """返回 {"width","height","fps"} 或 None（无视频轨时）。"""
@@ -2545,95 +2595,68 @@ class FfmpegProcessor:
         print(f"✅ Video mirrored successfully: {output_file}")
         return output_file
 
-    def _apply_corner_logo_to_video(self, src_video, dest_video, logo_path, opts, corner: str) -> bool:
-        """
-        在视频角落叠加 PNG（先 upscale：横屏 1920×1080 / 竖屏 1080×1920）。
+    def brand_base_filter(self, src_video, stretch_small=False):
+        """成片画幅的主画面缩放链：横屏 1920×1080 / 竖屏 1080×1920（缩放 + 补边）。
 
-        corner: ``br`` 右下角；``tl`` 左上角。
-        opts: margin_x, margin_y, max_width, max_height（可选）
-
-        叠加前将角标链路强制为 rgba，以保持透明 PNG 的 alpha，`overlay` 按透明度与底图混合，
-        不会用整块不透明像素盖住下层视频。
+        ``stretch_small``：偏小分辨率（横屏宽 < 1200、竖屏宽 < 700）直接拉伸到画幅，
+        与原先「先 resize_video 到 1280×720 / 720×1280 再 upscale」的几何一致，但只重采样、编码一次。
+        读不到分辨率时返回 None（保持原尺寸）。
         """
-        corner = (corner or "br").lower()
-        if corner not in ("br", "tl"):
-            raise ValueError("corner must be 'br' or 'tl'")
-        if not Path(logo_path).exists():
-            return False
         dims = self.get_resolution(str(src_video))
-        if dims and dims[0] is not None and dims[1] is not None:
-            w, h = dims
-            out_w, out_h = (1920, 1080) if w >= h else (1080, 1920)
-            upscale = (
-                f"[0:v]scale={out_w}:{out_h}:force_original_aspect_ratio=decrease,"
-                f"pad={out_w}:{out_h}:(ow-iw)/2:(oh-ih)/2[v_base]"
-            )
-            video_in = "[v_base]"
-        else:
-            upscale = ""
-            video_in = "[0:v]"
-        margin_x = opts.get("margin_x", 20)
-        margin_y = opts.get("margin_y", 20)
-        max_w = opts.get("max_width")
-        max_h = opts.get("max_height")
-        if dims and dims[0] is not None and dims[1] is not None:
-            vw, vh = dims
-            frame_w, frame_h = (1920, 1080) if vw >= vh else (1080, 1920)
-            if max_w is not None and max_w >= frame_w:
-                max_w = None
-            if max_h is not None and max_h >= frame_h:
-                max_h = None
-        if max_w is not None and max_h is not None:
-            max_w, max_h = int(max_w), int(max_h)
-        if max_w is not None and max_h is not None:
-            scl = (
-                f"scale={max_w}:{max_h}:force_original_aspect_ratio=decrease,"
-                f"format=rgba"
-            )
-        elif max_w is not None:
-            scl = f"scale={int(max_w)}:-1,format=rgba"
-        elif max_h is not None:
-            scl = f"scale=-1:{int(max_h)},format=rgba"
-        else:
-            scl = None
-
-        # 透明 PNG：先转 rgba（含调色板+tRNS），再 scale；最后再 rgba，避免某些版本 scale 丢弃 alpha，
-        # 否则透明区会变成实色整块盖住底层视频。
-        if scl:
-            logo_chain = f"[1:v]format=rgba,{scl}[wm]"
-        else:
-            logo_chain = "[1:v]format=rgba[wm]"
-
-        if corner == "br":
-            overlay_expr = f"main_w-overlay_w-{margin_x}:main_h-overlay_h-{margin_y}"
-        else:
-            overlay_expr = f"{margin_x}:{margin_y}"
-        overlay_part = f"{logo_chain};{video_in}[wm]overlay={overlay_expr}[v]"
-        filt = f"{upscale};{overlay_part}" if upscale else overlay_part.replace(video_in, "[0:v]")
-        cmd = [
-            ffmpeg_path,
-            "-y",
-            "-i",
-            str(src_video),
-            "-i",
-            str(logo_path),
-            "-filter_complex",
-            filt,
-            "-map",
-            "[v]",
-            "-map",
-            "0:a?",
-            "-c:a",
-            "copy",
-            str(dest_video),
-        ]
+        if not dims or dims[0] is None or dims[1] is None:
+            return None, None
+        w, h = dims
+        out_w, out_h = publish_frame_size(w, h)
+        small = (w < 1200) if w > h else (w < 700)
+        if stretch_small and small:
+            return f"scale={out_w}:{out_h}", (out_w, out_h)
+        return (
+            f"scale={out_w}:{out_h}:force_original_aspect_ratio=decrease,"
+            f"pad={out_w}:{out_h}:(ow-iw)/2:(oh-ih)/2"
+        ), (out_w, out_h)
+
+    def apply_overlays_to_video(self, src_video, dest_video, layers, base_filter=None) -> bool:
+        """一次编码把 ``layers``（overlay_stage.OverlayLayer：水印、角标、文字精灵图……）叠加到视频上，输出到 dest_video。
+
+        ``base_filter``：叠加前主画面的缩放/补边链（可选）。音轨直接复制。
+        """
+        filters = []
+        base = "0:v"
+        if base_filter:
+            filters.append(f"[0:v]{base_filter}[v_base]")
+            base = "v_base"
+        filters.extend(overlay_stage.filter_chain(layers, base, 1, "v", STANDARD_FPS))
+        cmd = [ffmpeg_path, "-y", "-i", str(src_video)]
+        cmd.extend(overlay_stage.input_args(layers))
+        cmd.extend(["-filter_complex", ";".join(filters), "-map", "[v]", "-map", "0:a?"])
+        cmd.extend(["-pix_fmt", "yuv420p", *self._get_output_args(final=True)])
+        cmd.extend(["-c:a", "copy"])
+        cmd.extend(self._get_output_optimization_args(avoid_negative_ts=False))
+        cmd.append(str(dest_video))
         try:
-            subprocess.run(cmd, check=True, capture_output=True, timeout=600)
+            FfmpegJob(cmd, timeout=600).run()
             return True
         except Exception as e:
-            print(f"❌ Corner logo overlay failed ({corner}): {e}")
+            print(f"❌ Overlay pass failed: {e}")
             return False
 
+    def _apply_corner_logo_to_video(self, src_video, dest_video, logo_path, opts, corner: str, stretch_small=False) -> bool:
+        """
+        在视频角落叠加 PNG（先 upscale：横屏 1920×1080 / 竖屏 1080×1920），单次编码。
+
+        corner: ``br`` 右下角；``tl`` 左上角。
+        opts: margin_x, margin_y, max_width, max_height（可选）
+        """
+        if not Path(logo_path).exists():
+            return False
+        base_filter, frame = self.brand_base_filter(src_video, stretch_small)
+        frame_w, frame_h = frame or (self.width, self.height)
+        layer = corner_logo_layer(logo_path, opts, corner, frame_w, frame_h)
+        ok = self.apply_overlays_to_video(src_video, dest_video, [layer], base_filter)
+        if not ok:
+            print(f"❌ Corner logo overlay failed ({corner})")
+        return ok
+
     def apply_watermark_to_flat_image(
         self,
         image_path: str,
@@ -2690,62 +2713,24 @@ class FfmpegProcessor:
 
     def watermark_clip_with_preprocess(self, src_video: str, dest_video: str, watermark_path, opts: dict) -> bool:
         """
-        与 add_watermark_cli.process_video 一致：偏小分辨率先 resize，再叠加水印。
+        与 add_watermark_cli.process_video 一致：偏小分辨率先放大，再叠加水印。
+        放大与叠加在同一张滤镜图里完成（见 brand_base_filter），只编码一次。
         """
-        src_abs = os.path.abspath(src_video)
-        vp = src_abs
+        vp = os.path.abspath(src_video)
         dims = self.get_resolution(vp)
         if not dims or dims[0] is None or dims[1] is None:
             print(f"❌ Watermark: cannot read resolution: {vp}")
             return False
-        width, height = dims
-        resized = None
-        try:
-            if width > height:
-                if width < 1200:
-                    resized = self.resize_video(vp, 1280, 720)
-                    if resized:
-                        vp = resized
-            else:
-                if width < 700:
-                    resized = self.resize_video(vp, 720, 1280)
-                    if resized:
-                        vp = resized
-            return self.apply_watermark_to_video(vp, dest_video, watermark_path, opts)
-        finally:
-            if vp != src_abs and os.path.isfile(vp):
-                try:
-                    os.remove(vp)
-                except OSError:
-                    pass
+        return self._apply_corner_logo_to_video(vp, dest_video, watermark_path, opts, "br", stretch_small=True)
 
     def headmark_clip_with_preprocess(self, src_video: str, dest_video: str, headmark_path, opts: dict) -> bool:
-        """偏小分辨率先 resize，再在左上角叠加 PNG 角标。"""
-        src_abs = os.path.abspath(src_video)
-        vp = src_abs
+        """偏小分辨率先放大，再在左上角叠加 PNG 角标（同一次编码）。"""
+        vp = os.path.abspath(src_video)
         dims = self.get_resolution(vp)
         if not dims or dims[0] is None or dims[1] is None:
             print(f"❌ Headmark: cannot read resolution: {vp}")
             return False
-        width, height = dims
-        try:
-            if width > height:
-                if width < 1200:
-                    resized = self.resize_video(vp, 1280, 720)
-                    if resized:
-                        vp = resized
-            else:
-                if width < 700:
-                    resized = self.resize_video(vp, 720, 1280)
-                    if resized:
-                        vp = resized
-            return self.apply_headmark_to_video(vp, dest_video, headmark_path, opts)
-        finally:
-            if vp != src_abs and os.path.isfile(vp):
-                try:
-                    os.remove(vp)
-                except OSError:
-                    pass
+        return self._apply_corner_logo_to_video(vp, dest_video, headmark_path, opts, "tl", stretch_small=True)
 
     def reverse_video(self, video_path):
         output_file = config.get_temp_file(self.pid, "mp4")
@@ -3073,51 +3058,22 @@ class FfmpegProcessor:
         """单张横屏图源：cover 缩放至覆盖 ``tw×sh``，水平视窗相对居中偏移 ``shift_x``（像素，正右负左），裁底后得到与拼图条一致的一层。
 
         与 ``compose_landscape_vertical_mosaic_webp`` 中单层逻辑一致，供 GUI 预览与拼接共用。
+        按需缩小解码、先裁后缩放，结果缓存复用（见 utility/mosaic_composer.py）；返回的图像只读。
         """
-        from PIL import Image
-
-        tw, sh = int(tw), int(sh)
-        h_trimmed = sh - bottom_trim_px
-        if h_trimmed <= 0:
-            raise ValueError("bottom_trim_px 过大，裁剪后高度无效")
-        fill = tuple(fill_rgb)
+        from utility.mosaic_composer import get_composer
 
-        img = Image.open(src_path)
-        try:
-            img.seek(0)
-        except EOFError:
-            pass
-        if img.mode not in ("RGB", "RGBA"):
-            img = img.convert("RGBA") if img.mode == "LA" else img.convert("RGB")
-        w0, h0 = img.size
-        scale = max(tw / w0, sh / h0)
-        nw = max(1, int(round(w0 * scale)))
-        nh = max(1, int(round(h0 * scale)))
-        img = img.resize((nw, nh), Image.Resampling.LANCZOS)
-        left_center = (nw - tw) // 2
-        top_c = (nh - sh) // 2
-        left = left_center + int(shift_x)
-        max_left = max(0, nw - tw)
-        left = max(0, min(left, max_left))
-        img = img.crop((left, top_c, left + tw, top_c + sh))
-        if img.mode == "RGBA":
-            bg = Image.new("RGB", (tw, sh), fill)
-            bg.paste(img, mask=img.split()[3])
-            img = bg
-        elif img.mode != "RGB":
-            img = img.convert("RGB")
-        return img.crop((0, 0, tw, h_trimmed))
+        return get_composer().source_layer(
+            src_path, tw, sh, bottom_trim_px, fill_rgb=fill_rgb, shift_x=shift_x
+        )
 
     @staticmethod
     def mosaic_crop_shift_limits(src_path: str, tw: int, sh: int) -> tuple[int, int]:
         """相对「居中裁切」的水平偏移允许范围 ``[min_shift, max_shift]``（含端点）。正数往右、负数往左。"""
-        from PIL import Image
+        from utility.mosaic_composer import cover_geometry, get_composer
 
         tw, sh = int(tw), int(sh)
-        with Image.open(src_path) as im:
-            w0, h0 = im.size
-        scale = max(tw / w0, sh / h0)
-        nw = max(1, int(round(w0 * scale)))
+        w0, h0 = get_composer().source_size(src_path)
+        nw, _, _, _ = cover_geometry(w0, h0, tw, sh)
         if nw < tw:
             return 0, 0
         left_center = (nw - tw) // 2
@@ -3159,97 +3115,55 @@ class FfmpegProcessor:
           - 仅当拼接条高度小于画布、且 ``vertical_align`` 为 ``center`` 时生效；
           - 总纵向留白 ``gap`` 中，分配给「上方留白」的比例 ``∈ [0,1]``（如 ``2/3`` 表示上留白 : 下留白 = 2 : 1）。
         """
-        from PIL import Image
-
-        n = len(paths)
-        if n not in (2, 3):
-            raise ValueError("compose_landscape_vertical_mosaic_webp 仅支持 2 或 3 张图")
-        vertical_a = vertical_align.strip().lower()
-        if vertical_a not in ("center", "top"):
-            raise ValueError("vertical_align 须为 center 或 top")
-
-        tw, sh = int(stage_w), int(stage_h)
-        h_trimmed = sh - bottom_trim_px
-        if h_trimmed <= 0:
-            raise ValueError("bottom_trim_px 过大，裁剪后高度无效")
-
-        fill = tuple(fill_rgb)
+        return self.compose_landscape_vertical_mosaic_variants_webp(
+            paths,
+            [{
+                "vertical_align": vertical_align,
+                "vertical_gap_top_fraction": vertical_gap_top_fraction,
+                "horizontal_crop_shifts": horizontal_crop_shifts,
+                "viewport_crop_shifts": viewport_crop_shifts,
+            }],
+            stage_w=stage_w,
+            stage_h=stage_h,
+            bottom_trim_px=bottom_trim_px,
+            fill_rgb=fill_rgb,
+        )[0]
 
-        if horizontal_crop_shifts is None:
-            hsh = [0] * n
-        else:
-            hsh = list(horizontal_crop_shifts)
-            if len(hsh) != n:
-                raise ValueError(
-                    f"horizontal_crop_shifts 长度须为 {n}（当前 {len(hsh)}）"
-                )
+    def compose_landscape_vertical_mosaic_variants_webp(
+        self,
+        paths: list[str],
+        variants: list[dict],
+        *,
+        stage_w: int,
+        stage_h: int,
+        bottom_trim_px: int,
+        fill_rgb: tuple[int, int, int] = (255, 255, 255),
+    ) -> list[str]:
+        """同一组图源批量生成多个封面变体（每个 variant 含 vertical_align / vertical_gap_top_fraction /
+        horizontal_crop_shifts / viewport_crop_shifts，含义同 compose_landscape_vertical_mosaic_webp）。
 
-        if viewport_crop_shifts is None:
-            vsh = [0] * n
-        else:
-            vsh = list(viewport_crop_shifts)
-            if len(vsh) != n:
-                raise ValueError(
-                    f"viewport_crop_shifts 长度须为 {n}（当前 {len(vsh)}）"
-                )
+        图源只解码一次，各变体复用同一块画布；返回与 ``variants`` 顺序一致的 webp 路径。
+        """
+        from utility.mosaic_composer import get_composer
 
-        out_w = int(self.width)
-        out_h = int(self.height)
-
-        layers_full = [
-            self.prep_mosaic_source_layer(
-                p,
-                tw,
-                sh,
-                bottom_trim_px,
-                fill_rgb=fill_rgb,
-                shift_x=hsh[i],
-            )
-            for i, p in enumerate(paths)
-        ]
+        outputs: list[str] = []
 
-        layers: list = []
-        for i, lay in enumerate(layers_full):
-            ttw, tth = lay.size
-            if ttw < out_w:
-                raise ValueError(f"条带宽 {ttw} 小于画布宽 {out_w}")
-            x0 = (ttw - out_w) // 2 + int(vsh[i])
-            x0 = max(0, min(x0, ttw - out_w))
-            layers.append(lay.crop((x0, 0, x0 + out_w, tth)))
-
-        stacked_h = h_trimmed * n
-        stacked = Image.new("RGB", (out_w, stacked_h), fill)
-        yp = 0
-        for lay in layers:
-            stacked.paste(lay, (0, yp))
-            yp += h_trimmed
-
-        stripe = stacked
-
-        canvas = Image.new("RGB", (out_w, out_h), fill)
-        sh_stripe = stripe.height
-
-        if sh_stripe > out_h:
-            if vertical_a == "top":
-                stripe = stripe.crop((0, 0, out_w, out_h))
-            else:
-                cut = (sh_stripe - out_h) // 2
-                stripe = stripe.crop((0, cut, out_w, cut + out_h))
-            canvas.paste(stripe, (0, 0))
-        elif vertical_a == "top":
-            canvas.paste(stripe, (0, 0))
-        else:
-            gap = out_h - sh_stripe
-            if vertical_gap_top_fraction is not None:
-                frac = max(0.0, min(1.0, float(vertical_gap_top_fraction)))
-                y0 = int(round(gap * frac))
-            else:
-                y0 = gap // 2
-            canvas.paste(stripe, (0, y0))
+        def _save(_index, canvas):
+            output_image = config.get_temp_file(self.pid, "webp")
+            canvas.save(output_image, "WEBP", quality=90, method=6)
+            outputs.append(output_image)
 
-        output_image = config.get_temp_file(self.pid, "webp")
-        canvas.save(output_image, "WEBP", quality=90, method=6)
-        return output_image
+        get_composer().compose_many(
+            paths,
+            (int(self.width), int(self.height)),
+            variants,
+            stage_w=stage_w,
+            stage_h=stage_h,
+            bottom_trim_px=bottom_trim_px,
+            fill_rgb=fill_rgb,
+            on_image=_save,
+        )
+        return outputs
 
     def compose_dual_landscape_vertical_mosaic_webp(
         self,
@@ -3423,7 +3337,15 @@ class FfmpegProcessor:
         content = content.replace("\r", "")
         total_length = len(content)
         lines = content.split("\n")
-        
+
+        try:
+            video_duration, video_width, video_height = self._overlay_target_info(input_video_path)
+        except Exception as e:
+            print(f"❌ Error adding script to video: {e}")
+            return input_video_path
+
+        # 每行一张精灵图，全部叠进同一次编码（原先每行单独 add_title_to_video 一遍）
+        layers = []
         start_pos = 0.0
         for line in lines:
             line_length = self.countLineLength(line)
@@ -3442,16 +3364,34 @@ class FfmpegProcessor:
             end_pos = start_pos + line_length / total_length
             if end_pos > 1.0:
                 end_pos = 1.0
-            input_video_path = self.add_title_to_video(input_video_path, line, font, font_s, (start_pos, end_pos), position)
+            if not line.strip():
+                start_pos = end_pos
+                continue
+            try:
+                layers.append(self._title_overlay_layer(
+                    video_width, video_height, video_duration, line, font, font_s, (start_pos, end_pos), position
+                ))
+            except Exception as e:
+                print(f"❌ Error preparing script line '{line}': {e}")
             start_pos = end_pos
 
-        return input_video_path
+        return self._apply_overlay_layers(input_video_path, layers)
 
 
+    def _overlay_target_info(self, input_video_path):
+        video_duration = self.get_duration(input_video_path)
+        video_width, video_height = self.check_video_size(input_video_path)
+        if video_width == 0 or video_height == 0:
+            # Fallback to default dimensions
+            video_width, video_height = self.width, self.height
+            print(f"⚠️  Could not detect video resolution, using default: {video_width}x{video_height}")
+        return video_duration, video_width, video_height
+
+
+    def _title_overlay_layer(self, video_width, video_height, video_duration, title, font, font_size, title_show_portion, position):
+        """标题文字 → 缓存的精灵图 + 叠加位置/淡入淡出时间（overlay_stage.OverlayLayer）。"""
+        from utility import text_atlas
 
-    def add_title_to_video(self, input_video_path, title, font, font_size, title_show_portion=(0.01, 0.99), position="header"):
-        output_file = config.get_temp_file(self.pid, "mp4")
-        
         lines = title.split("_")
         if len(lines) == 2:
             font_size = font_size - 15
@@ -3460,142 +3400,110 @@ class FfmpegProcessor:
         elif len(lines) > 3:
             font_size = font_size - 35
 
-        try:
-            # Get video duration and dimensions
-            video_duration = self.get_duration(input_video_path)
-            video_width, video_height = self.check_video_size(input_video_path)
-            
-            if video_width == 0 or video_height == 0:
-                # Fallback to default dimensions
-                video_width, video_height = self.width, self.height
-                print(f"⚠️  Could not detect video resolution, using default: {video_width}x{video_height}")
-            
-            print(f"🎬 Adding title to video: {video_width}x{video_height}, Duration: {video_duration:.2f}s")
-            
-            # Calculate fade times based on title_show_portion parameter
-            start_portion, end_portion = title_show_portion
-            fadein_start = start_portion * video_duration
-            fadein_end = end_portion * video_duration
-            
-            # Calculate fade duration dynamically based on show duration (max 0.5s or 5% of show duration)
-            show_duration = fadein_end - fadein_start
-            fade_duration = min(0.5, show_duration * 0.05)  # Use 5% of show duration or max 0.5s
-            fade_duration = max(0.1, fade_duration)  # Minimum 0.1s for smooth fade
-            
-            # Calculate actual fade start and end times
-            fade_in_end_time = fadein_start + fade_duration
-            fade_out_start_time = fadein_end - fade_duration
-            
-            print(f"   Title show portion: {start_portion:.2f} - {end_portion:.2f} ({show_duration:.2f}s)")
-            print(f"   Fade duration: {fade_duration:.2f}s")
-            print(f"   Fade in: {fadein_start:.2f}s - {fade_in_end_time:.2f}s")
-            print(f"   Full display: {fade_in_end_time:.2f}s - {fade_out_start_time:.2f}s")
-            print(f"   Fade out: {fade_out_start_time:.2f}s - {fadein_end:.2f}s")
-            
-            # Calculate available text width for wrapping based on video dimensions
-            aspect_ratio = video_width / video_height
+        # Calculate fade times based on title_show_portion parameter
+        start_portion, end_portion = title_show_portion
+        fadein_start = start_portion * video_duration
+        fadein_end = end_portion * video_duration
+
+        # Calculate fade duration dynamically based on show duration (max 0.5s or 5% of show duration)
+        show_duration = fadein_end - fadein_start
+        fade_duration = min(0.5, show_duration * 0.05)  # Use 5% of show duration or max 0.5s
+        fade_duration = max(0.1, fade_duration)  # Minimum 0.1s for smooth fade
+
+        print(f"   Title show portion: {start_portion:.2f} - {end_portion:.2f} ({show_duration:.2f}s), fade {fade_duration:.2f}s")
+
+        # Calculate available text width for wrapping based on video dimensions
+        aspect_ratio = video_width / video_height
+        if aspect_ratio < 1.0:
+            available_width = int(video_width * 0.92)  # 90% of width for narrow screens
+            # Portrait mode: reduce by 70% of font size for tighter spacing
+            line_spacing_reduction = -int(font_size * 0.7)
+        else:
+            available_width = int(video_width * 0.85)  # 75% of width for wider screens
+            # Landscape mode: reduce by 50% of font size
+            line_spacing_reduction = -int(font_size * 0.5)
+
+        title = title.replace('#', ' ')
+        sprite = text_atlas.render_text_sprite(
+            title, font["path"], font_size,
+            color="white", max_width=available_width, line_spacing=line_spacing_reduction,
+        )
+        print(f"   Title sprite: {sprite.width}x{sprite.height}, lines {list(sprite.lines)}")
+
+        # Set text position based on position parameter and aspect ratio
+        position_lower = position.lower()
+        if position_lower == "header":
+            # Header position - top of video
             if aspect_ratio < 1.0:
-                available_width = int(video_width * 0.92)  # 90% of width for narrow screens
-                #font_size = int(font_size * 0.7)
+                text_y_pos = int(video_height * 0.06)  # Position text higher in portrait mode
             else:
-                available_width = int(video_width * 0.85)  # 75% of width for wider screens
-            
-            # Calculate text wrapping with language-aware character width estimation
-            script_type, estimated_char_width = self._detect_script_and_estimate_char_width(title, font_size)
-            chars_per_line = max(4, int(available_width / estimated_char_width))
-            title = title.replace('#',' ')
-            wrapped_title = self._wrap_text(title, chars_per_line)
-            
-            print(f"   Original title: '{title}'")
-            print(f"   Wrapped title: '{wrapped_title}'")
-            
-            # 使用完整路径的中文字体文件
-            font_path = os.path.abspath(font["path"]).replace('\\', '\\\\').replace(':', '\\:')
-            
-            # 创建临时文本文件以避免FFmpeg文本转义问题，使用wrapped文本
-            text_file_path = config.get_temp_file(self.pid, f"txt_{self.pid}.txt")
-            with open(text_file_path, "w", encoding="utf-8") as f:
-                f.write(wrapped_title)
-            
-            escaped_text_file_path = text_file_path.replace('\\', '\\\\').replace(':', '\\:')
-            
-            # Set text position based on position parameter and aspect ratio
-            position_lower = position.lower()
-            if position_lower == "header":
-                # Header position - top of video
-                if aspect_ratio < 1.0:
-                    text_y_pos = int(video_height * 0.06)  # Position text higher in portrait mode
-                else:
-                    text_y_pos = int(video_height * 0.12)  # Position text at 14% from top
-            elif position_lower == "body":
-                # Body position - center of video
-                text_y_pos = "(h-text_h)/2"  # Center vertically
-            elif position_lower == "footer":
-                # Footer position - bottom of video
-                if aspect_ratio < 1.0:
-                    text_y_pos = f"h-text_h-{int(video_height * 0.06)}"  # 8% from bottom in portrait mode
-                else:
-                    text_y_pos = f"h-text_h-{int(video_height * 0.09)}"  # 14% from bottom in landscape mode
+                text_y_pos = int(video_height * 0.12)  # Position text at 14% from top
+        elif position_lower == "body":
+            # Body position - center of video
+            text_y_pos = "(H-h)/2"  # Center vertically
+        elif position_lower == "footer":
+            # Footer position - bottom of video
+            if aspect_ratio < 1.0:
+                text_y_pos = f"H-h-{int(video_height * 0.06)}"  # 8% from bottom in portrait mode
             else:
-                # Default to header if position not recognized
-                print(f"⚠️  Unrecognized position '{position}', using header position")
-                if aspect_ratio < 1.0:
-                    text_y_pos = int(video_height * 0.08)
-                else:
-                    text_y_pos = int(video_height * 0.14)
-            
-            # Calculate line spacing reduction for multi-line text
-            # More aggressive reduction for portrait mode (9:16) to save vertical space
+                text_y_pos = f"H-h-{int(video_height * 0.09)}"  # 14% from bottom in landscape mode
+        else:
+            # Default to header if position not recognized
+            print(f"⚠️  Unrecognized position '{position}', using header position")
             if aspect_ratio < 1.0:
-                # Portrait mode: reduce by 70% of font size for tighter spacing
-                line_spacing_reduction = -int(font_size * 0.7)
+                text_y_pos = int(video_height * 0.08)
             else:
-                # Landscape mode: reduce by 50% of font size
-                line_spacing_reduction = -int(font_size * 0.5)
-            
-            # Check if input video has audio
+                text_y_pos = int(video_height * 0.14)
+
+        return overlay_stage.OverlayLayer(
+            path=sprite.path,
+            x="(W-w)/2",
+            y=str(text_y_pos),
+            start=fadein_start,
+            end=fadein_end,
+            fade=fade_duration,
+        )
+
+
+    def _apply_overlay_layers(self, input_video_path, layers):
+        """把 ``layers`` 一次性叠加到视频上（单次编码）；无图层或失败时返回原视频路径。"""
+        if not layers:
+            return input_video_path
+        output_file = config.get_temp_file(self.pid, "mp4")
+        try:
             has_audio = self.has_audio_stream(input_video_path)
-            
-            # Build drawtext filter for title overlay with fade effects and line spacing
-            drawtext_filter = (
-                f"drawtext=fontfile='{font_path}':textfile='{escaped_text_file_path}':"
-                f"fontcolor=white:fontsize={font_size}:"
-                f"line_spacing={line_spacing_reduction}:"  # Reduce spacing between lines
-                f"x=(w-text_w)/2:y={text_y_pos}:"
-                f"enable='between(t,{fadein_start},{fadein_end})':"
-                f"alpha='if(lt(t,{fade_in_end_time}),(t-{fadein_start})/{fade_duration},"
-                f"if(lt(t,{fade_out_start_time}),1,1-(t-{fade_out_start_time})/{fade_duration}))'"
-            )
-            
-            spacing_percentage = 70 if aspect_ratio < 1.0 else 50
-            print(f"📝 Line spacing reduced by {-line_spacing_reduction}px ({spacing_percentage}% of font size {font_size}px for {'portrait' if aspect_ratio < 1.0 else 'landscape'} mode)")
-            
+            filters = overlay_stage.filter_chain(layers, "0:v", 1, "vout", STANDARD_FPS)
+
             cmd = self._ffmpeg_input_args(input_video_path)
+            cmd.extend(overlay_stage.input_args(layers))
+            cmd.extend(["-filter_complex", ";".join(filters), "-map", "[vout]"])
             cmd.extend(self._get_video_output_args())
             # Handle audio - re-encode to ensure consistency
             if has_audio:
+                cmd.extend(["-map", "0:a"])
                 cmd.extend(self._get_audio_encode_args())
             cmd.extend(self._get_output_optimization_args())
-            cmd.extend([
-                "-vf", drawtext_filter,
-                output_file
-            ])
-            
+            cmd.append(output_file)
+
             self.run_ffmpeg_command(cmd)
-            
-            print(f"✅ Title successfully added to video at {position} position: {output_file}")
-            # Clean up temporary text file
-            if os.path.exists(text_file_path):
-                os.remove(text_file_path)
-                
+            print(f"✅ {len(layers)} overlay(s) added to video in one pass: {output_file}")
+            return output_file
+        except Exception as e:
+            print(f"❌ Error adding overlays to video: {e}")
+            return input_video_path
+
+
+    def add_title_to_video(self, input_video_path, title, font, font_size, title_show_portion=(0.01, 0.99), position="header"):
+        try:
+            video_duration, video_width, video_height = self._overlay_target_info(input_video_path)
+            print(f"🎬 Adding title to video: {video_width}x{video_height}, Duration: {video_duration:.2f}s")
+            layer = self._title_overlay_layer(
+                video_width, video_height, video_duration, title, font, font_size, title_show_portion, position
+            )
         except Exception as e:
             print(f"❌ Error adding title to video: {e}")
-            # Clean up temporary text file on error
-            text_file_path = os.path.join(self.temp_dir, "txt_title.txt")
-            if os.path.exists(text_file_path):
-                os.remove(text_file_path)
-        
-        return output_file
+            return input_video_path
+        return self._apply_overlay_layers(input_video_path, [layer])
 
 
     def add_title_to_image(self, input_image_path, title, font, font_size, position, text_color, bold):
@@ -3930,7 +3838,7 @@ class FfmpegProcessor:
 
 
     def _speed_match_video_duration(
-        self, input_video_path, output_video_path, target_duration, segment_duration=None
+        self, input_video_path, output_video_path, target_duration, segment_duration=None, profile=None
     ):
         """
         用 setpts 拉伸/压缩时间轴，使画面时长接近 target_duration（仅输出视频轨，不含音频）。
@@ -3954,7 +3862,7 @@ class FfmpegProcessor:
         )
 
         cmd = self._ffmpeg_input_args(input_video_path)
-        cmd.extend(self._get_video_output_args(keyframe_interval=False))
+        cmd.extend(self._get_video_output_args(keyframe_interval=False, profile=profile))
         cmd.extend([
             "-map", "0:v:0",
             "-an",
@@ -3968,7 +3876,7 @@ class FfmpegProcessor:
         self.invalidate_duration_cache(output_video_path)
         return True
 
-    def _extend_video_only_to_duration(self, input_video_path, target_duration, output_video_path):
+    def _extend_video_only_to_duration(self, input_video_path, target_duration, output_video_path, profile=None):
         """视频短于目标：末帧 clone 延长到 target_duration（仅视频轨）。"""
         segment_duration = self.get_video_stream_duration(input_video_path)
         if target_duration <= 0.0 or abs(segment_duration - target_duration) < 0.1:
@@ -3985,7 +3893,7 @@ class FfmpegProcessor:
             f"(tpad +{extend_by:.3f}s)"
         )
         cmd = self._ffmpeg_input_args(input_video_path)
-        cmd.extend(self._get_video_output_args(keyframe_interval=True))
+        cmd.extend(self._get_video_output_args(keyframe_interval=True, profile=profile))
         cmd.extend([
             "-map", "0:v:0",
             "-an",
@@ -3997,7 +3905,7 @@ class FfmpegProcessor:
         self.invalidate_duration_cache(output_video_path)
         return output_video_path
 
-    def _trim_video_only_to_duration(self, input_video_path, target_duration, output_video_path):
+    def _trim_video_only_to_duration(self, input_video_path, target_duration, output_video_path, profile=None):
         """视频长于目标：裁剪到 target_duration（仅视频轨）。"""
         segment_duration = self.get_video_stream_duration(input_video_path)
         if target_duration <= 0.0 or abs(segment_duration - target_duration) < 0.1:
@@ -4013,7 +3921,7 @@ class FfmpegProcessor:
         )
         vf = f"trim=duration={target_duration:.6f},setpts=PTS-STARTPTS"
         cmd = self._ffmpeg_input_args(input_video_path)
-        cmd.extend(self._get_video_output_args(keyframe_interval=False))
+        cmd.extend(self._get_video_output_args(keyframe_interval=False, profile=profile))
         cmd.extend([
             "-map", "0:v:0",
             "-an",
@@ -4025,9 +3933,9 @@ class FfmpegProcessor:
         self.invalidate_duration_cache(output_video_path)
         return output_video_path
 
-    def adjust_video_to_duration(self, input_video_path, target_duration, when_longer="trim"):
+    def adjust_video_to_duration(self, input_video_path, target_duration, when_longer="trim", profile=None):
         """
-        将视频画面时长对齐到 target_duration（仅处理视频轨，输出无音频）。
+        将视频画面时长对齐到 target_duration（仅处理视频轨，输出无音频）；``profile`` 为中间文件编码档位。
 
         when_longer 作为对齐模式（不仅限于「更长」）:
             - "speed": 任意长短均用 setpts 变速对齐（慢放或加速）
@@ -4043,7 +3951,7 @@ class FfmpegProcessor:
         if when_longer == "speed":
             try:
                 self._speed_match_video_duration(
-                    input_video_path, output_video_path, target_duration, segment_duration
+                    input_video_path, output_video_path, target_duration, segment_duration, profile=profile
                 )
                 out_dur = self.get_video_stream_duration(output_video_path)
                 if out_dur > target_duration + 0.15:
@@ -4051,33 +3959,33 @@ class FfmpegProcessor:
                         f"⚠️ Speed match still long ({out_dur:.3f}s > {target_duration:.3f}s), trimming"
                     )
                     return self._trim_video_only_to_duration(
-                        output_video_path, target_duration, config.get_temp_file(self.pid, "mp4")
+                        output_video_path, target_duration, config.get_temp_file(self.pid, "mp4"), profile=profile
                     )
                 if out_dur < target_duration - 0.15:
                     print(
                         f"⚠️ Speed match still short ({out_dur:.3f}s < {target_duration:.3f}s), extending"
                     )
                     return self._extend_video_only_to_duration(
-                        output_video_path, target_duration, config.get_temp_file(self.pid, "mp4")
+                        output_video_path, target_duration, config.get_temp_file(self.pid, "mp4"), profile=profile
                     )
                 return output_video_path
             except Exception as e:
                 print(f"❌ Speed adjustment failed: {e}")
                 if segment_duration < target_duration:
                     return self._extend_video_only_to_duration(
-                        input_video_path, target_duration, output_video_path
+                        input_video_path, target_duration, output_video_path, profile=profile
                     )
                 return self._trim_video_only_to_duration(
-                    input_video_path, target_duration, output_video_path
+                    input_video_path, target_duration, output_video_path, profile=profile
                 )
 
         if segment_duration < target_duration:
             return self._extend_video_only_to_duration(
-                input_video_path, target_duration, output_video_path
+                input_video_path, target_duration, output_video_path, profile=profile
             )
 
         return self._trim_video_only_to_duration(
-            input_video_path, target_duration, output_video_path
+            input_video_path, target_duration, output_video_path, profile=profile
         )
 
 
@@ -0,0 +1,204 @@
+"""
+进程级 ffmpeg/ffprobe 并发调度：所有子进程先领槽位再启动，避免各模块各自并行时压垮 CPU / NVENC。
+
+槽位池：
+- ``heavy``：视频重编码（x264/NVENC，吃满多核）；
+- ``light``：流复制/纯音频/抽帧等轻量命令；
+- ``probe``：ffprobe 与 ``ffmpeg -encoders`` 这类查询；
+- ``nvenc``：命令里用到 ``*_nvenc`` 编码器时在 heavy 之外再占一个（消费级显卡同时编码会话数有限）。
+
+同一池内按优先级排队（``INTERACTIVE`` 先于 ``BATCH``，同级先到先得）。未显式指定时，
+主线程（Tk 事件循环）发起的命令视为交互，其余线程视为批处理；也可用 ``priority_scope`` 指定。
+``metrics()`` 返回各池的运行数、排队深度与等待耗时统计。
+
+``FfmpegJob.run`` 已自动经过调度；直接调用 subprocess 的地方改用 ``ffmpeg_scheduler.run(cmd, **kwargs)``。
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import os
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+HEAVY = "heavy"
+LIGHT = "light"
+PROBE = "probe"
+NVENC = "nvenc"
+
+INTERACTIVE = 0
+BATCH = 10
+
+_CPU = os.cpu_count() or 2
+DEFAULT_SLOTS = {
+    HEAVY: max(2, min(6, _CPU // 3)),
+    LIGHT: max(2, _CPU // 2),
+    PROBE: 8,
+    NVENC: 3,
+}
+# 等待槽位超过此秒数时打印一行，便于定位排队瓶颈
+SLOW_WAIT_LOG_SEC = 2.0
+
+_AUDIO_IMAGE_EXTS = (".wav", ".mp3", ".m4a", ".aac", ".flac", ".ogg", ".opus", ".png", ".jpg", ".jpeg", ".webp", ".bmp")
+_COPY_FLAGS = {("-c", "copy"), ("-c:v", "copy"), ("-vcodec", "copy"), ("-codec", "copy")}
+
+
+class SlotCancelled(Exception):
+    """排队期间 ``cancel_event`` 被置位，未领到槽位。"""
+
+
+def classify(cmd) -> str:
+    """按命令行推断负载类型：ffprobe/查询 → probe；不重编码视频 → light；其余 → heavy。"""
+    if not cmd:
+        return PROBE
+    exe = os.path.basename(str(cmd[0])).lower()
+    args = [str(a) for a in cmd[1:]]
+    if "ffprobe" in exe or "-i" not in args:
+        return PROBE
+    if "-vn" in args or any(pair in _COPY_FLAGS for pair in zip(args, args[1:])):
+        return LIGHT
+    if args[-1].lower().endswith(_AUDIO_IMAGE_EXTS):
+        return LIGHT
+    return HEAVY
+
+
+def uses_nvenc(cmd) -> bool:
+    return any(str(a).endswith("_nvenc") for a in cmd)
+
+
+class _SlotPool:
+    def __init__(self, name: str, slots: int):
+        self.name = name
+        self.slots = max(1, int(slots))
+        self.running = 0
+        self._waiting: list[tuple[int, int]] = []
+        self._cond = threading.Condition()
+        self.max_queued = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, priority: int, ticket_no: int, cancel_event: Optional[threading.Event]) -> float:
+        ticket = (priority, ticket_no)
+        started = time.perf_counter()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self.max_queued = max(self.max_queued, len(self._waiting))
+            try:
+                while self.running >= self.slots or self._waiting[0] != ticket:
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise SlotCancelled(self.name)
+                    self._cond.wait(0.2)
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+                raise
+            heapq.heappop(self._waiting)
+            self.running += 1
+            waited = time.perf_counter() - started
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            # 下一个排队者可能也有空槽
+            self._cond.notify_all()
+            return waited
+
+    def release(self) -> None:
+        with self._cond:
+            self.running -= 1
+            self.completed += 1
+            self._cond.notify_all()
+
+    def resize(self, slots: int) -> None:
+        with self._cond:
+            self.slots = max(1, int(slots))
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "running": self.running,
+                "queued": len(self._waiting),
+                "max_queued": self.max_queued,
+                "completed": self.completed,
+                "total_wait_sec": round(self.total_wait, 3),
+                "max_wait_sec": round(self.max_wait, 3),
+            }
+
+
+class FfmpegScheduler:
+    def __init__(self, slots: Optional[dict] = None):
+        merged = {**DEFAULT_SLOTS, **(slots or {})}
+        self._pools = {name: _SlotPool(name, n) for name, n in merged.items()}
+        self._tickets = itertools.count()
+        self._local = threading.local()
+
+    def configure(self, **slots) -> None:
+        """运行时调整槽位数，例如 ``configure(heavy=2, nvenc=5)``。"""
+        for name, n in slots.items():
+            self._pools[name].resize(n)
+
+    def current_priority(self) -> int:
+        explicit = getattr(self._local, "priority", None)
+        if explicit is not None:
+            return explicit
+        return INTERACTIVE if threading.current_thread() is threading.main_thread() else BATCH
+
+    @contextmanager
+    def priority_scope(self, priority: int):
+        previous = getattr(self._local, "priority", None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    @contextmanager
+    def slot(self, cmd, kind: Optional[str] = None, priority: Optional[int] = None,
+             cancel_event: Optional[threading.Event] = None):
+        """占用 ``kind``（默认按命令推断）池的一个槽位；NVENC 编码额外占 ``nvenc`` 槽位。"""
+        kind = kind or classify(cmd)
+        names = [kind] + ([NVENC] if kind == HEAVY and uses_nvenc(cmd) else [])
+        prio = self.current_priority() if priority is None else priority
+        ticket_no = next(self._tickets)
+        held = []
+        try:
+            for name in names:
+                pool = self._pools[name]
+                waited = pool.acquire(prio, ticket_no, cancel_event)
+                held.append(pool)
+                if waited >= SLOW_WAIT_LOG_SEC:
+                    print(f"⏳ ffmpeg {name} slot waited {waited:.1f}s ({pool.snapshot()['queued']} still queued)")
+            yield
+        finally:
+            for pool in reversed(held):
+                pool.release()
+
+    def metrics(self) -> dict:
+        return {name: pool.snapshot() for name, pool in self._pools.items()}
+
+
+_scheduler = FfmpegScheduler()
+
+
+def get_scheduler() -> FfmpegScheduler:
+    return _scheduler
+
+
+def priority_scope(priority: int):
+    """``with priority_scope(INTERACTIVE): ...``：本线程内发起的 ffmpeg 按该优先级排队。"""
+    return _scheduler.priority_scope(priority)
+
+
+def metrics() -> dict:
+    return _scheduler.metrics()
+
+
+def run(cmd, *, kind: Optional[str] = None, priority: Optional[int] = None, **kwargs) -> subprocess.CompletedProcess:
+    """``subprocess.run`` 的调度版本：先领槽位再执行，参数原样透传。"""
+    with _scheduler.slot(cmd, kind, priority):
+        return subprocess.run(cmd, **kwargs)
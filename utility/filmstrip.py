@@ -0,0 +1,290 @@
+"""
+时间轴拖动用的胶片条（sprite sheet）：每个视频一次 ffmpeg 解码，按固定间隔（默认每秒一帧）抽低分辨率帧，
+拼成若干张 ``cols×rows`` 的 JPEG 大图并写一个 ``index.json``，缓存到 ``config.MACHINE_CACHE_PATH/filmstrips/``。
+
+GUI 拖动滑块 / 时间轴时原先每次 ``cv2.VideoCapture.set(CAP_PROP_POS_FRAMES)``，长 GOP 的 H.264 要从前一个关键帧
+解码到目标帧，拖动时明显卡顿；有胶片条后直接从已解码的大图里裁出最近的一格显示，松手后再按需精确解码。
+
+- key 为 ``(文件身份 render_cache.file_identity, 格高, 版本)``，文件被改写后自动失效，跨项目复用；
+- ``request`` 把生成任务排进单个后台线程（批处理优先级，见 ffmpeg_scheduler），GUI 当前在看的视频插队到最前；
+- ``get`` 只查缓存，未生成返回 None（调用方退回原来的解码方式）；
+- 大图解码结果按张数做 LRU，来回拖动不重复解码 JPEG；
+- 磁盘上总大小超过 ``FILMSTRIP_CACHE_MAX_BYTES`` 时按最近使用时间整条淘汰（见 disk_budget.py）。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from PIL import Image
+
+import config
+from utility import ffmpeg_scheduler, media_probe
+from utility.disk_budget import DiskBudget
+from utility.render_cache import file_identity
+
+ffmpeg_path = "ffmpeg"
+
+# 抽帧间隔（秒）；视频过长时放宽到总格数不超过 FILMSTRIP_MAX_TILES
+FILMSTRIP_INTERVAL_SEC = 1.0
+FILMSTRIP_MAX_TILES = 1200
+# 每格高度（宽度按视频宽高比，取偶数）
+FILMSTRIP_TILE_HEIGHT = 180
+FILMSTRIP_SHEET_COLS = 10
+FILMSTRIP_SHEET_ROWS = 10
+# 生成规则变更时 bump，旧胶片条失效
+FILMSTRIP_VERSION = 1
+# 内存中保留的已解码大图张数
+SHEET_CACHE_MAX = 6
+# 磁盘缓存上限（字节）；一条 1200 格的胶片条约 10–20 MB
+FILMSTRIP_CACHE_MAX_BYTES = 4 * 1024 ** 3
+
+# showinfo 每输出一帧打印一行 ``n: <序号>``，用来数 fps 实际产出的帧数
+_SHOWINFO_FRAME_RE = re.compile(r"Parsed_showinfo_\d+ @ [^\]]*\]\s+n:\s*\d+")
+
+_lock = threading.Lock()
+_strips: dict[str, "Filmstrip"] = {}
+_sheets: OrderedDict = OrderedDict()
+_queue: deque = deque()
+_queued: set[str] = set()
+_worker: Optional[threading.Thread] = None
+_wakeup = threading.Condition(_lock)
+
+
+@dataclass(frozen=True)
+class Filmstrip:
+    directory: str
+    interval: float
+    tile_width: int
+    tile_height: int
+    cols: int
+    rows: int
+    count: int
+    sheets: tuple[str, ...]
+
+    def tile_index(self, t: float) -> int:
+        return max(0, min(self.count - 1, int(round(max(0.0, float(t)) / self.interval))))
+
+    def tile_at(self, t: float):
+        """``t`` 秒处最近一格的 RGB 图（只读；需要改动时先 copy）。大图缺失时返回 None。"""
+        index = self.tile_index(t)
+        per_sheet = self.cols * self.rows
+        sheet_no, cell = divmod(index, per_sheet)
+        if sheet_no >= len(self.sheets):
+            return None
+        sheet = _load_sheet(os.path.join(self.directory, self.sheets[sheet_no]))
+        if sheet is None:
+            return None
+        row, col = divmod(cell, self.cols)
+        x0, y0 = col * self.tile_width, row * self.tile_height
+        return sheet.crop((x0, y0, x0 + self.tile_width, y0 + self.tile_height))
+
+
+def cache_dir() -> str:
+    return os.path.join(config.MACHINE_CACHE_PATH, "filmstrips")
+
+
+def _strip_key(video_path: str) -> Optional[str]:
+    identity = file_identity(video_path)
+    if not identity:
+        return None
+    payload = f"{FILMSTRIP_VERSION}|{identity}|{FILMSTRIP_TILE_HEIGHT}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _strip_dir(key: str) -> str:
+    return os.path.join(cache_dir(), key[:2], key)
+
+
+_budget = DiskBudget("filmstrip", cache_dir, FILMSTRIP_CACHE_MAX_BYTES)
+
+
+def _load_sheet(path: str):
+    with _lock:
+        img = _sheets.get(path)
+        if img is not None:
+            _sheets.move_to_end(path)
+            return img
+    try:
+        with Image.open(path) as im:
+            img = im.convert("RGB")
+    except OSError:
+        return None
+    with _lock:
+        _sheets[path] = img
+        while len(_sheets) > SHEET_CACHE_MAX:
+            _sheets.popitem(last=False)
+    return img
+
+
+def _read_index(directory: str) -> Optional[Filmstrip]:
+    try:
+        with open(os.path.join(directory, "index.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        return Filmstrip(
+            directory=directory,
+            interval=float(meta["interval"]),
+            tile_width=int(meta["tile_width"]),
+            tile_height=int(meta["tile_height"]),
+            cols=int(meta["cols"]),
+            rows=int(meta["rows"]),
+            count=int(meta["count"]),
+            sheets=tuple(meta["sheets"]),
+        )
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def get(video_path: str) -> Optional[Filmstrip]:
+    """只查缓存，不生成；未命中返回 None。"""
+    key = _strip_key(video_path)
+    if not key:
+        return None
+    with _lock:
+        strip = _strips.get(key)
+    if strip is not None:
+        if os.path.isdir(strip.directory):
+            return strip
+        # 已被磁盘淘汰
+        with _lock:
+            _strips.pop(key, None)
+    directory = _strip_dir(key)
+    if not os.path.isdir(directory):
+        return None
+    strip = _read_index(directory)
+    if strip is not None and strip.count > 0:
+        _budget.touch(directory)
+        with _lock:
+            _strips[key] = strip
+        return strip
+    return None
+
+
+def build(video_path: str) -> Optional[Filmstrip]:
+    """同步生成（已缓存则直接返回）。一次 ffmpeg：``fps`` 抽帧 → 缩放 → ``tile`` 拼图，输出 ``sheet_%03d.jpg``。"""
+    strip = get(video_path)
+    if strip is not None:
+        return strip
+    key = _strip_key(video_path)
+    if not key:
+        return None
+    meta = media_probe.summarize(media_probe.get_probe_cache(None).probe(video_path))
+    if not meta or not meta["width"] or not meta["height"] or meta["video_duration"] <= 0:
+        return None
+    duration = float(meta["video_duration"])
+    interval = max(FILMSTRIP_INTERVAL_SEC, duration / FILMSTRIP_MAX_TILES)
+    tile_h = FILMSTRIP_TILE_HEIGHT
+    tile_w = max(2, int(round(tile_h * meta["width"] / meta["height"] / 2)) * 2)
+    cols, rows = FILMSTRIP_SHEET_COLS, FILMSTRIP_SHEET_ROWS
+
+    directory = _strip_dir(key)
+    tmp_dir = f"{directory}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    # showinfo 需要 info 级日志；-nostats 去掉进度行
+    cmd = [
+        ffmpeg_path, "-y", "-v", "info", "-nostats",
+        "-i", video_path,
+        "-an", "-sn",
+        "-vf", f"fps=1/{interval:.6f},scale={tile_w}:{tile_h}:flags=bilinear,showinfo,tile={cols}x{rows}",
+        "-q:v", "5",
+        os.path.join(tmp_dir, "sheet_%03d.jpg"),
+    ]
+    started = time.perf_counter()
+    try:
+        # 整段解码，按重负载占槽位（输出是图片，classify 会误判为 light）
+        result = ffmpeg_scheduler.run(
+            cmd, kind=ffmpeg_scheduler.HEAVY, capture_output=True, text=True, encoding="utf-8", errors="ignore",
+        )
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"❌ filmstrip failed ({os.path.basename(video_path)}): {e}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+    sheets = sorted(n for n in os.listdir(tmp_dir) if n.startswith("sheet_") and n.endswith(".jpg"))
+    if result.returncode != 0 or not sheets:
+        print(f"❌ filmstrip failed ({os.path.basename(video_path)}): {(result.stderr or '').strip()[-300:]}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return None
+
+    # 按时长估算的格数可能比 fps 实际产出多一帧（末格为黑色填充），以 showinfo 数到的帧数为准
+    produced = len(_SHOWINFO_FRAME_RE.findall(result.stderr or ""))
+    count = min(int(math.floor(duration / interval)) + 1, len(sheets) * cols * rows)
+    if produced:
+        count = min(count, produced)
+    with open(os.path.join(tmp_dir, "index.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": FILMSTRIP_VERSION,
+            "source": os.path.abspath(video_path),
+            "duration": duration,
+            "interval": interval,
+            "tile_width": tile_w,
+            "tile_height": tile_h,
+            "cols": cols,
+            "rows": rows,
+            "count": count,
+            "sheets": sheets,
+        }, f, ensure_ascii=False)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    if os.path.isdir(directory) and _read_index(directory) is None:
+        # 上次生成中断留下的残缺目录（没有 index.json），不删掉的话 os.replace 每次都失败
+        shutil.rmtree(directory, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, directory)
+        _budget.added(DiskBudget.entry_size(directory))
+    except OSError:
+        # 另一个进程已先生成
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    print(f"🎞️  filmstrip: {os.path.basename(video_path)} → {count} frames in {len(sheets)} sheets ({time.perf_counter() - started:.2f}s)")
+    return get(video_path)
+
+
+def _worker_loop() -> None:
+    with ffmpeg_scheduler.priority_scope(ffmpeg_scheduler.BATCH):
+        while True:
+            with _wakeup:
+                while not _queue:
+                    _wakeup.wait()
+                path = _queue.popleft()
+                _queued.discard(path)
+            try:
+                build(path)
+            except Exception as e:
+                print(f"❌ filmstrip failed ({os.path.basename(path)}): {e}")
+
+
+def request(video_paths, urgent: bool = False) -> None:
+    """把 ``video_paths``（单个路径或列表）排进后台生成队列；已缓存/已排队的跳过。``urgent`` 插到队首（GUI 当前视频）。"""
+    global _worker
+    if isinstance(video_paths, str):
+        video_paths = [video_paths]
+    paths = [p for p in dict.fromkeys(video_paths) if p and os.path.isfile(p) and get(p) is None]
+    if not paths:
+        return
+    with _wakeup:
+        for path in (reversed(paths) if urgent else paths):
+            if path in _queued:
+                if not urgent:
+                    continue
+                _queue.remove(path)
+            _queued.add(path)
+            if urgent:
+                _queue.appendleft(path)
+            else:
+                _queue.append(path)
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_worker_loop, daemon=True)
+            _worker.start()
+        _wakeup.notify()
+
+
+def prewarm(video_paths: Iterable[str]) -> None:
+    request(list(video_paths))
@@ -0,0 +1,243 @@
+"""
+视频帧缩略图服务：首帧 / 末帧 / 第 N 秒帧按几档尺寸抽成 webp，按文件身份缓存到 ``config.MACHINE_CACHE_PATH/frames/``。
+
+原先 ``extract_frame``、GUI 的 ``load_video_first_frame`` 等每次都从头打开视频解一帧；这里：
+- 同一位置的所有尺寸一次 ffmpeg 抽出（``split`` 后各自缩放），之后任何尺寸都直接命中；
+- key 为 ``(文件身份 render_cache.file_identity, 位置, 尺寸档, 版本)``，文件被改写后自动失效，跨项目复用；
+- 同一 key 并发请求只抽一次（GUI 翻页与后台预热撞在一起时，GUI 等待预热结果而不是再起一个进程）；
+- ``prewarm`` 在后台线程按批处理优先级抽取（见 ffmpeg_scheduler），载入项目时调用，场景切换时画面即时显示；
+- GUI 用 ``get_frame_async``：未命中时在后台线程按交互优先级抽取，不阻塞 Tk 事件循环；
+  交互请求撞上批处理预热正在抽的同一帧时不排在它后面等，而是自己按交互优先级抽（避免优先级反转）；
+- 总大小超过 ``FRAME_CACHE_MAX_BYTES`` 时按最近使用时间淘汰（见 disk_budget.py），被改写文件的旧帧随之清掉。
+
+返回的是缓存文件路径，调用方只读；需要移动/改写时先复制（FfmpegProcessor.extract_frame 已这样做）。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import subprocess
+import threading
+import time
+from typing import Callable, Iterable, Optional, Union
+
+import config
+from utility import ffmpeg_scheduler, media_probe
+from utility.disk_budget import DiskBudget
+from utility.render_cache import file_identity
+
+ffmpeg_path = "ffmpeg"
+
+# 尺寸档 → 长边像素上限（0 为原尺寸）
+FRAME_SIZES = {
+    "thumb": 320,
+    "preview": 960,
+    "full": 0,
+}
+# 抽帧/命名规则变更时 bump，旧缓存失效
+FRAME_CACHE_VERSION = 1
+# 末帧取在结尾前多少秒（-sseof 在极短视频上会失败，改用时长计算）
+LAST_FRAME_OFFSET_SEC = 0.15
+PREWARM_POSITIONS = ("first", "last")
+# 磁盘缓存上限（字节）；preview/thumb webp 每帧几十 KB，full 档几百 KB
+FRAME_CACHE_MAX_BYTES = 2 * 1024 ** 3
+# 等待别的线程抽同一帧的最长秒数；超时后自己抽
+INFLIGHT_WAIT_TIMEOUT_SEC = 20.0
+
+Position = Union[str, float, int]
+
+_lock = threading.Lock()
+# key → (完成事件, 抽取方的调度优先级)
+_inflight: dict[str, tuple[threading.Event, int]] = {}
+
+
+def cache_dir() -> str:
+    return os.path.join(config.MACHINE_CACHE_PATH, "frames")
+
+
+_budget = DiskBudget("frame", cache_dir, FRAME_CACHE_MAX_BYTES)
+
+
+def _position_tag(position: Position) -> str:
+    if position in ("first", "last"):
+        return str(position)
+    return f"t{float(position):.3f}"
+
+
+def _frame_key(video_path: str, position: Position, size: str) -> Optional[str]:
+    identity = file_identity(video_path)
+    if not identity:
+        return None
+    payload = f"{FRAME_CACHE_VERSION}|{identity}|{_position_tag(position)}|{size}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _frame_file(key: str) -> str:
+    return os.path.join(cache_dir(), key[:2], f"{key}.webp")
+
+
+def _scale_filter(long_side: int) -> str:
+    if not long_side:
+        return "null"
+    return (
+        f"scale='if(gte(iw,ih),min({long_side},iw),-2)':'if(gte(iw,ih),-2,min({long_side},ih))'"
+    )
+
+
+def _seek_seconds(video_path: str, position: Position) -> float:
+    if position == "first":
+        return 0.0
+    if position == "last":
+        duration = media_probe.format_duration(media_probe.get_probe_cache(None).probe(video_path))
+        if duration < 0.2:  # 视频极短，直接取第一帧
+            return 0.0
+        return max(0.0, duration - LAST_FRAME_OFFSET_SEC)
+    return max(0.0, float(position))
+
+
+def _extract(video_path: str, position: Position, targets: dict[str, str]) -> bool:
+    """一次 ffmpeg：``position`` 处的一帧按 ``targets``（尺寸档 → 输出路径）各缩放一份。"""
+    seek = _seek_seconds(video_path, position)
+    names = list(targets)
+    graph = f"[0:v]split={len(names)}" + "".join(f"[s{i}]" for i in range(len(names)))
+    graph += "".join(f";[s{i}]{_scale_filter(FRAME_SIZES[name])}[o{i}]" for i, name in enumerate(names))
+    cmd = [ffmpeg_path, "-y", "-v", "error"]
+    if seek > 0:
+        cmd.extend(["-ss", f"{seek:.3f}"])
+    cmd.extend(["-i", video_path, "-filter_complex", graph])
+    tmp_paths = {}
+    for i, name in enumerate(names):
+        tmp = f"{targets[name]}.{os.getpid()}.{threading.get_ident()}.tmp.webp"
+        tmp_paths[name] = tmp
+        cmd.extend([
+            "-map", f"[o{i}]", "-frames:v", "1",
+            "-c:v", "libwebp", "-compression_level", "4", "-q:v", "75",
+            tmp,
+        ])
+    for target in targets.values():
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        result = ffmpeg_scheduler.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="ignore")
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"❌ frame extract failed ({os.path.basename(video_path)} @ {position}): {e}")
+        return False
+    ok = result.returncode == 0
+    written = 0
+    for name, tmp in tmp_paths.items():
+        if ok and os.path.isfile(tmp) and os.path.getsize(tmp) > 0:
+            written += os.path.getsize(tmp)
+            os.replace(tmp, targets[name])
+        elif os.path.exists(tmp):
+            os.remove(tmp)
+    if written:
+        _budget.added(written)
+    if not ok:
+        print(f"❌ frame extract failed ({os.path.basename(video_path)} @ {position}): {(result.stderr or '').strip()[-300:]}")
+    return ok
+
+
+def cached_frame(video_path: str, position: Position = "first", size: str = "preview") -> Optional[str]:
+    """只查缓存，不抽帧；未命中返回 None。"""
+    key = _frame_key(video_path, position, size)
+    if not key:
+        return None
+    path = _frame_file(key)
+    if not os.path.isfile(path):
+        return None
+    _budget.touch(path)
+    return path
+
+
+def get_frame(video_path: str, position: Position = "first", size: str = "preview") -> Optional[str]:
+    """``position``：``"first"`` / ``"last"`` / 秒数；``size``：FRAME_SIZES 的键。返回缓存 webp 路径，失败 None。
+
+    未命中时该位置的所有尺寸档一并抽出。
+    """
+    if size not in FRAME_SIZES:
+        raise ValueError(f"unknown frame size {size!r}")
+    keys = {name: _frame_key(video_path, position, name) for name in FRAME_SIZES}
+    if not keys[size]:
+        return None
+    wanted = _frame_file(keys[size])
+    if os.path.isfile(wanted):
+        _budget.touch(wanted)
+        return wanted
+
+    lead_key = keys[size]
+    priority = ffmpeg_scheduler.get_scheduler().current_priority()
+    with _lock:
+        inflight = _inflight.get(lead_key)
+        # 正在抽的是更低优先级（批处理预热）时不等它：它可能还排在槽位队列里，交互方自己抽
+        owner = inflight is None or priority < inflight[1]
+        if owner:
+            event = threading.Event()
+            for key in keys.values():
+                if key not in _inflight or priority < _inflight[key][1]:
+                    _inflight[key] = (event, priority)
+    if not owner:
+        inflight[0].wait(INFLIGHT_WAIT_TIMEOUT_SEC)
+        if os.path.isfile(wanted):
+            return wanted
+        # 超时（或对方失败）：自己抽一次，不再登记 in-flight
+        if _extract(video_path, position, {size: wanted}) and os.path.isfile(wanted):
+            return wanted
+        return None
+
+    try:
+        targets = {name: _frame_file(key) for name, key in keys.items() if not os.path.isfile(_frame_file(key))}
+        if targets:
+            _extract(video_path, position, targets)
+    finally:
+        with _lock:
+            for key in keys.values():
+                if key in _inflight and _inflight[key][0] is event:
+                    del _inflight[key]
+        event.set()
+    return wanted if os.path.isfile(wanted) else None
+
+
+def get_frame_async(
+    video_path: str,
+    on_ready: Callable[[Optional[str]], None],
+    position: Position = "first",
+    size: str = "preview",
+) -> threading.Thread:
+    """在后台线程按交互优先级 ``get_frame``，完成后在该线程调用 ``on_ready(路径或 None)``。
+
+    GUI 在回调里用 ``after(0, ...)`` 回到 Tk 线程；Tk 线程本身不跑 ffmpeg、也不等别的抽帧任务。
+    """
+    def _run():
+        path = None
+        try:
+            with ffmpeg_scheduler.priority_scope(ffmpeg_scheduler.INTERACTIVE):
+                path = get_frame(video_path, position, size)
+        except Exception as e:
+            print(f"❌ frame extract failed ({os.path.basename(str(video_path))} @ {position}): {e}")
+        on_ready(path)
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    return thread
+
+
+def prewarm(video_paths: Iterable[str], positions: Iterable[Position] = PREWARM_POSITIONS) -> threading.Thread:
+    """后台线程依次抽取 ``video_paths`` 的 ``positions`` 帧（全部尺寸档）；已缓存的跳过。返回该线程。"""
+    paths = list(dict.fromkeys(p for p in video_paths if p and os.path.isfile(p)))
+    positions = list(positions)
+
+    def _run():
+        started = time.perf_counter()
+        extracted = 0
+        with ffmpeg_scheduler.priority_scope(ffmpeg_scheduler.BATCH):
+            for path in paths:
+                for position in positions:
+                    if all(cached_frame(path, position, name) for name in FRAME_SIZES):
+                        continue
+                    if get_frame(path, position, "preview"):
+                        extracted += 1
+        if extracted:
+            print(f"🖼️  frame cache prewarmed: {extracted} frames from {len(paths)} videos in {time.perf_counter() - started:.2f}s")
+
+    thread = threading.Thread(target=_run, daemon=True)
+    thread.start()
+    return thread
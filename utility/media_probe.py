@@ -0,0 +1,257 @@
+"""
+ffprobe 元数据缓存：每个文件只跑一次 ``ffprobe -show_streams -show_format``，缓存完整 JSON。
+附带 ``-show_data_hash``，各流含 ``extradata_hash``（SPS/PPS 等编码器私有头的摘要，流复制拼接前据此判断能否直接拼）。
+
+key 为 ``(abspath, size, mtime_ns)``：文件被改写后自动失效，无需调用方手动清理。
+每个项目一份磁盘存储（``{temp}/probe_cache/probe.json``），GUI 启动与 finalize_video 重复探测同一批素材时直接命中；
+FfmpegProcessor 与 FfmpegAudioProcessor 共用同一实例（见 ``get_probe_cache``）。
+``probe_many`` 用有界线程池并发探测一批文件（打开素材文件夹/审阅窗时预热缓存）。
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import config
+from utility import ffmpeg_scheduler
+
+ffprobe_path = "ffprobe"
+
+# 新探测条目累计到此数量或距上次落盘超过此秒数时写回磁盘；退出时也会写一次
+FLUSH_EVERY_ENTRIES = 32
+FLUSH_EVERY_SEC = 10.0
+# 磁盘格式变更时 bump，旧文件整体丢弃
+STORE_VERSION = 2
+# probe_many 并发 ffprobe 进程数上限（开销主要在进程启动与读文件头，不吃 CPU）
+PROBE_MANY_WORKERS = 8
+
+_caches: dict[str, "MediaProbeCache"] = {}
+_caches_lock = threading.Lock()
+
+
+def _stat_key(path: str):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+def run_ffprobe(path: str) -> Optional[dict]:
+    """不经缓存探测一次；失败（文件不存在/无法解析）返回 None。"""
+    try:
+        result = ffmpeg_scheduler.run(
+            [ffprobe_path, "-v", "error", "-show_data_hash", "SHA256", "-show_streams", "-show_format", "-of", "json", path],
+            check=True, capture_output=True, text=True, encoding="utf-8", errors="ignore",
+        )
+        data = json.loads(result.stdout or "{}")
+    except (subprocess.CalledProcessError, OSError, ValueError) as e:
+        print(f"ffprobe failed ({os.path.basename(path)}): {getattr(e, 'stderr', None) or e}")
+        return None
+    if not data.get("streams") and not data.get("format"):
+        return None
+    return {"streams": data.get("streams") or [], "format": data.get("format") or {}}
+
+
+class MediaProbeCache:
+    """单个项目的探测缓存（内存 + JSON 文件；``store_path=None`` 时仅内存）；线程安全。"""
+
+    def __init__(self, store_path: Optional[str]):
+        self.store_path = os.path.abspath(store_path) if store_path else None
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        # abspath → {"size", "mtime_ns", "info"}
+        self._entries: dict[str, dict] = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._load()
+
+    def _load(self) -> None:
+        if not self.store_path:
+            return
+        try:
+            with open(self.store_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == STORE_VERSION and isinstance(data.get("entries"), dict):
+            self._entries = data["entries"]
+
+    def probe(self, path: str) -> Optional[dict]:
+        """返回 ``{"streams": [...], "format": {...}}``；文件不存在或 ffprobe 失败返回 None（不缓存失败）。"""
+        if not path:
+            return None
+        abs_path = os.path.abspath(path)
+        key = _stat_key(abs_path)
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(abs_path)
+        if entry and (entry["size"], entry["mtime_ns"]) == key:
+            return entry["info"]
+
+        info = run_ffprobe(abs_path)
+        if info is None:
+            return None
+        with self._lock:
+            self._entries[abs_path] = {"size": key[0], "mtime_ns": key[1], "info": info}
+            self._pending += 1
+            due = self._pending >= FLUSH_EVERY_ENTRIES or time.monotonic() - self._last_flush >= FLUSH_EVERY_SEC
+        if due:
+            self.flush()
+        return info
+
+    def invalidate(self, path: str) -> None:
+        if not path:
+            return
+        with self._lock:
+            self._entries.pop(os.path.abspath(path), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._pending += 1
+
+    def flush(self) -> None:
+        """写回磁盘；顺带丢弃已删除/已改写文件的条目（temp 文件用完即删，避免存储无限增长）。"""
+        if not self.store_path:
+            return
+        with self._lock:
+            if not self._pending:
+                return
+            for abs_path, entry in list(self._entries.items()):
+                if _stat_key(abs_path) != (entry["size"], entry["mtime_ns"]):
+                    del self._entries[abs_path]
+            payload = {"version": STORE_VERSION, "entries": dict(self._entries)}
+            self._pending = 0
+            self._last_flush = time.monotonic()
+        tmp_path = f"{self.store_path}.{os.getpid()}.tmp"
+        with self._write_lock:
+            try:
+                os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(payload, f, ensure_ascii=False)
+                os.replace(tmp_path, self.store_path)
+            except OSError as e:
+                print(f"⚠️ probe cache flush failed: {e}")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+
+def get_probe_cache(pid: Optional[str]) -> MediaProbeCache:
+    """项目 ``pid`` 的共享探测缓存（同一进程内视频/音频处理器共用）；无 pid 时为进程内存缓存。"""
+    store_path = os.path.join(config.get_temp_path(pid), "probe_cache", "probe.json") if pid else ""
+    with _caches_lock:
+        cache = _caches.get(store_path)
+        if cache is None:
+            cache = MediaProbeCache(store_path or None)
+            _caches[store_path] = cache
+        return cache
+
+
+def invalidate(path: str) -> None:
+    """从所有项目缓存中移除 ``path``（文件被原地改写且 size/mtime 可能不变时使用）。"""
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.invalidate(path)
+
+
+def clear_all() -> None:
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.clear()
+
+
+@atexit.register
+def flush_all() -> None:
+    with _caches_lock:
+        caches = list(_caches.values())
+    for cache in caches:
+        cache.flush()
+
+
+def probe_many(paths: Iterable[str], pid: Optional[str] = None, max_workers: Optional[int] = None) -> dict:
+    """并发探测一批文件并写入缓存；返回 ``{path: summarize(...) 或 None}``（键为传入路径，去重保序）。"""
+    cache = get_probe_cache(pid)
+    unique = list(dict.fromkeys(p for p in paths if p))
+    if not unique:
+        return {}
+    started = time.perf_counter()
+    workers = max(1, min(int(max_workers or PROBE_MANY_WORKERS), len(unique)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        infos = list(pool.map(cache.probe, unique))
+    cache.flush()
+    if len(unique) > 1:
+        print(f"🔎 probed {len(unique)} files in {time.perf_counter() - started:.2f}s ({workers} workers)")
+    return {p: summarize(info) for p, info in zip(unique, infos)}
+
+
+# ---- 字段读取 ----
+
+def first_stream(info: Optional[dict], codec_type: str) -> Optional[dict]:
+    """首个 ``codec_type``（"video" / "audio"）流；无则 None。"""
+    if not info:
+        return None
+    return next((st for st in info["streams"] if st.get("codec_type") == codec_type), None)
+
+
+def _positive_float(value) -> float:
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return v if v > 0 else 0.0
+
+
+def format_duration(info: Optional[dict]) -> float:
+    return _positive_float((info or {}).get("format", {}).get("duration"))
+
+
+def stream_duration(info: Optional[dict], codec_type: str) -> float:
+    st = first_stream(info, codec_type)
+    return _positive_float(st.get("duration")) if st else 0.0
+
+
+def parse_rate(rate) -> float:
+    """``"30000/1001"`` / ``"25"`` → float；无法解析返回 0.0。"""
+    rate = str(rate or "").strip()
+    try:
+        if "/" in rate:
+            num, den = rate.split("/", 1)
+            return float(num) / float(den) if float(den) != 0 else 0.0
+        return float(rate) if rate else 0.0
+    except ValueError:
+        return 0.0
+
+
+def summarize(info: Optional[dict]) -> Optional[dict]:
+    """常用字段：时长（format/视频流/音频流）、宽高、帧率、帧数（容器未记录时为 0）与是否有音轨。"""
+    if not info:
+        return None
+    video = first_stream(info, "video")
+    audio = first_stream(info, "audio")
+    fps = 0.0
+    if video:
+        fps = parse_rate(video.get("avg_frame_rate")) or parse_rate(video.get("r_frame_rate"))
+    try:
+        frame_count = int(video.get("nb_frames") or 0) if video else 0
+    except (TypeError, ValueError):
+        frame_count = 0
+    return {
+        "duration": format_duration(info),
+        "video_duration": stream_duration(info, "video"),
+        "audio_duration": stream_duration(info, "audio"),
+        "width": int(video["width"]) if video and video.get("width") is not None else None,
+        "height": int(video["height"]) if video and video.get("height") is not None else None,
+        "fps": fps,
+        "frame_count": frame_count,
+        "has_audio": audio is not None,
+    }
@@ -6,6 +6,8 @@ import hashlib
 import re
 import time
 from .ffmpeg_audio_processor import FfmpegAudioProcessor
+from . import tts_cache
+from .file_util import safe_copy_overwrite
 import config
 import base64
 import binascii
@@ -79,6 +81,12 @@ class MinimaxSpeechService:
             return audio_path
         # Clean and validate SSML
         ssml_text = ssml_text.strip()
+
+        # 跨项目 TTS 缓存：key 为音色/模型/音频参数 + 文本
+        cache_voice, cache_text = self._tts_cache_params(ssml_text)
+        cached = tts_cache.lookup("minimax", cache_voice, cache_text)
+        if cached and safe_copy_overwrite(cached, audio_path):
+            return audio_path
         
         # Debug: Print SSML being sent
         print(f"Sending SSML: {ssml_text}")
@@ -103,6 +111,7 @@ class MinimaxSpeechService:
                 # 保存为MP3文件
                 with open(audio_path, 'wb') as f:
                     f.write(audio_binary)
+                tts_cache.store("minimax", cache_voice, cache_text, audio_path)
                 
                 return audio_path
             else:
@@ -119,6 +128,17 @@ class MinimaxSpeechService:
             return None
 
 
+    def _tts_cache_params(self, ssml_text: str):
+        """create_ssml 的 JSON → (影响合成结果的参数, 文本)，供 tts_cache；解析失败时整段作为文本。"""
+        try:
+            payload = json.loads(ssml_text)
+        except json.JSONDecodeError:
+            return "", ssml_text
+        text = payload.pop("text", "")
+        payload.pop("stream", None)
+        return payload, text
+
+
     def string_to_code(self, input_string):
         # Generate MD5 hash of the input string
         input_string = str(input_string)  # Ensure it's a string
@@ -0,0 +1,264 @@
+"""
+竖版封面拼图（2/3 张横屏图纵向拼接）的合成引擎：按需降分辨率解码、先裁后缩放、缓存解码图与单层结果。
+
+与原先「整图解码 → LANCZOS 放大到覆盖 stage → 裁切」相比：
+- JPEG 用 ``Image.draft`` 在解码阶段按 1/2、1/4、1/8 缩小（4K 图源做 1152×648 条带时只解码约 1/2 像素）；
+- 用 ``Image.resize(size, box=...)`` 直接从源图的对应区域重采样到目标尺寸，不再分配放大后的整幅中间图；
+- 裁底 ``bottom_trim_px`` 也并入同一个 box，一次得到最终的层；
+- 解码图按 (文件身份, 解码尺寸) 缓存，单层按 (文件身份, 条带尺寸, 裁底, 填充色, 偏移) 缓存，两者都按像素总量做 LRU 限额；
+  GUI 裁切预览按方向键逐像素平移时只重做 box 重采样，不再重复解码；
+- ``compose_many`` 一次解码生成多种偏移/对齐的封面变体，复用同一块画布缓冲。
+
+``get_composer()`` 返回进程内共享实例（FfmpegProcessor 的 prep_mosaic_source_layer / compose_* 与 GUI 预览共用）。
+返回的层图像会被缓存复用，调用方只读（crop/resize/paste 到别处），不要原地修改。
+"""
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from PIL import Image
+
+# 缓存限额（像素数；RGB 每像素 3 字节、RGBA 4 字节）
+DECODED_CACHE_MAX_PIXELS = 48_000_000
+LAYER_CACHE_MAX_PIXELS = 24_000_000
+
+
+def _file_key(path: str):
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+class _PixelLRU:
+    """按图像像素总量限额的 LRU（线程安全）。"""
+
+    def __init__(self, max_pixels: int):
+        self.max_pixels = int(max_pixels)
+        self._items: OrderedDict = OrderedDict()
+        self._pixels = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            img = self._items.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img) -> None:
+        pixels = img.width * img.height
+        if pixels > self.max_pixels:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._pixels -= old.width * old.height
+            self._items[key] = img
+            self._pixels += pixels
+            while self._pixels > self.max_pixels and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._pixels -= evicted.width * evicted.height
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._pixels = 0
+
+
+def cover_geometry(w0: int, h0: int, tw: int, sh: int, shift_x: int = 0):
+    """cover 缩放到覆盖 ``tw×sh`` 后的尺寸 ``(nw, nh)`` 与裁切左上角 ``(left, top)``（缩放后坐标，left 已按 shift_x 夹紧）。"""
+    scale = max(tw / w0, sh / h0)
+    nw = max(1, int(round(w0 * scale)))
+    nh = max(1, int(round(h0 * scale)))
+    left = (nw - tw) // 2 + int(shift_x)
+    left = max(0, min(left, max(0, nw - tw)))
+    top = (nh - sh) // 2
+    return nw, nh, left, top
+
+
+class MosaicComposer:
+    def __init__(self, decoded_max_pixels: int = DECODED_CACHE_MAX_PIXELS, layer_max_pixels: int = LAYER_CACHE_MAX_PIXELS):
+        self._decoded = _PixelLRU(decoded_max_pixels)
+        self._layers = _PixelLRU(layer_max_pixels)
+
+    # ---- 解码 ----
+
+    def source_size(self, src_path: str) -> tuple[int, int]:
+        """原始像素尺寸（只读文件头）。"""
+        with Image.open(src_path) as im:
+            return im.size
+
+    def _decode(self, src_path: str, min_w: int, min_h: int):
+        """解码到不小于 ``min_w×min_h`` 的尺寸（JPEG 走 draft 缩小解码）；返回 ``(image, 原始宽, 原始高)``。"""
+        fkey = _file_key(src_path)
+        with Image.open(src_path) as probe:
+            w0, h0 = probe.size
+            fmt = probe.format
+        req = (min(w0, max(1, min_w)), min(h0, max(1, min_h))) if fmt == "JPEG" else (w0, h0)
+        key = (fkey, req)
+        img = self._decoded.get(key)
+        if img is not None:
+            return img, w0, h0
+        img = Image.open(src_path)
+        try:
+            img.seek(0)
+        except EOFError:
+            pass
+        if fmt == "JPEG":
+            img.draft("RGB", req)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA") if img.mode == "LA" else img.convert("RGB")
+        else:
+            img.load()
+        self._decoded.put(key, img)
+        return img, w0, h0
+
+    # ---- 单层 ----
+
+    def source_layer(
+        self,
+        src_path: str,
+        tw: int,
+        sh: int,
+        bottom_trim_px: int,
+        *,
+        fill_rgb: tuple[int, int, int] = (255, 255, 255),
+        shift_x: int = 0,
+    ):
+        """单张横屏图源 → cover 覆盖 ``tw×sh``、水平偏移 ``shift_x``、裁底后的 RGB 层（``tw × (sh - bottom_trim_px)``）。"""
+        tw, sh = int(tw), int(sh)
+        h_trimmed = sh - int(bottom_trim_px)
+        if h_trimmed <= 0:
+            raise ValueError("bottom_trim_px 过大，裁剪后高度无效")
+        fill = tuple(fill_rgb)
+        key = (_file_key(src_path), tw, sh, int(bottom_trim_px), fill, int(shift_x))
+        layer = self._layers.get(key)
+        if layer is not None:
+            return layer
+
+        w0, h0 = self.source_size(src_path)
+        nw, nh, left, top = cover_geometry(w0, h0, tw, sh, shift_x)
+        img, _, _ = self._decode(src_path, nw, nh)
+        # 缩放后坐标 → 解码图坐标（draft 可能已按 1/2^k 缩小）
+        fx, fy = img.width / nw, img.height / nh
+        box = (left * fx, top * fy, (left + tw) * fx, (top + h_trimmed) * fy)
+        layer = img.resize((tw, h_trimmed), Image.Resampling.LANCZOS, box=box)
+        if layer.mode == "RGBA":
+            bg = Image.new("RGB", layer.size, fill)
+            bg.paste(layer, mask=layer.split()[3])
+            layer = bg
+        self._layers.put(key, layer)
+        return layer
+
+    # ---- 合成 ----
+
+    def _compose_into(self, canvas, stripe, layers, out_w, h_trimmed, vertical_align, vertical_gap_top_fraction, fill):
+        stripe.paste(fill, (0, 0, stripe.width, stripe.height))
+        for i, lay in enumerate(layers):
+            stripe.paste(lay, (0, i * h_trimmed))
+        canvas.paste(fill, (0, 0, canvas.width, canvas.height))
+        out_h = canvas.height
+        if stripe.height > out_h:
+            if vertical_align == "top":
+                canvas.paste(stripe.crop((0, 0, out_w, out_h)), (0, 0))
+            else:
+                cut = (stripe.height - out_h) // 2
+                canvas.paste(stripe.crop((0, cut, out_w, cut + out_h)), (0, 0))
+        elif vertical_align == "top":
+            canvas.paste(stripe, (0, 0))
+        else:
+            gap = out_h - stripe.height
+            if vertical_gap_top_fraction is not None:
+                frac = max(0.0, min(1.0, float(vertical_gap_top_fraction)))
+                y0 = int(round(gap * frac))
+            else:
+                y0 = gap // 2
+            canvas.paste(stripe, (0, y0))
+
+    def compose_many(
+        self,
+        paths: Sequence[str],
+        out_size: tuple[int, int],
+        variants: Sequence[dict],
+        *,
+        stage_w: int,
+        stage_h: int,
+        bottom_trim_px: int,
+        fill_rgb: tuple[int, int, int] = (255, 255, 255),
+        on_image=None,
+    ) -> list:
+        """按 ``variants`` 批量生成封面。每个 variant 可含 ``vertical_align`` / ``vertical_gap_top_fraction`` /
+        ``horizontal_crop_shifts`` / ``viewport_crop_shifts``。
+
+        所有变体共用同一次解码与同一块画布缓冲；给出 ``on_image(index, canvas)`` 时逐个回调（回调内保存，画布随后被复用），
+        返回空列表；否则返回各变体画布的副本。
+        """
+        n = len(paths)
+        if n not in (2, 3):
+            raise ValueError("compose_landscape_vertical_mosaic_webp 仅支持 2 或 3 张图")
+        tw, sh = int(stage_w), int(stage_h)
+        h_trimmed = sh - int(bottom_trim_px)
+        if h_trimmed <= 0:
+            raise ValueError("bottom_trim_px 过大，裁剪后高度无效")
+        out_w, out_h = int(out_size[0]), int(out_size[1])
+        fill = tuple(fill_rgb)
+
+        canvas = Image.new("RGB", (out_w, out_h), fill)
+        stripe = Image.new("RGB", (out_w, h_trimmed * n), fill)
+        results = []
+        for index, variant in enumerate(variants):
+            vertical_a = str(variant.get("vertical_align", "center")).strip().lower()
+            if vertical_a not in ("center", "top"):
+                raise ValueError("vertical_align 须为 center 或 top")
+            hsh = list(variant.get("horizontal_crop_shifts") or [0] * n)
+            vsh = list(variant.get("viewport_crop_shifts") or [0] * n)
+            if len(hsh) != n:
+                raise ValueError(f"horizontal_crop_shifts 长度须为 {n}（当前 {len(hsh)}）")
+            if len(vsh) != n:
+                raise ValueError(f"viewport_crop_shifts 长度须为 {n}（当前 {len(vsh)}）")
+
+            layers = []
+            for i, p in enumerate(paths):
+                lay = self.source_layer(p, tw, sh, bottom_trim_px, fill_rgb=fill, shift_x=hsh[i])
+                ttw, tth = lay.size
+                if ttw < out_w:
+                    raise ValueError(f"条带宽 {ttw} 小于画布宽 {out_w}")
+                x0 = (ttw - out_w) // 2 + int(vsh[i])
+                x0 = max(0, min(x0, ttw - out_w))
+                layers.append(lay.crop((x0, 0, x0 + out_w, tth)) if ttw != out_w else lay)
+
+            self._compose_into(canvas, stripe, layers, out_w, h_trimmed, vertical_a, variant.get("vertical_gap_top_fraction"), fill)
+            if on_image is not None:
+                on_image(index, canvas)
+            else:
+                results.append(canvas.copy())
+        return results
+
+    def clear(self) -> None:
+        self._decoded.clear()
+        self._layers.clear()
+
+    def stats(self) -> dict:
+        return {
+            "decoded": {"hits": self._decoded.hits, "misses": self._decoded.misses, "pixels": self._decoded._pixels},
+            "layers": {"hits": self._layers.hits, "misses": self._layers.misses, "pixels": self._layers._pixels},
+        }
+
+
+_composer: Optional[MosaicComposer] = None
+_composer_lock = threading.Lock()
+
+
+def get_composer() -> MosaicComposer:
+    global _composer
+    with _composer_lock:
+        if _composer is None:
+            _composer = MosaicComposer()
+        return _composer
@@ -0,0 +1,99 @@
+"""
+可组合的图层叠加阶段：把若干张透明 PNG/WebP（标题/字幕精灵图、水印、角标）拼进同一张 filter_complex，
+随所在的那一次编码一起完成，不再为每个叠加层单独解码 + 编码整段视频。
+
+用法（调用方负责主视频输入与编码参数）::
+
+    layers = [OverlayLayer(path=sprite, x="(W-w)/2", y="H-h-96", start=1.0, end=4.0, fade=0.2)]
+    cmd += overlay_stage.input_args(layers)               # 追加在主视频输入之后
+    filters += overlay_stage.filter_chain(layers, "0:v", first_input=1, out_label="vout", fps=60)
+
+- ``x`` / ``y`` 为 overlay 表达式（``W``/``H`` 主画面宽高，``w``/``h`` 叠加层宽高）；
+- 有 ``end`` 或 ``fade`` 的层：单帧只解码一次，用 ``loop`` 滤镜按帧率复制到 ``end``（不超过 ``end``，
+  以免叠加层比主画面长、overlay 把主画面末帧拖长），再做 alpha 淡入淡出，结束后 ``eof_action=pass`` 透出底图；
+  静态层（水印等）只有一帧，``eof_action=repeat`` 一直保持；
+- ``scale`` 为叠加层自身的缩放滤镜（如 ``scale=240:-1``），缩放前后都强制 rgba，避免透明区变成实色块。
+"""
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+
+@dataclass
+class OverlayLayer:
+    path: str
+    x: str = "0"
+    y: str = "0"
+    start: Optional[float] = None
+    end: Optional[float] = None
+    fade: float = 0.0
+    scale: str = ""
+
+    @property
+    def timed(self) -> bool:
+        return self.end is not None or self.fade > 0
+
+
+def input_args(layers: Sequence[OverlayLayer]) -> list[str]:
+    """每层一个单帧图片输入，按 ``layers`` 顺序排在主视频输入之后。"""
+    args = []
+    for layer in layers:
+        args.extend(["-i", str(layer.path)])
+    return args
+
+
+def _layer_source(layer: OverlayLayer, input_index: int, label: str, fps: int) -> str:
+    parts = ["format=rgba"]
+    if layer.scale:
+        parts.extend([layer.scale, "format=rgba"])
+    if layer.timed:
+        start = max(0.0, float(layer.start or 0.0))
+        end = float(layer.end) if layer.end is not None else None
+        if end is not None:
+            frames = max(1, int(math.floor(end * fps)))
+            parts.append(f"loop=loop={frames - 1}:size=1:start=0")
+        else:
+            # 只有淡入、没有结束时间：淡入结束后停在最后一帧（eof_action=repeat）
+            frames = max(1, int(math.ceil((start + layer.fade) * fps)))
+            parts.append(f"loop=loop={frames - 1}:size=1:start=0")
+        # 单帧图片输入的时基是 image2 的 1/25；先换成 1/fps，setpts 才不会被取整成重复时间戳
+        parts.append(f"settb=1/{fps}")
+        parts.append(f"setpts=N/{fps}/TB")
+        if layer.fade > 0:
+            parts.append(f"fade=t=in:st={start:.6f}:d={layer.fade:.6f}:alpha=1")
+            if end is not None:
+                parts.append(f"fade=t=out:st={max(start, end - layer.fade):.6f}:d={layer.fade:.6f}:alpha=1")
+    return f"[{input_index}:v]" + ",".join(parts) + f"[{label}]"
+
+
+def filter_chain(
+    layers: Sequence[OverlayLayer],
+    base_label: str,
+    first_input: int,
+    out_label: str,
+    fps: int,
+    label_prefix: str = "ol",
+) -> list[str]:
+    """``[base_label]`` 依次叠加 ``layers``（输入序号从 ``first_input`` 起），输出 ``[out_label]``。无图层时 null 透传。"""
+    if not layers:
+        return [f"[{base_label}]null[{out_label}]"]
+    filters = []
+    cur = base_label
+    for i, layer in enumerate(layers):
+        src = f"{label_prefix}{i}"
+        filters.append(_layer_source(layer, first_input + i, src, fps))
+        nxt = out_label if i == len(layers) - 1 else f"{label_prefix}b{i}"
+        opts = [f"x={layer.x}", f"y={layer.y}"]
+        start = max(0.0, float(layer.start or 0.0))
+        if layer.end is not None:
+            opts.append(f"enable='between(t,{start:.6f},{float(layer.end):.6f})'")
+            opts.append("eof_action=pass")
+        else:
+            if start > 0:
+                opts.append(f"enable='gte(t,{start:.6f})'")
+            opts.append("eof_action=repeat")
+        filters.append(f"[{cur}][{src}]overlay=" + ":".join(opts) + f"[{nxt}]")
+        cur = nxt
+    return filters
@@ -0,0 +1,390 @@
+"""
+FfmpegProcessor 渲染基准：离线合成测试素材，逐项运行主要渲染操作，记录耗时/CPU/峰值内存/产物大小到 JSON 历史，并可对比两次运行。
+
+素材全部由 ffmpeg lavfi 生成（``testsrc2`` 画面 + ``sine`` 音轨，静态图用单帧 testsrc2），不依赖网络与 GPU；
+分辨率两档：``landscape`` 1920×1080、``portrait`` 1080×1920。每个操作在独立子进程里执行（``_worker``），
+父进程用 ``os.wait4`` 取该子进程及其 ffmpeg 子孙的 CPU 时间与峰值 RSS，互不污染。渲染缓存对基准关闭。
+
+用法::
+
+    python -m utility.render_benchmark run --label before-xfade-change
+    python -m utility.render_benchmark run --ops concat_transitions title --sizes portrait --repeat 3
+    python -m utility.render_benchmark list
+    python -m utility.render_benchmark compare            # 最近两次
+    python -m utility.render_benchmark compare 20261018-101500 latest
+
+历史文件默认 ``config.MACHINE_CACHE_PATH/benchmark/render_history.json``（``--history`` 可改）。
+对比时同时显示两次运行的编码档位（见 utility/ffmpeg_capabilities.py），档位不同的结果不宜直接比较。
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from typing import List, Optional
+
+import config
+
+# 基准项目 pid：临时文件落在 PROJECT_DATA_PATH/<pid>/temp，跑完清理
+BENCHMARK_PID = "__render_benchmark"
+SIZES = {
+    "landscape": (1920, 1080),
+    "portrait": (1080, 1920),
+}
+# 合成素材：每段时长（秒）与段数
+CLIP_SECONDS = 4.0
+CLIP_COUNT = 4
+# 单个操作子进程超时（秒）
+OP_TIMEOUT_SEC = 1800
+# compare 时相对变化超过此比例才标记 ▲/▼
+COMPARE_NOISE_RATIO = 0.05
+
+
+def _default_history_path() -> str:
+    return os.path.join(config.MACHINE_CACHE_PATH, "benchmark", "render_history.json")
+
+
+def _fixtures_dir() -> str:
+    return os.path.join(config.MACHINE_CACHE_PATH, "benchmark", "fixtures")
+
+
+# ---- 素材 ----
+
+def _synthesize_clip(path: str, width: int, height: int, seconds: float, freq: int) -> None:
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency={freq}:sample_rate=44100:duration={seconds}",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-ac", "2", "-shortest", path,
+    ], check=True)
+
+
+def _synthesize_image(path: str, width: int, height: int) -> None:
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}", "-frames:v", "1", path,
+    ], check=True)
+
+
+def ensure_fixtures(size: str) -> dict:
+    """生成（或复用）某个尺寸档的测试素材，返回 ``{"clips": [...], "images": [...]}``。"""
+    width, height = SIZES[size]
+    folder = os.path.join(_fixtures_dir(), f"{size}_{width}x{height}")
+    os.makedirs(folder, exist_ok=True)
+    clips = []
+    for i in range(CLIP_COUNT):
+        path = os.path.join(folder, f"clip_{i}_{CLIP_SECONDS:g}s.mp4")
+        if not os.path.isfile(path):
+            _synthesize_clip(path, width, height, CLIP_SECONDS, 220 * (i + 1))
+        clips.append(path)
+    images = []
+    for i in range(3):
+        # 拼图素材固定为横屏图（mosaic 的输入语义）
+        path = os.path.join(folder, f"still_{i}.png")
+        if not os.path.isfile(path):
+            _synthesize_image(path, 1920, 1080)
+        images.append(path)
+    return {"clips": clips, "images": images}
+
+
+# ---- 操作 ----
+
+def _op_concat_transitions(fp, fx, args):
+    return fp.concat_videos_with_transitions([{"path": p} for p in fx["clips"]], keep_audio_if_has=True)
+
+
+def _op_concat_transitions_legacy(fp, fx, args):
+    segments = [{"path": p, "transition": "fade", "duration": 1.0} for p in fx["clips"]]
+    return fp._concat_videos_with_transitions(segments, frames_deduct=5.95, keep_audio_if_has=True)
+
+
+def _op_title(fp, fx, args):
+    font = {"name": "benchmark", "path": args.font} if args.font else fp.font_title
+    return fp.add_title_to_video(fx["clips"][0], "Benchmark 渲染基准_第二行", font, 72)
+
+
+def _op_picture_in_picture(fp, fx, args):
+    return fp.add_picture_in_picture(fx["clips"][0], fx["clips"][1], start_time=0.5, ratio=0.333, transition_duration=1.0)
+
+
+def _op_mosaic_dual(fp, fx, args):
+    return fp.compose_dual_landscape_vertical_mosaic_webp(fx["images"][0], fx["images"][1])
+
+
+def _op_mosaic_triple(fp, fx, args):
+    return fp.compose_triple_landscape_vertical_mosaic_webp(*fx["images"][:3])
+
+
+# 名称 → (函数, 适用尺寸档)；拼图只对竖版画布有意义
+OPERATIONS = {
+    "concat_transitions": (_op_concat_transitions, ("landscape", "portrait")),
+    "concat_transitions_legacy": (_op_concat_transitions_legacy, ("landscape", "portrait")),
+    "title": (_op_title, ("landscape", "portrait")),
+    "picture_in_picture": (_op_picture_in_picture, ("landscape", "portrait")),
+    "mosaic_dual": (_op_mosaic_dual, ("portrait",)),
+    "mosaic_triple": (_op_mosaic_triple, ("portrait",)),
+}
+
+
+def _worker(args) -> int:
+    """子进程：执行单个操作，最后一行 stdout 输出 JSON 结果。"""
+    from utility.ffmpeg_processor import FfmpegProcessor
+
+    width, height = SIZES[args.size]
+    fixtures = ensure_fixtures(args.size)
+    fp = FfmpegProcessor(BENCHMARK_PID, "zh", width, height)
+    fp.render_cache_enabled = False
+    func = OPERATIONS[args.op][0]
+    result = {"ok": False, "output_bytes": 0, "error": None}
+    started = time.perf_counter()
+    try:
+        output = func(fp, fixtures, args)
+        if output and os.path.isfile(output):
+            result["output_bytes"] = os.path.getsize(output)
+            result["ok"] = True
+        else:
+            result["error"] = f"no output ({output!r})"
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["inner_wall_sec"] = round(time.perf_counter() - started, 3)
+    print("\n" + json.dumps(result, ensure_ascii=False))
+    return 0
+
+
+def _run_op_subprocess(op: str, size: str, args) -> dict:
+    """启动 ``_worker`` 子进程并收集 wall/CPU/峰值 RSS（Linux 上 ru_maxrss 单位为 KB）。"""
+    cmd = [sys.executable, "-m", "utility.render_benchmark", "_worker", "--op", op, "--size", size]
+    if args.font:
+        cmd.extend(["--font", args.font])
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, encoding="utf-8", errors="ignore",
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    killer = threading.Timer(OP_TIMEOUT_SEC, proc.kill)
+    killer.start()
+    try:
+        output = proc.stdout.read()
+        usage = None
+        if hasattr(os, "wait4"):
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+        else:
+            proc.wait()
+    finally:
+        killer.cancel()
+    wall = time.perf_counter() - started
+
+    lines = [ln for ln in (output or "").splitlines() if ln.strip()]
+    try:
+        result = json.loads(lines[-1]) if lines else {}
+    except ValueError:
+        result = {}
+    if not result:
+        result = {"ok": False, "output_bytes": 0, "error": f"worker exited {proc.returncode}: {' | '.join(lines[-5:])}"}
+    if args.verbose:
+        print("\n".join(lines[:-1]))
+    result["wall_sec"] = round(wall, 3)
+    if usage is not None:
+        result["cpu_sec"] = round(usage.ru_utime + usage.ru_stime, 3)
+        result["peak_rss_mb"] = round(usage.ru_maxrss / 1024, 1)
+    return result
+
+
+# ---- 历史 ----
+
+def load_history(path: str) -> list:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return []
+    return data if isinstance(data, list) else []
+
+
+def _save_history(path: str, runs: list) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(runs, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        )
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+
+def _median_result(samples: list) -> dict:
+    ok = [s for s in samples if s.get("ok")]
+    if not ok:
+        return samples[-1]
+    merged = dict(ok[-1])
+    for key in ("wall_sec", "cpu_sec", "peak_rss_mb", "inner_wall_sec"):
+        values = [s[key] for s in ok if key in s]
+        if values:
+            merged[key] = round(statistics.median(values), 3)
+    merged["samples"] = len(ok)
+    return merged
+
+
+def run_suite(args) -> dict:
+    from utility import ffmpeg_capabilities
+
+    ops = args.ops or list(OPERATIONS)
+    sizes = args.sizes or list(SIZES)
+    for size in sizes:
+        ensure_fixtures(size)
+    run = {
+        "id": time.strftime("%Y%m%d-%H%M%S"),
+        "label": args.label,
+        "git": _git_revision(),
+        "host": platform.node(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "encoder": ffmpeg_capabilities.encoder_profile(),
+        "repeat": args.repeat,
+        "results": [],
+    }
+    try:
+        for op in ops:
+            for size in sizes:
+                if size not in OPERATIONS[op][1]:
+                    continue
+                samples = [_run_op_subprocess(op, size, args) for _ in range(max(1, args.repeat))]
+                result = {"op": op, "size": size, **_median_result(samples)}
+                run["results"].append(result)
+                _print_result(result)
+    finally:
+        shutil.rmtree(config.get_temp_path(BENCHMARK_PID), ignore_errors=True)
+    history = load_history(args.history)
+    history.append(run)
+    _save_history(args.history, history)
+    print(f"📊 benchmark run {run['id']} saved to {args.history}")
+    return run
+
+
+def _print_result(r: dict) -> None:
+    if not r.get("ok"):
+        print(f"❌ {r['op']:<26} {r['size']:<9} {r.get('error')}")
+        return
+    print(
+        f"⏱️  {r['op']:<26} {r['size']:<9} wall {r['wall_sec']:7.2f}s  cpu {r.get('cpu_sec', 0):7.2f}s  "
+        f"rss {r.get('peak_rss_mb', 0):7.1f}MB  out {r['output_bytes'] / 1_048_576:7.2f}MB"
+    )
+
+
+def _find_run(history: list, ref: str) -> dict:
+    if ref in ("latest", "previous"):
+        idx = -1 if ref == "latest" else -2
+        if len(history) < -idx:
+            raise SystemExit(f"history has only {len(history)} run(s)")
+        return history[idx]
+    for run in reversed(history):
+        if run["id"] == ref or run.get("label") == ref:
+            return run
+    raise SystemExit(f"run not found: {ref}")
+
+
+def compare_runs(base: dict, new: dict) -> list:
+    """按 (op, size) 对齐两次运行，返回每项的指标与相对变化（new/base - 1）。"""
+    base_map = {(r["op"], r["size"]): r for r in base["results"]}
+    rows = []
+    for r in new["results"]:
+        b = base_map.get((r["op"], r["size"]))
+        if not b or not b.get("ok") or not r.get("ok"):
+            continue
+        row = {"op": r["op"], "size": r["size"]}
+        for key in ("wall_sec", "cpu_sec", "peak_rss_mb", "output_bytes"):
+            if key in r and key in b:
+                row[key] = (b[key], r[key], (r[key] / b[key] - 1.0) if b[key] else 0.0)
+        rows.append(row)
+    return rows
+
+
+def _print_comparison(base: dict, new: dict) -> None:
+    print(f"base: {base['id']} {base.get('label') or ''} git={base.get('git')} encoder={base.get('encoder', {}).get('codec')}/{base.get('encoder', {}).get('preset')}")
+    print(f"new : {new['id']} {new.get('label') or ''} git={new.get('git')} encoder={new.get('encoder', {}).get('codec')}/{new.get('encoder', {}).get('preset')}")
+    if base.get("encoder") != new.get("encoder"):
+        print("⚠️  encoder profiles differ; timings are not directly comparable")
+
+    def cell(value):
+        b, n, ratio = value
+        mark = "▲" if ratio > COMPARE_NOISE_RATIO else "▼" if ratio < -COMPARE_NOISE_RATIO else " "
+        return f"{b:>9.2f} → {n:>9.2f} {mark}{ratio * 100:+6.1f}%"
+
+    for row in compare_runs(base, new):
+        parts = [f"{row['op']:<26} {row['size']:<9}"]
+        for key, name in (("wall_sec", "wall"), ("cpu_sec", "cpu"), ("peak_rss_mb", "rss")):
+            if key in row:
+                parts.append(f"{name} {cell(row[key])}")
+        if "output_bytes" in row:
+            b, n, ratio = row["output_bytes"]
+            parts.append(f"size {ratio * 100:+6.1f}%")
+        print("  ".join(parts))
+
+
+def _parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description="FfmpegProcessor 渲染基准（离线、CPU 可跑）")
+    p.add_argument("--history", default=None, help="JSON 历史文件路径")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="运行基准并追加到历史")
+    run.add_argument("--ops", nargs="+", choices=list(OPERATIONS), help="只跑指定操作（默认全部）")
+    run.add_argument("--sizes", nargs="+", choices=list(SIZES), help="只跑指定尺寸档（默认全部）")
+    run.add_argument("--repeat", type=int, default=1, help="每项重复次数，取中位数")
+    run.add_argument("--label", default=None, help="本次运行的备注（可用于 compare）")
+    run.add_argument("--font", default=None, help="title 操作使用的字体文件（默认处理器标题字体）")
+    run.add_argument("-v", "--verbose", action="store_true", help="打印子进程日志")
+
+    cmp_ = sub.add_parser("compare", help="对比两次运行（默认 previous → latest）")
+    cmp_.add_argument("base", nargs="?", default="previous", help="运行 id / label / previous")
+    cmp_.add_argument("new", nargs="?", default="latest", help="运行 id / label / latest")
+
+    sub.add_parser("list", help="列出历史运行")
+
+    worker = sub.add_parser("_worker", help=argparse.SUPPRESS)
+    worker.add_argument("--op", required=True, choices=list(OPERATIONS))
+    worker.add_argument("--size", required=True, choices=list(SIZES))
+    worker.add_argument("--font", default=None)
+
+    args = p.parse_args(argv)
+    args.history = args.history or _default_history_path()
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = _parse_args(argv)
+    if args.command == "_worker":
+        return _worker(args)
+    if args.command == "run":
+        run = run_suite(args)
+        return 0 if all(r.get("ok") for r in run["results"]) else 1
+    history = load_history(args.history)
+    if args.command == "list":
+        for run in history:
+            ok = sum(1 for r in run["results"] if r.get("ok"))
+            print(f"{run['id']}  git={run.get('git')}  {ok}/{len(run['results'])} ok  {run.get('label') or ''}")
+        return 0
+    _print_comparison(_find_run(history, args.base), _find_run(history, args.new))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
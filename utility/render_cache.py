@@ -0,0 +1,152 @@
+"""
+按内容寻址的 ffmpeg 渲染缓存：同一输入 + 同一操作 + 同一参数/编码设置 → 复用上次的输出文件。
+
+缓存目录位于项目 temp 下（``{temp}/render_cache``），按最近使用时间做容量淘汰（LRU）。
+输入文件身份默认取 ``abspath + size + mtime``；由缓存产出的临时文件会记住自己的缓存 key，
+作为下游操作的输入时用 key 代替路径，使 trim → add_audio → extend 这类链式调用整条命中。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Iterable, Optional
+
+# 默认容量上限（字节）；超过后按最近使用时间从旧到新删除
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+# key 结构变更时 bump，使旧条目自然失效
+CACHE_VERSION = "r1"
+
+# 由缓存产出（或写入缓存）的文件 → (缓存 key, size, mtime_ns)
+_derived_identity: dict[str, tuple[str, int, int]] = {}
+_derived_lock = threading.Lock()
+
+
+def file_identity(path: str) -> str:
+    """输入文件身份：缓存产物用其 key；普通文件用 ``abspath|size|mtime_ns``；不存在返回空串。"""
+    if not path:
+        return ""
+    abs_path = os.path.abspath(path)
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return ""
+    with _derived_lock:
+        derived = _derived_identity.get(abs_path)
+    if derived and derived[1] == st.st_size and derived[2] == st.st_mtime_ns:
+        return f"render:{derived[0]}"
+    return f"{abs_path}|{st.st_size}|{st.st_mtime_ns}"
+
+
+def _remember_derived(path: str, key: str) -> None:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+    with _derived_lock:
+        _derived_identity[os.path.abspath(path)] = (key, st.st_size, st.st_mtime_ns)
+
+
+class RenderCache:
+    """单个目录上的渲染缓存；线程安全（build_video_on_segments 等会并发调用）。"""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def make_key(self, op: str, inputs: Iterable[Optional[str]], params: dict[str, Any]) -> Optional[str]:
+        """``op`` + 各输入文件身份 + 参数 → sha1；任一输入缺失返回 None（不缓存）。"""
+        identities = []
+        for p in inputs:
+            ident = file_identity(p) if p else ""
+            if p and not ident:
+                return None
+            identities.append(ident)
+        payload = json.dumps(
+            {"v": CACHE_VERSION, "op": op, "inputs": identities, "params": params},
+            sort_keys=True, ensure_ascii=False, default=str,
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def _entry_path(self, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.{ext}")
+
+    def fetch(self, key: str, ext: str, dest_path: str) -> bool:
+        """命中则复制到 ``dest_path``（调用方可随意删改）并刷新 LRU 时间。"""
+        entry = self._entry_path(key, ext)
+        if not os.path.isfile(entry) or os.path.getsize(entry) <= 0:
+            return False
+        try:
+            shutil.copyfile(entry, dest_path)
+            now = time.time()
+            os.utime(entry, (now, now))
+        except OSError as e:
+            print(f"⚠️ render cache fetch failed ({os.path.basename(entry)}): {e}")
+            return False
+        _remember_derived(dest_path, key)
+        return True
+
+    def store(self, key: str, ext: str, src_path: str) -> None:
+        """把刚渲染出的 ``src_path`` 复制进缓存，随后按容量淘汰。
+
+        不用硬链接：输出之后会被移进项目素材、可能被 ffmpeg ``-y`` 原地改写，共享 inode 会把缓存条目一起改坏；
+        fetch 刷新条目 mtime 时也会改掉项目文件的 mtime（进而改变其 file_identity）。
+        """
+        if not src_path or not os.path.isfile(src_path) or os.path.getsize(src_path) <= 0:
+            return
+        entry = self._entry_path(key, ext)
+        tmp_entry = f"{entry}.{os.getpid()}.{threading.get_ident()}.part"
+        try:
+            shutil.copyfile(src_path, tmp_entry)
+            os.replace(tmp_entry, entry)
+        except OSError as e:
+            print(f"⚠️ render cache store failed ({os.path.basename(src_path)}): {e}")
+            if os.path.exists(tmp_entry):
+                os.remove(tmp_entry)
+            return
+        _remember_derived(src_path, key)
+        self.evict()
+
+    def evict(self) -> int:
+        """总大小超过 ``max_bytes`` 时删除最久未用的条目；返回删除数量。"""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".part"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+            if total <= self.max_bytes:
+                return 0
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                    removed += 1
+                except OSError:
+                    pass
+            if removed:
+                print(f"🧹 render cache: evicted {removed} entries, {total / 1024 ** 2:.1f}MB kept")
+            return removed
+
+    def clear(self) -> None:
+        with self._lock:
+            for name in os.listdir(self.cache_dir):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
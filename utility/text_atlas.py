@@ -0,0 +1,167 @@
+"""
+标题/字幕文字精灵图：用真实字体度量（PIL FreeType）一次性把文字排版、栅格化为透明 PNG，
+按 (文字, 字体文件, 字号, 颜色, 换行宽度, 行距, 对齐) 缓存到 ``config.MACHINE_CACHE_PATH/text_atlas/``，跨项目复用。
+
+取代 drawtext 的「按字符类别估算字宽 → 按字符数换行」：
+- 换行按 ``font.getlength`` 实测宽度（与 ``_wrap_text`` 相同的规则：``\\n`` 与 ``_`` 为强制换行，按空白分词，
+  超宽的词按字符硬断）；
+- 行高取字体 ascent + descent 加 ``line_spacing``（可为负数收紧行距），但不小于字形实际墨迹高度，避免行与行重叠；
+- 精灵图裁到墨迹外框，调用方按精灵图宽高定位（``overlay`` 的 ``w`` / ``h``）。
+
+精灵图由 ``overlay_stage`` 叠加进所在的那一次编码，同一段视频上的多行字幕只编码一次。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+import config
+
+# 排版/栅格化逻辑变更时 bump，旧精灵图失效
+ATLAS_VERSION = 1
+# 测量墨迹高度用的样本（含升部、降部与全角字）
+_INK_SAMPLE = "国Agjy"
+
+
+@dataclass(frozen=True)
+class TextSprite:
+    path: str
+    width: int
+    height: int
+    lines: tuple[str, ...]
+
+
+_lock = threading.Lock()
+_sprites: dict[str, TextSprite] = {}
+_fonts: dict[tuple[str, int], "ImageFont.FreeTypeFont"] = {}
+
+
+def atlas_dir() -> str:
+    return os.path.join(config.MACHINE_CACHE_PATH, "text_atlas")
+
+
+def _font_identity(font_path: str):
+    st = os.stat(font_path)
+    return os.path.abspath(font_path), st.st_size, st.st_mtime_ns
+
+
+def load_font(font_path: str, font_size: int):
+    key = (os.path.abspath(font_path), int(font_size))
+    with _lock:
+        font = _fonts.get(key)
+    if font is None:
+        font = ImageFont.truetype(font_path, int(font_size))
+        with _lock:
+            _fonts[key] = font
+    return font
+
+
+def wrap_lines(text: str, font, max_width: Optional[int]) -> list[str]:
+    """按实测宽度换行；规则同 FfmpegProcessor._wrap_text（只是把「字符数」换成像素宽度）。"""
+    normalized = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = []
+    for line in normalized.split("\n"):
+        if not line.strip():
+            lines.append("")
+            continue
+        for i, segment in enumerate(line.split("_")):
+            if not segment and i > 0:
+                continue
+            current = ""
+            for word in segment.split():
+                test = current + (" " if current else "") + word
+                if max_width is None or font.getlength(test) <= max_width:
+                    current = test
+                    continue
+                if current:
+                    lines.append(current)
+                    current = ""
+                # 单个词超宽：按字符硬断
+                while font.getlength(word) > max_width:
+                    cut = 1
+                    while cut < len(word) and font.getlength(word[:cut + 1]) <= max_width:
+                        cut += 1
+                    lines.append(word[:cut])
+                    word = word[cut:]
+                current = word
+            if current:
+                lines.append(current)
+    return lines
+
+
+def _sprite_key(text, font_path, font_size, color, max_width, line_spacing, align) -> str:
+    payload = json.dumps(
+        [ATLAS_VERSION, text, _font_identity(font_path), int(font_size), color, max_width, int(line_spacing), align],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _rasterize(lines, font, color, line_spacing, align):
+    ascent, descent = font.getmetrics()
+    ink = font.getbbox(_INK_SAMPLE)
+    advance = max(ascent + descent + int(line_spacing), ink[3] - ink[1])
+    widths = [int(round(font.getlength(ln))) for ln in lines]
+    canvas_w = max([1] + widths) + 2 * descent
+    canvas_h = max(1, advance * (len(lines) - 1) + ascent + descent) + 2 * descent
+    img = Image.new("RGBA", (canvas_w, canvas_h), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    for i, (ln, w) in enumerate(zip(lines, widths)):
+        if align == "center":
+            x = descent + (canvas_w - 2 * descent - w) // 2
+        else:
+            x = descent
+        draw.text((x, descent + i * advance), ln, font=font, fill=color, anchor="la")
+    bbox = img.getbbox()
+    return img.crop(bbox) if bbox else img.crop((0, 0, 1, 1))
+
+
+def render_text_sprite(
+    text: str,
+    font_path: str,
+    font_size: int,
+    *,
+    color: str = "white",
+    max_width: Optional[int] = None,
+    line_spacing: int = 0,
+    align: str = "left",
+) -> TextSprite:
+    """排版并栅格化 ``text``，返回缓存中的精灵图（命中时不重新排版）。``align``：``left`` 与 drawtext 一致，或 ``center``。"""
+    key = _sprite_key(text, font_path, font_size, color, max_width, line_spacing, align)
+    with _lock:
+        sprite = _sprites.get(key)
+    if sprite is not None and os.path.isfile(sprite.path):
+        return sprite
+
+    path = os.path.join(atlas_dir(), f"{key}.png")
+    meta_path = os.path.join(atlas_dir(), f"{key}.json")
+    sprite = None
+    if os.path.isfile(path) and os.path.isfile(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            sprite = TextSprite(path, int(meta["width"]), int(meta["height"]), tuple(meta["lines"]))
+        except (OSError, ValueError, KeyError):
+            sprite = None
+
+    if sprite is None:
+        font = load_font(font_path, font_size)
+        lines = wrap_lines(text, font, max_width)
+        img = _rasterize(lines, font, color, line_spacing, align)
+        os.makedirs(atlas_dir(), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        img.save(tmp, "PNG")
+        os.replace(tmp, path)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"width": img.width, "height": img.height, "lines": lines}, f, ensure_ascii=False)
+        sprite = TextSprite(path, img.width, img.height, tuple(lines))
+
+    with _lock:
+        _sprites[key] = sprite
+    return sprite
@@ -0,0 +1,236 @@
+"""
+单遍滤镜图成片渲染：把 ``MagicWorkflow.scenes`` 整条时间线编译成一个（或少量几个）ffmpeg filter_complex。
+
+逐场景流水线（add_audio_to_video → extend_video → 转场前再延长标准化 → xfade 拼接）每步都写一次完整 H.264 中间文件；
+这里在同一张图里完成：画面按配音时长变速对齐、缩放/补边/统一帧率、末帧延长、fade 过渡与音轨对齐，
+只有场景数超过 ``MAX_SCENES_PER_GRAPH`` 时才按组先渲染中间文件，再用同样的过渡逻辑合并各组。
+
+时间线与 concat_videos_with_transitions 一致（单位：帧）：
+第 i 段长 F_i = 配音时长 + 场景 extension + 转场延长 extend_sec；相邻两段重叠 T 帧做 xfade；
+第 i 段音频保留 F_i - T 帧（末段保留全部），不足部分静音补齐，总长 ``sum(F) - (n-1)*T``。
+"""
+from __future__ import annotations
+
+import os
+import time
+
+import config
+from utility import overlay_stage
+from utility.ffmpeg_processor import (
+    INTERMEDIATE_PROFILES,
+    STANDARD_AUDIO_RATE,
+    STANDARD_FPS,
+    ffmpeg_path,
+)
+
+
+class TimelineRenderer:
+    # 单张图内的场景数上限（每场景 2 路输入）；超过则分组渲染中间文件
+    MAX_SCENES_PER_GRAPH = 24
+    # 画面与配音时长差小于此值时不变速（与 adjust_video_to_duration 一致）
+    SPEED_MATCH_TOLERANCE = 0.1
+
+    def __init__(self, ffmpeg_processor, on_progress=None, overlays=None):
+        self.ffmpeg = ffmpeg_processor
+        # 成片叠加层（水印/角标，overlay_stage.OverlayLayer）：只在输出成片的那张图里叠加
+        self.overlays = list(overlays or [])
+        # 透传给 run_ffmpeg_command：每张图编码时回调 frame/time_sec/percent（见 utility/ffmpeg_job.py）
+        self.on_progress = on_progress
+        self.clips = []
+
+    def plan(self, scenes, with_transitions=True, extend_sec=1.0, transition_sec=0.5):
+        """探测各场景并计算帧级时间线；结果写入 ``self.clips`` 并返回过渡帧数。"""
+        fps = STANDARD_FPS
+        transition_frames = int(round(transition_sec * fps)) if with_transitions else 0
+        extend_frames = int(round(extend_sec * fps)) if with_transitions else 0
+        self.clips = []
+        for s in scenes:
+            video = s["clip"]
+            audio = s.get("clip_audio")
+            video_dur = self.ffmpeg.get_video_stream_duration(video)
+            has_audio = bool(audio) and os.path.isfile(audio)
+            audio_dur = self.ffmpeg.get_duration(audio) if has_audio else 0.0
+            target = audio_dur if audio_dur > 0 else video_dur
+            ext = float(s.get("extension", 0) or 0) if with_transitions else 0.0
+            body_frames = int(round(target * fps))
+            self.clips.append({
+                "video": video,
+                "audio": audio if has_audio else None,
+                "video_duration": video_dur,
+                "target_duration": target,
+                "body_frames": body_frames,
+                "frames": body_frames + int(round(ext * fps)) + extend_frames,
+                # 与 finalize_video 分段文件时长一致（配音时长 + extension），供 ZERO 音轨按 story 计时
+                "segment_duration": target + ext,
+            })
+        return transition_frames
+
+    def _clip_video_chain(self, idx, clip):
+        """单场景画面：按配音时长变速 → 统一尺寸/帧率 → 末帧 clone 延长 → 精确截到 F_i 帧。"""
+        w, h = self.ffmpeg.width, self.ffmpeg.height
+        parts = []
+        vd, td = clip["video_duration"], clip["target_duration"]
+        if vd > 0 and td > 0 and abs(vd - td) >= self.SPEED_MATCH_TOLERANCE:
+            parts.append(f"setpts={td / vd:.9f}*PTS")
+        parts.append(
+            f"scale={w}:{h}:force_original_aspect_ratio=decrease,"
+            f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:black,setsar=1,fps={STANDARD_FPS}"
+        )
+        parts.append(f"trim=end_frame={clip['body_frames']}")
+        pad_frames = clip["frames"] - clip["body_frames"] + 4 + max(0, clip["body_frames"] - int(vd * STANDARD_FPS))
+        parts.append(f"tpad=stop={pad_frames}:stop_mode=clone")
+        parts.append(f"trim=end_frame={clip['frames']},setpts=PTS-STARTPTS")
+        return f"[{idx}:v]" + ",".join(parts)
+
+    @staticmethod
+    def _audio_chain(label, keep_sec, body_sec=None):
+        chain = (
+            f"{label}aresample={STANDARD_AUDIO_RATE},"
+            f"aformat=sample_fmts=fltp:sample_rates={STANDARD_AUDIO_RATE}:channel_layouts=stereo"
+        )
+        if body_sec is not None:
+            chain += f",atrim=start=0:end={body_sec:.6f}"
+        return chain + f",apad,atrim=start=0:end={keep_sec:.6f},asetpts=PTS-STARTPTS"
+
+    @staticmethod
+    def _join_filters(video_labels, audio_labels, frames, transition_frames, out_v, out_a):
+        """按帧 offset 串联 xfade（T=0 时用 concat），音轨直接 concat。"""
+        n = len(video_labels)
+        filters = []
+        if transition_frames > 0 and n > 1:
+            cur = video_labels[0]
+            offset_frames = 0
+            for t in range(1, n):
+                offset_frames += frames[t - 1] - transition_frames
+                nxt = out_v if t == n - 1 else f"[jx{t}]"
+                filters.append(
+                    f"{cur}{video_labels[t]}xfade=transition=fade:"
+                    f"duration={transition_frames / STANDARD_FPS:.6f}:offset={offset_frames / STANDARD_FPS:.6f}{nxt}"
+                )
+                cur = nxt
+        else:
+            filters.append("".join(video_labels) + f"concat=n={n}:v=1:a=0{out_v}")
+        filters.append("".join(audio_labels) + f"concat=n={n}:v=0:a=1{out_a}")
+        return filters
+
+    def _encode_args(self, final=True):
+        # 长 filter_complex 固定 libx264（NVENC 与长滤镜链兼容性差，见 concat_videos_with_transitions）；
+        # 分组中间文件按处理器的中间文件档位编码，只有合并后的成片用质量编码
+        enc = {"codec": "libx264", "preset": "medium", "quality": ["-crf", "18"]}
+        if not final:
+            enc = INTERMEDIATE_PROFILES[self.ffmpeg.intermediate_profile] or enc
+        args = ["-c:v", enc["codec"], "-preset", enc["preset"], *enc["quality"], "-pix_fmt", "yuv420p", "-r", str(STANDARD_FPS)]
+        args.extend(self.ffmpeg._get_audio_encode_args())
+        args.extend(self.ffmpeg._get_output_optimization_args())
+        return args
+
+    @staticmethod
+    def _overlay_filters(cmd, overlays, first_input):
+        """叠加层输入追加到 ``cmd``，返回 ``[vjoin]`` → ``[vout]`` 的叠加链；无叠加层时返回空列表。"""
+        if not overlays:
+            return []
+        cmd.extend(overlay_stage.input_args(overlays))
+        return overlay_stage.filter_chain(overlays, "vjoin", first_input, "vout", STANDARD_FPS)
+
+    def _render_group(self, clips, transition_frames, output_path, final=True):
+        """一张图渲染若干场景（每场景一路画面 + 一路配音）。
+
+        组内末段音频保留完整 F 帧：整条时间线时它就是最后一段；分组时由 _merge_groups 再裁掉与下一组重叠的 T 帧。
+        """
+        fps = STANDARD_FPS
+        cmd = [ffmpeg_path, "-y"]
+        filters, v_labels, a_labels = [], [], []
+        n = len(clips)
+        input_idx = 0
+        for i, clip in enumerate(clips):
+            cmd.extend(["-i", clip["video"]])
+            filters.append(self._clip_video_chain(input_idx, clip) + f"[v{i}]")
+            v_labels.append(f"[v{i}]")
+            input_idx += 1
+
+            keep_frames = clip["frames"] - transition_frames if i < n - 1 else clip["frames"]
+            keep_sec = keep_frames / fps
+            if clip["audio"]:
+                cmd.extend(["-i", clip["audio"]])
+                filters.append(self._audio_chain(f"[{input_idx}:a]", keep_sec, clip["target_duration"]) + f"[a{i}]")
+                input_idx += 1
+            else:
+                filters.append(
+                    f"anullsrc=channel_layout=stereo:sample_rate={STANDARD_AUDIO_RATE}:duration={keep_sec:.6f}[a{i}]"
+                )
+            a_labels.append(f"[a{i}]")
+
+        overlays = self.overlays if final else []
+        filters.extend(self._join_filters(
+            v_labels, a_labels, [c["frames"] for c in clips], transition_frames, "[vjoin]" if overlays else "[vout]", "[aout]"
+        ))
+        filters.extend(self._overlay_filters(cmd, overlays, input_idx))
+        cmd.extend(["-filter_complex", ";".join(filters), "-map", "[vout]", "-map", "[aout]"])
+        cmd.extend(self._encode_args(final))
+        cmd.append(output_path)
+        total_frames = sum(c["frames"] for c in clips) - (n - 1) * transition_frames
+        self.ffmpeg.run_ffmpeg_command(cmd, on_progress=self.on_progress, duration=total_frames / fps)
+        if not os.path.isfile(output_path):
+            raise RuntimeError(f"Timeline graph output not created: {output_path}")
+
+    def _merge_groups(self, group_paths, group_frames, transition_frames, output_path):
+        """合并分组中间文件：组间同样做 T 帧 xfade，非末组音频裁掉尾部 T 帧。"""
+        fps = STANDARD_FPS
+        cmd = [ffmpeg_path, "-y"]
+        filters, v_labels, a_labels = [], [], []
+        m = len(group_paths)
+        for g, path in enumerate(group_paths):
+            cmd.extend(["-i", path])
+            filters.append(f"[{g}:v]setpts=PTS-STARTPTS[gv{g}]")
+            keep = group_frames[g] - (transition_frames if g < m - 1 else 0)
+            filters.append(self._audio_chain(f"[{g}:a]", keep / fps) + f"[ga{g}]")
+            v_labels.append(f"[gv{g}]")
+            a_labels.append(f"[ga{g}]")
+        filters.extend(self._join_filters(
+            v_labels, a_labels, group_frames, transition_frames, "[vjoin]" if self.overlays else "[vout]", "[aout]"
+        ))
+        filters.extend(self._overlay_filters(cmd, self.overlays, m))
+        cmd.extend(["-filter_complex", ";".join(filters), "-map", "[vout]", "-map", "[aout]"])
+        cmd.extend(self._encode_args())
+        cmd.append(output_path)
+        total_frames = sum(group_frames) - (m - 1) * transition_frames
+        self.ffmpeg.run_ffmpeg_command(cmd, on_progress=self.on_progress, duration=total_frames / fps)
+
+    def render(self, scenes, with_transitions=True, extend_sec=1.0, transition_sec=0.5):
+        """渲染整条时间线，返回临时 mp4 路径。"""
+        if not scenes:
+            return None
+        started = time.perf_counter()
+        transition_frames = self.plan(scenes, with_transitions, extend_sec, transition_sec)
+        n = len(self.clips)
+        expected = (sum(c["frames"] for c in self.clips) - (n - 1) * transition_frames) / STANDARD_FPS
+        output_path = config.get_temp_file(self.ffmpeg.pid, "mp4")
+
+        size = self.MAX_SCENES_PER_GRAPH
+        if n <= size:
+            print(f"🕸️  single-pass timeline: {n} scenes in one filter graph (expected {expected:.2f}s)")
+            self._render_group(self.clips, transition_frames, output_path)
+        else:
+            groups = [self.clips[i:i + size] for i in range(0, n, size)]
+            print(
+                f"🕸️  timeline: {n} scenes → {len(groups)} graphs + 1 merge (expected {expected:.2f}s, "
+                f"intermediate profile: {self.ffmpeg.intermediate_profile})"
+            )
+            group_paths, group_frames = [], []
+            try:
+                for g, group in enumerate(groups):
+                    path = config.get_temp_file(self.ffmpeg.pid, "mp4")
+                    self._render_group(group, transition_frames, path, final=False)
+                    group_paths.append(path)
+                    group_frames.append(sum(c["frames"] for c in group) - (len(group) - 1) * transition_frames)
+                self._merge_groups(group_paths, group_frames, transition_frames, output_path)
+            finally:
+                for path in group_paths:
+                    if os.path.exists(path):
+                        os.remove(path)
+
+        print(
+            f"✅ timeline rendered in {time.perf_counter() - started:.2f}s: "
+            f"{self.ffmpeg.get_duration(output_path):.2f}s (expected {expected:.2f}s)"
+        )
+        return output_path
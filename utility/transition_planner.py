@@ -0,0 +1,194 @@
+"""
+帧级 xfade 转场规划：在渲染前算出每段的末帧延长、过渡偏移与音轨保留长度（单位：帧），
+并据此生成单张 filter_complex 内的 ``tpad=stop_mode=clone`` 延长链，不再为每段先编码一遍延长文件。
+
+时间线（与 concat_videos_with_transitions / _concat_videos_with_transitions 原逻辑一致）：
+- 第 i 段进入 xfade 的帧数 ``F_i = 源帧数 + 延长帧数``（延长部分克隆末帧）；
+- 第 i 段与第 i+1 段的过渡长 ``T_i`` 帧，另可额外提前 ``d_i`` 帧（``frames_deduct`` 的整数部分每处都扣，
+  小数部分按 Bresenham 方式均匀分摊到各处过渡）；
+- 第 i+1 段在输出上的起点 ``S_{i+1} = S_i + F_i - T_i - d_i``，即 xfade 的 offset；总长 ``S_last + F_last``；
+- 第 i 段音轨保留 ``F_i - T_i`` 帧（末段保留 ``F_last``），不足部分静音补齐后直接 concat。
+
+``plan.table()`` 返回逐段的表格（dict 列表），可直接打印或断言。
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence
+
+# tpad 比计划多补的帧数：源帧数按时长估算，差一两帧时仍能由 trim 精确截到 F_i
+PAD_MARGIN_FRAMES = 4
+
+
+@dataclass
+class ClipSlot:
+    """单段在时间线上的位置（均为帧数）。"""
+    index: int
+    source_frames: int
+    pad_frames: int
+    start_frame: int = 0
+    transition_frames: int = 0  # 与下一段的过渡帧数（末段 0）
+    deduct_frames: int = 0  # 与下一段额外提前的帧数（末段 0）
+    audio_frames: int = 0
+    effect: str = "fade"
+
+    @property
+    def frames(self) -> int:
+        return self.source_frames + self.pad_frames
+
+
+@dataclass
+class TransitionPlan:
+    fps: int
+    clips: List[ClipSlot] = field(default_factory=list)
+
+    @property
+    def total_frames(self) -> int:
+        if not self.clips:
+            return 0
+        return self.clips[-1].start_frame + self.clips[-1].frames
+
+    @property
+    def audio_frames(self) -> int:
+        return sum(c.audio_frames for c in self.clips)
+
+    @property
+    def total_duration(self) -> float:
+        return self.total_frames / self.fps
+
+    def table(self) -> list[dict]:
+        return [
+            {
+                "index": c.index,
+                "source_frames": c.source_frames,
+                "pad_frames": c.pad_frames,
+                "frames": c.frames,
+                "start_frame": c.start_frame,
+                "transition_frames": c.transition_frames,
+                "deduct_frames": c.deduct_frames,
+                "audio_frames": c.audio_frames,
+                "effect": c.effect,
+            }
+            for c in self.clips
+        ]
+
+    def print_table(self) -> None:
+        print(f"   📐 transition plan @ {self.fps}fps: {len(self.clips)} clips, video {self.total_frames} frames, audio {self.audio_frames} frames")
+        for c in self.clips:
+            nxt = f" → xfade {c.effect} {c.transition_frames}f" + (f" (-{c.deduct_frames}f)" if c.deduct_frames else "") if c.transition_frames else ""
+            print(
+                f"      #{c.index:<3} src {c.source_frames:>6}f + pad {c.pad_frames:>4}f = {c.frames:>6}f  "
+                f"start {c.start_frame:>7}f  audio {c.audio_frames:>6}f{nxt}"
+            )
+
+    # ---- filter_complex 片段 ----
+
+    def clip_video_filter(self, index: int, before_pad: str = "", after_pad: str = "", out_label: Optional[str] = None) -> str:
+        """``[index:v]`` → 统一帧率等（``before_pad``）→ tpad 克隆末帧 → 精确截到 F_i 帧 → ``after_pad``（缩放等）。"""
+        c = self.clips[index]
+        parts = [p for p in (before_pad,) if p]
+        parts.append(f"tpad=stop={c.pad_frames + PAD_MARGIN_FRAMES}:stop_mode=clone")
+        parts.append(f"trim=end_frame={c.frames}")
+        if after_pad:
+            parts.append(after_pad)
+        parts.append("setpts=PTS-STARTPTS")
+        return f"[{index}:v]" + ",".join(parts) + f"[{out_label or f'v{index}'}]"
+
+    def xfade_filters(self, labels: Sequence[str], out_label: str) -> list[str]:
+        """按计划的 offset 串联 xfade；单段时只做 null 透传。"""
+        if len(labels) == 1:
+            return [f"[{labels[0]}]null[{out_label}]"]
+        filters = []
+        cur = labels[0]
+        for i in range(1, len(self.clips)):
+            prev = self.clips[i - 1]
+            nxt = out_label if i == len(self.clips) - 1 else f"vx{i}"
+            filters.append(
+                f"[{cur}][{labels[i]}]xfade=transition={prev.effect}:"
+                f"duration={prev.transition_frames / self.fps:.6f}:offset={self.clips[i].start_frame / self.fps:.6f}[{nxt}]"
+            )
+            cur = nxt
+        return filters
+
+    def audio_filters(self, has_audio: Sequence[bool], audio_rate: int, out_label: str, input_index=None) -> list[str]:
+        """每段音轨补静音后截到 ``audio_frames``，再 concat；无音轨的段用 anullsrc。"""
+        filters = []
+        for c in self.clips:
+            keep = c.audio_frames / self.fps
+            label = f"pa{c.index}"
+            if has_audio[c.index]:
+                idx = input_index(c.index) if input_index else c.index
+                filters.append(
+                    f"[{idx}:a]aresample={audio_rate},aformat=sample_fmts=fltp:sample_rates={audio_rate}:channel_layouts=stereo,"
+                    f"apad,atrim=start=0:end={keep:.6f},asetpts=PTS-STARTPTS[{label}]"
+                )
+            else:
+                filters.append(f"anullsrc=channel_layout=stereo:sample_rate={audio_rate}:duration={keep:.6f}[{label}]")
+        filters.append("".join(f"[pa{c.index}]" for c in self.clips) + f"concat=n={len(self.clips)}:v=0:a=1[{out_label}]")
+        return filters
+
+
+def distribute_deduct(frames_deduct: float, n_transitions: int) -> list[int]:
+    """``frames_deduct`` 分摊到每处过渡：整数部分每处都扣，小数部分累计成整帧后均匀插入（如 5.95 × 20 处 → 19 处扣 6 帧、1 处扣 5 帧）。"""
+    if n_transitions <= 0:
+        return []
+    base = int(frames_deduct)
+    extra_total = int(round((frames_deduct - base) * n_transitions))
+    result = [base] * n_transitions
+    if extra_total <= 0:
+        return result
+    interval = n_transitions / extra_total
+    used = 0
+    for k in range(n_transitions):
+        if used < extra_total and (k + 1) >= (used + 1) * interval:
+            result[k] += 1
+            used += 1
+    return result
+
+
+def plan_transitions(
+    source_durations: Sequence[float],
+    pad_secs: Sequence[float],
+    transition_secs: Sequence[float],
+    fps: int,
+    frames_deduct: float = 0.0,
+    effects: Optional[Sequence[str]] = None,
+) -> TransitionPlan:
+    """计算帧级时间线。
+
+    :param source_durations: 各段源视频流时长（秒）
+    :param pad_secs: 各段末尾克隆延长（秒）
+    :param transition_secs: 相邻两段的过渡时长（秒），长度 n-1
+    :param frames_deduct: 每处过渡额外提前的帧数（可为小数，见 distribute_deduct）
+    :param effects: 各处过渡的 xfade transition 名称，长度 n-1（默认 fade）
+    """
+    n = len(source_durations)
+    if len(pad_secs) != n or len(transition_secs) != max(0, n - 1):
+        raise ValueError("pad_secs must match clips and transition_secs must have n-1 entries")
+    deducts = distribute_deduct(frames_deduct, n - 1)
+    plan = TransitionPlan(fps=fps)
+    start = 0
+    for i in range(n):
+        slot = ClipSlot(
+            index=i,
+            source_frames=max(1, int(round(float(source_durations[i]) * fps))),
+            pad_frames=max(0, int(round(float(pad_secs[i]) * fps))),
+            start_frame=start,
+        )
+        if i < n - 1:
+            slot.transition_frames = max(1, int(round(float(transition_secs[i]) * fps)))
+            slot.deduct_frames = deducts[i]
+            slot.effect = effects[i] if effects else "fade"
+            if slot.transition_frames + slot.deduct_frames > slot.frames:
+                raise ValueError(
+                    f"clip {i}: transition {slot.transition_frames}f + deduct {slot.deduct_frames}f exceeds clip length {slot.frames}f"
+                )
+            slot.audio_frames = slot.frames - slot.transition_frames
+            start += slot.frames - slot.transition_frames - slot.deduct_frames
+        else:
+            slot.audio_frames = slot.frames
+        plan.clips.append(slot)
+    for prev, cur in zip(plan.clips, plan.clips[1:]):
+        if cur.frames < prev.transition_frames:
+            raise ValueError(f"clip {cur.index}: length {cur.frames}f shorter than incoming transition {prev.transition_frames}f")
+    return plan
@@ -0,0 +1,89 @@
+"""
+跨项目的句级 TTS 缓存：按 ``(引擎, 音色/配置, 规范化文本, 版本)`` 缓存合成好的音频，
+存放在 ``config.MACHINE_CACHE_PATH/tts/``，总大小超过 ``TTS_CACHE_MAX_BYTES`` 时按最近使用时间淘汰。
+
+原先各 TTS 服务以整段 SSML 的哈希为 key、缓存在项目自己的 temp 目录：改一句就整段重新合成，
+每个项目相同的开场/结尾也要各合成一遍。这里：
+- Voicebox 拆句后每句单独查缓存，只有改动过的句子才请求服务端；
+- Minimax / Azure 的请求本身是一整段（内联停顿标记 / 多角色 SSML），按请求粒度跨项目复用；
+- 命中时更新 mtime，淘汰按 mtime 从旧到新删到上限的 ``TTS_CACHE_EVICT_RATIO``（见 disk_budget.py）；
+- 返回的是缓存文件路径，调用方只读；需要放进项目目录时先复制。
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import unicodedata
+from typing import Any, Optional
+
+import config
+from utility.disk_budget import DiskBudget
+
+# 缓存总大小上限（字节）；一句 mp3 约 30–80 KB，2 GB 约数万句
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+# 超限时删到上限的这个比例，避免每次写入都触发淘汰
+TTS_CACHE_EVICT_RATIO = 0.9
+# 规范化/命名规则变更时 bump，旧缓存失效
+TTS_CACHE_VERSION = 1
+
+
+def cache_dir() -> str:
+    return os.path.join(config.MACHINE_CACHE_PATH, "tts")
+
+
+_budget = DiskBudget("tts", cache_dir, TTS_CACHE_MAX_BYTES, TTS_CACHE_EVICT_RATIO)
+
+
+def normalize_text(text: str) -> str:
+    """NFC、去首尾空白、连续空白合并为一个空格；标点不动（会影响停顿与语调）。"""
+    text = unicodedata.normalize("NFC", str(text or ""))
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def cache_key(engine: str, voice: Any, text: str) -> str:
+    """``voice`` 可以是音色 id，也可以是影响合成结果的参数 dict（语速、音高、模型等）。"""
+    if not isinstance(voice, str):
+        voice = json.dumps(voice, ensure_ascii=False, sort_keys=True)
+    payload = f"{TTS_CACHE_VERSION}|{engine}|{voice}|{normalize_text(text)}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _cache_file(key: str, ext: str) -> str:
+    return os.path.join(cache_dir(), key[:2], f"{key}.{ext.lstrip('.')}")
+
+
+def lookup(engine: str, voice: Any, text: str, ext: str = "mp3") -> Optional[str]:
+    """命中返回缓存文件路径（并刷新 mtime），否则 None。"""
+    path = _cache_file(cache_key(engine, voice, text), ext)
+    try:
+        if os.path.getsize(path) <= 0:
+            return None
+    except OSError:
+        return None
+    _budget.touch(path)
+    return path
+
+
+def store(engine: str, voice: Any, text: str, audio_path: str) -> Optional[str]:
+    """把已合成的 ``audio_path`` 复制进缓存（扩展名沿用源文件），返回缓存路径；失败返回 None。"""
+    if not audio_path or not os.path.isfile(audio_path):
+        return None
+    ext = os.path.splitext(audio_path)[1].lstrip(".") or "mp3"
+    path = _cache_file(cache_key(engine, voice, text), ext)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(audio_path, tmp)
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+    except OSError as e:
+        print(f"⚠️ TTS cache write failed: {e}")
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return None
+    _budget.added(size)
+    return path
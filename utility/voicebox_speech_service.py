@@ -14,12 +14,16 @@ import html
 import json
 import os
 import re
+import threading
 import time
-from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
+from requests.adapters import HTTPAdapter
 
 import config
+from utility import tts_cache
 from utility.ffmpeg_audio_processor import FfmpegAudioProcessor
 from utility.file_util import safe_copy_overwrite
 
@@ -140,12 +144,33 @@ def _vb_normalize_ascii_punctuation_to_cjk(s: str) -> str:
     return re.sub(r"(?<!\d)\.(?!\d)", "。", s)
 
 
-# 逐句 TTS 后拼接时，句间静音（秒）；来自 noise.wav 裁切，见 FfmpegAudioProcessor.make_silence
+# 逐句 TTS 后拼接时，句间静音（秒）；来自 noise.wav 裁切，见 FfmpegAudioProcessor.silence_segment
 _VB_SEGMENT_GAP_SEC = 0.15
 # 缓存版本：拼接逻辑变更后须 bump，避免复用错误速率的旧 mp3
 _VB_AUDIO_CACHE_VER = "v2"
 # 文案中的 ``<0.5>`` / ``＜1.25＞`` 等 → 插入对应秒数静音（0.5–1.5 等，同样用 noise.wav 裁切）
 _VB_SILENCE_MARKER_RE = re.compile(r"[<＜](\d+(?:\.\d+)?)[>＞]")
+# 拆句 TTS 同时在途的段数（服务端自己排队，开太多只会增加单段等待）
+_VB_SEGMENT_WORKERS = max(1, int(os.getenv("VOICEBOX_SEGMENT_WORKERS", "4")))
+# 单段 /generate + 下载失败后的重试次数（不含首次），退避秒数逐次翻倍
+_VB_SEGMENT_RETRIES = 2
+_VB_RETRY_BACKOFF_SEC = 1.0
+
+_vb_session: Optional[requests.Session] = None
+_vb_session_lock = threading.Lock()
+
+
+def _voicebox_session() -> requests.Session:
+    """进程内共享的 Session：keep-alive 连接池，并发段复用连接，不再每个请求重新建连。"""
+    global _vb_session
+    with _vb_session_lock:
+        if _vb_session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=_VB_SEGMENT_WORKERS * 2)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _vb_session = session
+        return _vb_session
 
 
 def _split_voicebox_segments(text: str) -> List[tuple]:
@@ -196,9 +221,8 @@ class VoiceboxService:
         print(f"Voicebox TTS base: {self.base_url}")
         _ensure_voices_for_project(self.pid)
         self._ffmpeg_audio = FfmpegAudioProcessor(pid)
-        self._segment_gap_wav = self._ffmpeg_audio.make_silence(_VB_SEGMENT_GAP_SEC)
-        if not self._segment_gap_wav:
-            print("⚠️ Voicebox: 预生成句间静音失败，多句 TTS 拼接时将无句间静音")
+        # 句间/显式静音为虚拟静音段，concat_audios 拼接时才展开，不为每处静音写临时 WAV
+        self._segment_gap = self._ffmpeg_audio.silence_segment(_VB_SEGMENT_GAP_SEC)
 
     def _normalize_for_voicebox(self, text: str) -> str:
         """与 create_ssml 中一致：省略号/破折号、全角化、繁简转换（在 html.escape 之前）。"""
@@ -235,7 +259,7 @@ class VoiceboxService:
         """POST /generate，轮询下载音频，写入 out_mp3_path。"""
         body = {"profile_id": profile_id, "text": text_for_api}
         try:
-            r = requests.post(
+            r = _voicebox_session().post(
                 self._generate_url(),
                 json=body,
                 headers={"Content-Type": "application/json"},
@@ -263,9 +287,44 @@ class VoiceboxService:
             f.write(raw)
         return True
 
+    def _generate_mp3_with_retry(self, profile_id: str, text_for_api: str, out_mp3_path: str) -> Tuple[bool, int]:
+        """_post_generate_and_save_mp3 失败时按 _VB_SEGMENT_RETRIES 退避重试；返回 (是否成功, 尝试次数)。"""
+        for attempt in range(_VB_SEGMENT_RETRIES + 1):
+            if attempt:
+                time.sleep(_VB_RETRY_BACKOFF_SEC * (2 ** (attempt - 1)))
+                print(f"Voicebox: 重试第 {attempt} 次 …")
+            if self._post_generate_and_save_mp3(profile_id, text_for_api, out_mp3_path):
+                return True, attempt + 1
+        return False, _VB_SEGMENT_RETRIES + 1
+
+    def _synthesize_segment_wav(self, profile_id: str, text: str) -> Tuple[Optional[str], Dict[str, float]]:
+        """单句 TTS → 44.1k WAV（在线程池中运行）；先查跨项目句级缓存（tts_cache）。返回 (wav 路径或 None, 计时)。"""
+        timings: Dict[str, float] = {"generate": 0.0, "to_wav": 0.0, "attempts": 0, "cached": 0}
+        part_path = tts_cache.lookup("voicebox", profile_id, text)
+        if part_path:
+            timings["cached"] = 1
+        else:
+            part_path = config.get_temp_file(self.pid, "mp3")
+            started = time.perf_counter()
+            ok, attempts = self._generate_mp3_with_retry(profile_id, html.escape(text), part_path)
+            timings["generate"] = time.perf_counter() - started
+            timings["attempts"] = attempts
+            if not ok:
+                return None, timings
+            tts_cache.store("voicebox", profile_id, text, part_path)
+        # Voicebox 返回的 mp3 常为 16k/24k；静音片段为 44.1k wav。
+        # concat 前必须统一采样率，否则整段会按错误速率播放（约快 2–3 倍）。
+        started = time.perf_counter()
+        part_wav = self._ffmpeg_audio.to_wav(part_path)
+        timings["to_wav"] = time.perf_counter() - started
+        if not part_wav:
+            print("Voicebox: TTS 片段转 WAV 失败")
+        return part_wav, timings
+
     def synthesize_speech(self, ssml_text: str) -> Optional[str]:
         """解析 create_ssml 的 JSON（或兼容仅含 text 字段），生成音频并保存为文件。
-        多句时按标点拆句逐段生成，句间用 __init__ 预生成的静音片段拼接（concat_audios）。"""
+        多句时按标点拆句，各句在线程池中并发生成（_VB_SEGMENT_WORKERS 路），按原顺序插入静音段后一次拼接（concat_audios）。
+        每句先查跨项目句级缓存（tts_cache），改写一句只重新合成该句。"""
         ssml_text = (ssml_text or "").strip()
         cache_key = f"{self.string_to_code(ssml_text)}_{_VB_AUDIO_CACHE_VER}"
         cache_dir = f"{config.get_project_path(self.pid)}/temp"
@@ -291,9 +350,13 @@ class VoiceboxService:
         segments = _split_voicebox_segments(base)
         speech_only = [v for k, v in segments if k == "speech"]
         if len(segments) == 1 and segments[0][0] == "speech":
-            esc = html.escape(segments[0][1])
-            if not self._post_generate_and_save_mp3(profile_id, esc, cache_mp3):
+            sentence = segments[0][1]
+            cached = tts_cache.lookup("voicebox", profile_id, sentence)
+            if cached and safe_copy_overwrite(cached, cache_mp3):
+                return cache_mp3
+            if not self._generate_mp3_with_retry(profile_id, html.escape(sentence), cache_mp3)[0]:
                 return None
+            tts_cache.store("voicebox", profile_id, sentence, cache_mp3)
             return cache_mp3
         if not speech_only:
             print("Voicebox: no speech segments after split")
@@ -306,31 +369,47 @@ class VoiceboxService:
             + (f"，显式静音 {n_silence} 处" if n_silence else "")
             + f"，句间静音 {_VB_SEGMENT_GAP_SEC}s（noise.wav / concat）"
         )
-        gap = self._segment_gap_wav
-        if not gap:
-            print("⚠️ Voicebox: 句间静音不可用，无句间短静音")
+        gap = self._segment_gap
+
+        speech_indices = [idx for idx, (kind, _) in enumerate(segments) if kind == "speech"]
+        workers = min(_VB_SEGMENT_WORKERS, n_speech)
+        results: Dict[int, str] = {}
+        started = time.perf_counter()
+        busy_total = 0.0
+        cached_count = 0
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="voicebox-tts") as pool:
+            futures = {
+                idx: pool.submit(self._synthesize_segment_wav, profile_id, str(segments[idx][1]))
+                for idx in speech_indices
+            }
+            for order, idx in enumerate(speech_indices, start=1):
+                part_wav, timings = futures[idx].result()
+                seg_total = timings["generate"] + timings["to_wav"]
+                busy_total += seg_total
+                if not part_wav:
+                    for pending in futures.values():
+                        pending.cancel()
+                    print(f"Voicebox: 第 {order}/{n_speech} 段失败（尝试 {int(timings['attempts'])} 次），放弃本次合成")
+                    return None
+                results[idx] = part_wav
+                if timings["cached"]:
+                    cached_count += 1
+                    detail = f"缓存命中 + 转 WAV {timings['to_wav']:.2f}s"
+                else:
+                    retry_note = f"，重试 {int(timings['attempts']) - 1} 次" if timings["attempts"] > 1 else ""
+                    detail = f"生成 {timings['generate']:.2f}s + 转 WAV {timings['to_wav']:.2f}s{retry_note}"
+                print(f"Voicebox: 段 {order}/{n_speech} {seg_total:.2f}s（{detail}） {str(segments[idx][1])[:16]}")
+        print(
+            f"Voicebox: {n_speech} 段 TTS 并发 {workers} 路完成，耗时 {time.perf_counter() - started:.2f}s"
+            f"（逐段合计 {busy_total:.2f}s，句级缓存命中 {cached_count} 段）"
+        )
 
-        chain: List[str] = []
+        chain: List[Any] = []
         for idx, (kind, val) in enumerate(segments):
             if kind == "silence":
-                sil_wav = self._ffmpeg_audio.make_silence(float(val))
-                if sil_wav:
-                    chain.append(sil_wav)
-                else:
-                    print(f"⚠️ Voicebox: 生成 {val}s 静音失败，已跳过")
+                chain.append(self._ffmpeg_audio.silence_segment(float(val)))
                 continue
-
-            esc = html.escape(str(val))
-            part_path = config.get_temp_file(self.pid, "mp3")
-            if not self._post_generate_and_save_mp3(profile_id, esc, part_path):
-                return None
-            # Voicebox 返回的 mp3 常为 16k/24k；静音片段为 44.1k wav。
-            # concat 前必须统一采样率，否则整段会按错误速率播放（约快 2–3 倍）。
-            part_wav = self._ffmpeg_audio.to_wav(part_path)
-            if not part_wav:
-                print("Voicebox: TTS 片段转 WAV 失败")
-                return None
-            chain.append(part_wav)
+            chain.append(results[idx])
             next_kind = segments[idx + 1][0] if idx + 1 < len(segments) else None
             if next_kind == "speech" and gap:
                 chain.append(gap)
@@ -372,7 +451,7 @@ class VoiceboxService:
         last_err = None
         while time.time() < deadline:
             try:
-                gr = requests.get(url, timeout=120)
+                gr = _voicebox_session().get(url, timeout=120)
                 if gr.status_code == 200 and gr.content:
                     return gr.content
                 if gr.status_code not in (200, 202, 404):
@@ -399,7 +478,7 @@ class VoiceboxService:
             return None
         try:
             with open(file_path, "rb") as f:
-                r = requests.post(
+                r = _voicebox_session().post(
                     self._transcribe_url(),
                     files={"file": (os.path.basename(file_path), f)},
                     timeout=600,
@@ -0,0 +1,203 @@
+"""
+音频波形峰值缓存：每个音频/视频文件只用 ffmpeg 解码一次（单声道 s16le），用 NumPy 计算多级 min/max 峰值，
+以紧凑二进制文件缓存到 ``config.MACHINE_CACHE_PATH/waveforms/``，按文件身份（``render_cache.file_identity``）命名。
+
+- 第 0 级每 ``PEAK_BASE_SAMPLES`` 个采样一对 (min, max)，往上每级合并 ``PEAK_LEVEL_FACTOR`` 个，直到不足 ``PEAK_MIN_BINS``；
+- ``WaveformPeaks.columns(start, end, n)`` 选每列至少约 4 格的最粗一级，再归约到 ``n`` 列，任意缩放都是毫秒级；
+- 文件格式：``WFPK`` 头（版本、采样率、时长、级数）+ 每级 ``(samples_per_bin, bins)`` + int16 交错 min/max。
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import subprocess
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+import config
+from utility import ffmpeg_scheduler
+from utility.render_cache import file_identity
+
+ffmpeg_path = "ffmpeg"
+
+PEAK_SAMPLE_RATE = 16000
+# 第 0 级每格采样数（16 kHz 下 4 ms 一格）
+PEAK_BASE_SAMPLES = 64
+PEAK_LEVEL_FACTOR = 4
+PEAK_MIN_BINS = 256
+# 格式/算法变更时 bump，旧缓存失效
+PEAKS_VERSION = 1
+
+_MAGIC = b"WFPK"
+_HEADER = struct.Struct("<4sHIdH")
+_LEVEL = struct.Struct("<II")
+
+_lock = threading.Lock()
+_peaks: dict[str, "WaveformPeaks"] = {}
+
+
+@dataclass
+class WaveformPeaks:
+    sample_rate: int
+    duration: float
+    # 每级 (samples_per_bin, int16 数组 shape=(bins, 2)，列 0 为 min、列 1 为 max)
+    levels: list
+
+    def columns(self, start: float, end: float, n: int) -> tuple:
+        """``[start, end)`` 秒区间归约成 ``n`` 列，返回 ``(mins, maxs)``（float32，范围 -1..1）。"""
+        n = max(1, int(n))
+        start = max(0.0, float(start))
+        end = max(start, float(end))
+        samples_per_col = (end - start) * self.sample_rate / n
+        spb, data = self.levels[0]
+        for level_spb, level_data in self.levels:
+            # 每列至少覆盖约 4 格，列边界与格边界错位带来的误差可忽略
+            if level_spb * 4 > samples_per_col:
+                break
+            spb, data = level_spb, level_data
+        if not len(data) or end <= start:
+            zeros = np.zeros(n, dtype=np.float32)
+            return zeros, zeros
+        edges = np.linspace(start * self.sample_rate / spb, end * self.sample_rate / spb, n + 1)
+        edges = np.clip(edges.astype(np.int64), 0, len(data))
+        lo = np.minimum(edges[:-1], len(data) - 1)
+        # reduceat：相邻下标相同（放大到一列不足一格）时取该格本身；末列截到 end 所在格
+        window = data[:max(int(edges[-1]), int(lo[-1]) + 1)]
+        mins = np.minimum.reduceat(window[:, 0], lo)
+        maxs = np.maximum.reduceat(window[:, 1], lo)
+        past_end = edges[:-1] >= len(data)
+        mins[past_end] = 0
+        maxs[past_end] = 0
+        return mins.astype(np.float32) / 32768.0, maxs.astype(np.float32) / 32768.0
+
+
+def cache_dir() -> str:
+    return os.path.join(config.MACHINE_CACHE_PATH, "waveforms")
+
+
+def _peaks_file(identity: str) -> str:
+    key = hashlib.sha1(f"{PEAKS_VERSION}|{identity}".encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir(), key[:2], f"{key}.peaks")
+
+
+def compute_levels(samples: np.ndarray) -> list:
+    """int16 单声道采样 → 多级 (samples_per_bin, min/max 数组)。"""
+    samples = np.asarray(samples, dtype=np.int16)
+    bins = max(1, -(-len(samples) // PEAK_BASE_SAMPLES))
+    padded = np.zeros(bins * PEAK_BASE_SAMPLES, dtype=np.int16)
+    padded[:len(samples)] = samples
+    if len(samples) < len(padded):
+        # 末格用已有采样补齐，避免补零把 min/max 拉向 0
+        padded[len(samples):] = samples[-1] if len(samples) else 0
+    frames = padded.reshape(bins, PEAK_BASE_SAMPLES)
+    data = np.stack([frames.min(axis=1), frames.max(axis=1)], axis=1)
+    levels = [(PEAK_BASE_SAMPLES, data)]
+    spb = PEAK_BASE_SAMPLES
+    while len(data) >= PEAK_MIN_BINS * PEAK_LEVEL_FACTOR:
+        groups = -(-len(data) // PEAK_LEVEL_FACTOR)
+        pad = groups * PEAK_LEVEL_FACTOR - len(data)
+        if pad:
+            data = np.concatenate([data, np.repeat(data[-1:], pad, axis=0)])
+        grouped = data.reshape(groups, PEAK_LEVEL_FACTOR, 2)
+        data = np.stack([grouped[:, :, 0].min(axis=1), grouped[:, :, 1].max(axis=1)], axis=1)
+        spb *= PEAK_LEVEL_FACTOR
+        levels.append((spb, data))
+    return levels
+
+
+def _write(path: str, peaks: WaveformPeaks) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, PEAKS_VERSION, peaks.sample_rate, peaks.duration, len(peaks.levels)))
+        for spb, data in peaks.levels:
+            f.write(_LEVEL.pack(spb, len(data)))
+        for _, data in peaks.levels:
+            f.write(np.ascontiguousarray(data, dtype="<i2").tobytes())
+    os.replace(tmp, path)
+
+
+def _read(path: str) -> Optional[WaveformPeaks]:
+    try:
+        with open(path, "rb") as f:
+            raw = f.read()
+        magic, version, sample_rate, duration, level_count = _HEADER.unpack_from(raw, 0)
+        if magic != _MAGIC or version != PEAKS_VERSION:
+            return None
+        offset = _HEADER.size
+        shapes = []
+        for _ in range(level_count):
+            shapes.append(_LEVEL.unpack_from(raw, offset))
+            offset += _LEVEL.size
+        levels = []
+        for spb, bins in shapes:
+            data = np.frombuffer(raw, dtype="<i2", count=bins * 2, offset=offset).reshape(bins, 2)
+            offset += bins * 4
+            levels.append((spb, data))
+        return WaveformPeaks(sample_rate, duration, levels) if levels else None
+    except (OSError, struct.error, ValueError):
+        return None
+
+
+def _decode(media_path: str) -> Optional[np.ndarray]:
+    cmd = [
+        ffmpeg_path, "-v", "error",
+        "-i", media_path,
+        "-vn", "-ac", "1", "-ar", str(PEAK_SAMPLE_RATE),
+        "-f", "s16le", "-c:a", "pcm_s16le", "-",
+    ]
+    try:
+        result = ffmpeg_scheduler.run(cmd, capture_output=True)
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"❌ waveform decode failed ({os.path.basename(media_path)}): {e}")
+        return None
+    if result.returncode != 0:
+        err = (result.stderr or b"").decode("utf-8", errors="ignore").strip()
+        print(f"❌ waveform decode failed ({os.path.basename(media_path)}): {err[-300:]}")
+        return None
+    usable = len(result.stdout) // 2 * 2
+    return np.frombuffer(result.stdout[:usable], dtype="<i2")
+
+
+def cached_peaks(media_path: str) -> Optional[WaveformPeaks]:
+    """只查缓存（内存 → 磁盘），不解码；未命中返回 None。"""
+    identity = file_identity(media_path)
+    if not identity:
+        return None
+    with _lock:
+        peaks = _peaks.get(identity)
+    if peaks is not None:
+        return peaks
+    peaks = _read(_peaks_file(identity))
+    if peaks is not None:
+        with _lock:
+            _peaks[identity] = peaks
+    return peaks
+
+
+def get_peaks(media_path: str) -> Optional[WaveformPeaks]:
+    """返回 ``media_path`` 的峰值（未缓存时解码并写缓存）；无音频或解码失败返回 None。会阻塞，GUI 在后台线程调用。"""
+    peaks = cached_peaks(media_path)
+    if peaks is not None:
+        return peaks
+    identity = file_identity(media_path)
+    if not identity:
+        return None
+    started = time.perf_counter()
+    samples = _decode(media_path)
+    if samples is None or not len(samples):
+        return None
+    peaks = WaveformPeaks(PEAK_SAMPLE_RATE, len(samples) / PEAK_SAMPLE_RATE, compute_levels(samples))
+    try:
+        _write(_peaks_file(identity), peaks)
+    except OSError as e:
+        print(f"⚠️ waveform cache write failed: {e}")
+    with _lock:
+        _peaks[identity] = peaks
+    print(f"〰️  waveform peaks: {os.path.basename(media_path)} ({peaks.duration:.1f}s) in {time.perf_counter() - started:.2f}s")
+    return peaks